@@ -8,25 +8,42 @@
 
 import asyncio
 import re
+import socket
 import sys
 import time
 import json
-import subprocess
-import requests
-import websockets
-from typing import Dict, Optional, List
+import httpx
+import psutil
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Set, Tuple
 from loguru import logger
 from playwright.async_api import async_playwright, Page, BrowserContext
 import os
-from utils import get_screensize
+from utils import get_screensize_async, run_command_async, wait_for_path, wait_for_path_async
 from shutil import which
+from cdp_client import CDPConnection, CDPError, CDPSession, add_latency_observer
+from browser_pool import BrowserContextPool, ContextLease
+from browser_screencast import ScreencastCapture
+from browser_intercept import RequestInterceptor
+from browser_trace import TraceCapture
+from browser_snapshot import PageSnapshotter
+from browser_render import CONTENT_TYPES, RenderPool
+from browser_profile import ProfileMaintainer
+from browser_session import SessionRecorder, is_placeholder_url
+from guard_metrics import MetricsServer, RouteHandler, json_response, metrics
 
 
-def _get_chromium_version(executable_path: str = "/usr/bin/chromium") -> Optional[str]:
+def _resolve_chromium(executable_path: str) -> str:
+    return executable_path if os.path.exists(executable_path) else (which("chromium") or which("chromium-browser") or executable_path)
+
+
+async def _get_chromium_version(executable_path: str = "/usr/bin/chromium") -> Optional[str]:
     try:
-        exe = executable_path if os.path.exists(executable_path) else (which("chromium") or which("chromium-browser") or executable_path)
-        result = subprocess.run([exe, "--version"], capture_output=True, text=True, timeout=3)
-        text = (result.stdout or result.stderr or "").strip()
+        exe = _resolve_chromium(executable_path)
+        result = await run_command_async([exe, "--version"], timeout=3, max_output_bytes=4096)
+        if result.timed_out:
+            return None
+        text = (result.stdout or result.stderr).strip()
         # e.g. Chromium 120.0.6099.109
         m = re.search(r"(Chromium|Google Chrome)\s+([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)", text)
         return m.group(2) if m else None
@@ -34,6 +51,63 @@ def _get_chromium_version(executable_path: str = "/usr/bin/chromium") -> Optiona
         return None
 
 
+# 浏览器版本按 (可执行文件, mtime) 缓存，并持久化到文件供进程重启后复用
+IDENTITY_CACHE_PATH = os.getenv("BROWSER_IDENTITY_CACHE", "/tmp/browser_guard_identity.json")
+_version_cache: Dict[Tuple[str, float], str] = {}
+# 屏幕尺寸按 DISPLAY 缓存
+_screensize_cache: Dict[str, Tuple[int, int]] = {}
+
+
+async def _get_cached_chromium_version(executable_path: str = "/usr/bin/chromium") -> Optional[str]:
+    """带缓存的 _get_chromium_version，可执行文件被替换（mtime 变化）后重新探测"""
+    exe = _resolve_chromium(executable_path)
+    try:
+        mtime = os.stat(exe).st_mtime
+    except OSError:
+        return await _get_chromium_version(executable_path)
+
+    key = (exe, mtime)
+    if key in _version_cache:
+        return _version_cache[key]
+    try:
+        with open(IDENTITY_CACHE_PATH, "r") as f:
+            cached = json.load(f)
+        if cached.get("executable") == exe and cached.get("mtime") == mtime and cached.get("version"):
+            _version_cache[key] = cached["version"]
+            return cached["version"]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    version = await _get_chromium_version(exe)
+    # 探测失败不缓存，下次启动重试
+    if version:
+        _version_cache[key] = version
+        try:
+            with open(IDENTITY_CACHE_PATH, "w") as f:
+                json.dump({"executable": exe, "mtime": mtime, "version": version}, f)
+        except OSError as e:
+            logger.debug(f"写入浏览器版本缓存失败: {e}")
+    return version
+
+
+async def _get_cached_screensize() -> Tuple[int, int]:
+    """带缓存的屏幕尺寸探测"""
+    display = os.getenv("DISPLAY", "")
+    if display not in _screensize_cache:
+        _screensize_cache[display] = await get_screensize_async()
+    return _screensize_cache[display]
+
+
+def _click_toolbar(width: int):
+    """点击窗口右上角后把鼠标移回原位（pyautogui 是阻塞调用，需在线程中运行）"""
+    # import this after x11 server is ready
+    import pyautogui
+
+    x, y = pyautogui.position()
+    pyautogui.click(width - 25, 115)
+    pyautogui.moveTo(x, y)
+
+
 def _chrome_major(version: Optional[str]) -> str:
     if not version:
         return "120"
@@ -463,6 +537,667 @@ if not match:
 SCREEN_WIDTH = int(match.group(1) if match else "1920")
 SCREEN_HEIGHT = int(match.group(2) if match else "1080")
 
+# 上下文池模式：BROWSER_POOL_SIZE > 0 时在同一个 Chromium 上预热隔离上下文供并发会话租用
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "0"))
+# 恢复时等待 CDP 响应（例如新开页面）的超时时间，超时视为上下文无响应
+RECOVERY_TIMEOUT = float(os.getenv("BROWSER_RECOVERY_TIMEOUT", "10"))
+# 请求拦截层（资源屏蔽 + 静态资源磁盘缓存）：BROWSER_INTERCEPT=true 开启
+INTERCEPT_ENABLED = os.getenv("BROWSER_INTERCEPT", "false").lower() == "true"
+# 指标服务（只读的 /metrics 和 /health）：BROWSER_GUARD_METRICS_PORT=0 关闭。
+# 默认只监听本机；需要从其他主机抓取时设置 BROWSER_GUARD_METRICS_HOST=0.0.0.0
+METRICS_HOST = os.getenv("BROWSER_GUARD_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("BROWSER_GUARD_METRICS_PORT", "9333"))
+# 控制接口（/trace、/snapshot、/render、/screencast、/frame、/tabs）没有鉴权，只监听本机回环地址；
+# BROWSER_GUARD_CONTROL_PORT=0 关闭
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = int(os.getenv("BROWSER_GUARD_CONTROL_PORT", "9334"))
+# GET /frame 等待画面变化的最长时间（秒）
+FRAME_MAX_WAIT = 30.0
+# 持久化上下文的用户数据目录，每次启动前由 ProfileMaintainer 维护
+USER_DATA_DIR = os.getenv("BROWSER_USER_DATA_DIR", "/app/data/chrome_data")
+# 记录标签页并在浏览器重启后恢复：BROWSER_SESSION_RESTORE=false 关闭
+SESSION_RESTORE_ENABLED = os.getenv("BROWSER_SESSION_RESTORE", "true").lower() == "true"
+# BrowserCDPGuard 的用户数据目录
+CDP_USER_DATA_DIR = "/tmp/chromium_user_data"
+# 启动时等待显示服务器和 DevTools 端口就绪的超时时间
+DISPLAY_WAIT_TIMEOUT = float(os.getenv("BROWSER_DISPLAY_TIMEOUT", "60"))
+DEVTOOLS_WAIT_TIMEOUT = float(os.getenv("BROWSER_DEVTOOLS_TIMEOUT", "15"))
+# 本地 X 服务器在该目录下创建 X<显示编号> 套接字
+X11_SOCKET_DIR = "/tmp/.X11-unix"
+# 上下文池与持久化上下文共享的配置项
+POOL_CONTEXT_OPTIONS = ("viewport", "user_agent", "locale", "timezone_id", "extra_http_headers")
+
+# 页面变为不可见（例如窗口被最小化）时通过 binding 通知 BrowserCDPGuard
+VISIBILITY_BINDING = "__browserGuardVisibility"
+VISIBILITY_SCRIPT = f"""
+(() => {{
+    if (window.__browserGuardVisibilityHooked) return;
+    window.__browserGuardVisibilityHooked = true;
+    document.addEventListener("visibilitychange", () => {{
+        if (document.visibilityState === "hidden" && window.{VISIBILITY_BINDING}) {{
+            window.{VISIBILITY_BINDING}(document.visibilityState);
+        }}
+    }});
+}})();
+"""
+
+# 内存看门狗：BROWSER_MEMORY_WATCHDOG=false 关闭
+MEMORY_WATCHDOG_ENABLED = os.getenv("BROWSER_MEMORY_WATCHDOG", "true").lower() == "true"
+# 标签页预算：默认上下文中最多保留的未冻结标签页数；默认 0 关闭，需要时显式开启
+TAB_BUDGET = int(os.getenv("BROWSER_TAB_BUDGET", "0"))
+
+RECOVERIES = metrics.counter(
+    "browser_guard_recoveries_total",
+    "Browser recoveries by tier (new_page, context_restart, relaunch) and reason",
+    ["tier", "reason"],
+)
+CDP_COMMAND_SECONDS = metrics.histogram(
+    "browser_guard_cdp_command_seconds",
+    "CDP command round-trip latency by method",
+    ["method", "status"],
+)
+LAUNCH_SECONDS = metrics.histogram(
+    "browser_guard_launch_seconds",
+    "Browser launch duration",
+    ["guard"],
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+PAGE_LOAD_SECONDS = metrics.histogram(
+    "browser_guard_page_load_seconds",
+    "Main-frame navigation start to load event",
+    buckets=(0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+TABS_PARKED = metrics.counter(
+    "browser_guard_tabs_parked_total",
+    "Background tabs closed or frozen by the tab budget",
+    ["policy"],
+)
+OPEN_TABS = metrics.gauge("browser_guard_open_tabs", "Open tab count")
+BROWSER_RSS = metrics.gauge(
+    "browser_guard_browser_rss_bytes", "Summed RSS of Chromium processes at the last watchdog sample"
+)
+add_latency_observer(
+    lambda method, elapsed, ok: CDP_COMMAND_SECONDS.observe(
+        elapsed, method=method, status="ok" if ok else "error"
+    )
+)
+
+
+async def _start_metrics_server(open_tabs, watchdog_getter) -> Optional[MetricsServer]:
+    """注册按需求值的仪表并启动指标服务；端口配置为 0 或启动失败时返回 None"""
+    OPEN_TABS.set_function(open_tabs)
+
+    def browser_rss():
+        watchdog = watchdog_getter()
+        return watchdog.last_sample.get("rss") if watchdog else None
+
+    BROWSER_RSS.set_function(browser_rss)
+    if METRICS_PORT <= 0:
+        return None
+    server = MetricsServer(METRICS_HOST, METRICS_PORT)
+    try:
+        await server.start()
+    except OSError as e:
+        logger.error(f"启动指标服务失败: {e}")
+        return None
+    return server
+
+
+async def _start_control_server(
+    routes: Dict[Tuple[str, str], RouteHandler],
+    query_routes: Optional[Dict[Tuple[str, str], RouteHandler]] = None,
+) -> Optional[MetricsServer]:
+    """
+    在回环地址上启动控制接口，query_routes 中的处理函数额外接收查询参数；
+    端口配置为 0、没有路由或启动失败时返回 None
+    """
+    if CONTROL_PORT <= 0 or not (routes or query_routes):
+        return None
+    server = MetricsServer(CONTROL_HOST, CONTROL_PORT)
+    for (method, path), handler in routes.items():
+        server.add_route(method, path, handler)
+    for (method, path), handler in (query_routes or {}).items():
+        server.add_route(method, path, handler, query=True)
+    try:
+        await server.start()
+    except OSError as e:
+        logger.error(f"启动控制接口失败: {e}")
+        return None
+    return server
+
+
+# cgroup v2 下容器的内存上限；值为 "max" 表示不限制
+CGROUP_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+
+
+def _memory_limit() -> int:
+    """可用内存上限：容器的 cgroup 限制，没有限制时为物理内存"""
+    total = psutil.virtual_memory().total
+    try:
+        with open(CGROUP_MEMORY_MAX) as f:
+            value = f.read().strip()
+    except OSError:
+        return total
+    return min(int(value), total) if value.isdigit() else total
+
+
+class TabMonitor:
+    """
+    内存看门狗和标签页预算的公共部分：独立的浏览器级 CDP 连接、按标签页缓存的会话、
+    冻结与解冻，以及周期性检查循环。子类实现 check()。
+    """
+
+    # 日志中的名称
+    name = "标签页监控"
+
+    def __init__(self, cdp_url: str, interval: float):
+        self.cdp_url = cdp_url
+        self.interval = interval
+        self.cdp: Optional[CDPConnection] = None
+        self._sessions: Dict[str, CDPSession] = {}
+        self._frozen: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        # 置位后立即进行下一次检查，不等检查周期结束
+        self._wake = asyncio.Event()
+
+    def _reset(self):
+        """连接建立或关闭时清空与连接绑定的状态"""
+        self._sessions.clear()
+        self._frozen.clear()
+
+    async def _on_connect(self, cdp: CDPConnection):
+        """新连接建立后调用，子类在这里订阅事件"""
+
+    async def _ensure_cdp(self) -> CDPConnection:
+        if self.cdp and not self.cdp.closed:
+            return self.cdp
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(f"{self.cdp_url}/json/version")
+        self.cdp = await CDPConnection.connect(response.json()["webSocketDebuggerUrl"])
+        self._reset()
+        await self._on_connect(self.cdp)
+        return self.cdp
+
+    async def _close_cdp(self):
+        cdp, self.cdp = self.cdp, None
+        self._reset()
+        if cdp:
+            try:
+                await cdp.close()
+            except Exception as e:
+                logger.debug(f"关闭{self.name} CDP 连接失败: {e}")
+
+    async def _init_session(self, session: CDPSession):
+        """新附加的标签页会话的初始化命令"""
+
+    async def _session(self, target_id: str) -> CDPSession:
+        session = self._sessions.get(target_id)
+        if session is None:
+            session = await self.cdp.attach(target_id)
+            await self._init_session(session)
+            self._sessions[target_id] = session
+        return session
+
+    def _forget(self, target_id: str):
+        self._sessions.pop(target_id, None)
+        self._frozen.discard(target_id)
+
+    async def _excluded_contexts(self, cdp: CDPConnection) -> Set[str]:
+        """默认上下文以外的上下文（上下文池租出的上下文、渲染池等），由各自的使用方管理"""
+        contexts = await cdp.send("Target.getBrowserContexts")
+        return set(contexts.get("browserContextIds", []))
+
+    async def _freeze(self, target_id: str):
+        session = await self._session(target_id)
+        await session.send("Page.setWebLifecycleState", {"state": "frozen"})
+        self._frozen.add(target_id)
+
+    async def _thaw(self, target_id: str):
+        try:
+            session = await self._session(target_id)
+            await session.send("Page.setWebLifecycleState", {"state": "active"})
+        except Exception as e:
+            logger.debug(f"恢复标签页失败: {target_id} {e}")
+        self._frozen.discard(target_id)
+
+    async def check(self):
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 浏览器重启期间连接不可用，下次重连
+                logger.debug(f"{self.name}检查失败: {e}")
+                await self._close_cdp()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"{self.describe()}已启动")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_cdp()
+
+
+class ChromiumMemoryWatchdog(TabMonitor):
+    """
+    Chromium 内存看门狗。
+
+    定期采样浏览器所有进程的 RSS（SystemInfo.getProcessInfo + psutil）和每个标签页的 JS 堆
+    （Performance.getMetrics）。超过软阈值时冻结或关闭后台标签页，超过硬阈值时在 OOM 之前
+    调用 restart_callback 主动重启浏览器。只处理默认上下文中的标签页。
+    """
+
+    name = "内存看门狗"
+
+    def __init__(
+        self,
+        cdp_url: str,
+        restart_callback: Callable[[], Awaitable[Any]],
+        interval: float = 10.0,
+        soft_limit: Optional[int] = None,
+        hard_limit: Optional[int] = None,
+        discard_mode: str = "freeze",
+        restart_cooldown: float = 300.0,
+    ):
+        if discard_mode not in ("freeze", "close"):
+            raise ValueError(f"Invalid discard mode: {discard_mode}")
+        super().__init__(cdp_url, interval)
+        total = _memory_limit()
+        self.restart_callback = restart_callback
+        self.soft_limit = soft_limit or int(total * 0.6)
+        self.hard_limit = hard_limit or int(total * 0.8)
+        self.discard_mode = discard_mode
+        self.restart_cooldown = restart_cooldown
+        self._last_restart: float = 0.0
+        self.last_sample: Dict[str, Any] = {}
+        self.stats: Dict[str, int] = {"samples": 0, "discarded": 0, "restarts": 0}
+
+    @classmethod
+    def from_env(
+        cls, cdp_url: str, restart_callback: Callable[[], Awaitable[Any]]
+    ) -> "ChromiumMemoryWatchdog":
+        """阈值以 MB 为单位，默认分别为内存上限（cgroup 限制或物理内存）的 60% / 80%"""
+        soft = os.getenv("BROWSER_MEMORY_SOFT_LIMIT_MB")
+        hard = os.getenv("BROWSER_MEMORY_HARD_LIMIT_MB")
+        return cls(
+            cdp_url,
+            restart_callback,
+            interval=float(os.getenv("BROWSER_MEMORY_CHECK_INTERVAL", "10")),
+            soft_limit=int(soft) << 20 if soft else None,
+            hard_limit=int(hard) << 20 if hard else None,
+            discard_mode=os.getenv("BROWSER_MEMORY_DISCARD_MODE", "freeze"),
+            restart_cooldown=float(os.getenv("BROWSER_MEMORY_RESTART_COOLDOWN", "300")),
+        )
+
+    async def _init_session(self, session: CDPSession):
+        await session.send("Performance.enable")
+
+    async def _sample_tab(self, target: Dict) -> Dict[str, Any]:
+        target_id = target["targetId"]
+        session = await self._session(target_id)
+        metrics, visibility = await asyncio.gather(
+            session.send("Performance.getMetrics"),
+            session.send(
+                "Runtime.evaluate",
+                {"expression": "document.visibilityState", "returnByValue": True},
+                timeout=2.0,
+            ),
+        )
+        values = {metric["name"]: metric["value"] for metric in metrics.get("metrics", [])}
+        return {
+            "target_id": target_id,
+            "url": target.get("url", ""),
+            "js_heap": int(values.get("JSHeapUsedSize", 0)),
+            "hidden": visibility.get("result", {}).get("value") == "hidden",
+        }
+
+    async def sample(self) -> Dict[str, Any]:
+        """采样一次：各进程 RSS 之和与每个标签页的 JS 堆和可见性"""
+        cdp = await self._ensure_cdp()
+        process_info, targets, excluded = await asyncio.gather(
+            cdp.send("SystemInfo.getProcessInfo"),
+            cdp.send("Target.getTargets"),
+            self._excluded_contexts(cdp),
+        )
+
+        rss = 0
+        for process in process_info.get("processInfo", []):
+            try:
+                rss += psutil.Process(process["id"]).memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        # 其他上下文的页面正被租用方使用（渲染池的页面总是处于后台），不能冻结或关闭
+        pages = [
+            t for t in targets.get("targetInfos", [])
+            if t.get("type") == "page" and t.get("browserContextId") not in excluded
+        ]
+        page_ids = {page["targetId"] for page in pages}
+        for target_id in list(self._sessions):
+            if target_id not in page_ids:
+                self._forget(target_id)
+
+        results = await asyncio.gather(
+            *(self._sample_tab(page) for page in pages), return_exceptions=True
+        )
+        tabs = [result for result in results if isinstance(result, dict)]
+        self.stats["samples"] += 1
+        self.last_sample = {"rss": rss, "tabs": tabs, "time": time.time()}
+        return self.last_sample
+
+    async def _discard(self, tabs: List[Dict[str, Any]], excess: int):
+        """
+        按 JS 堆从大到小处理后台标签页。关闭模式下直到预计释放的内存覆盖超出部分；
+        冻结只阻止标签页继续增长、并不释放内存，每次检查只冻结一个，由下一次采样判断是否仍超限
+        """
+        candidates = sorted(
+            (tab for tab in tabs if tab["hidden"] and tab["target_id"] not in self._frozen),
+            key=lambda tab: tab["js_heap"],
+            reverse=True,
+        )
+        # 至少保留一个标签页
+        if self.discard_mode == "close" and len(candidates) == len(tabs):
+            candidates = candidates[1:]
+
+        released = 0
+        for tab in candidates:
+            if released >= excess:
+                break
+            target_id = tab["target_id"]
+            try:
+                if self.discard_mode == "close":
+                    await self.cdp.send("Target.closeTarget", {"targetId": target_id})
+                else:
+                    await self._freeze(target_id)
+            except Exception as e:
+                logger.debug(f"丢弃后台标签页失败: {target_id} {e}")
+                continue
+            self.stats["discarded"] += 1
+            logger.info(
+                f"内存压力，{self.discard_mode} 后台标签页: {tab['url']} "
+                f"(JS 堆 {tab['js_heap'] >> 20}MB)"
+            )
+            if self.discard_mode != "close":
+                break
+            released += tab["js_heap"]
+
+    async def _thaw_visible(self, tabs: List[Dict[str, Any]]):
+        """被冻结的标签页重新可见时恢复运行"""
+        for tab in tabs:
+            if tab["target_id"] in self._frozen and not tab["hidden"]:
+                await self._thaw(tab["target_id"])
+
+    async def check(self):
+        """采样并按阈值处理：软阈值丢弃后台标签页，硬阈值主动重启"""
+        sample = await self.sample()
+        rss = sample["rss"]
+        await self._thaw_visible(sample["tabs"])
+
+        if rss >= self.hard_limit:
+            if time.time() - self._last_restart < self.restart_cooldown:
+                logger.warning(f"浏览器内存 {rss >> 20}MB 超过硬阈值，重启冷却中")
+                return
+            logger.warning(
+                f"浏览器内存 {rss >> 20}MB 超过硬阈值 {self.hard_limit >> 20}MB，主动重启浏览器"
+            )
+            self._last_restart = time.time()
+            self.stats["restarts"] += 1
+            await self._close_cdp()
+            await self.restart_callback()
+        elif rss >= self.soft_limit:
+            await self._discard(sample["tabs"], rss - self.soft_limit)
+
+    def describe(self) -> str:
+        return (
+            f"内存看门狗: 软阈值 {self.soft_limit >> 20}MB, "
+            f"硬阈值 {self.hard_limit >> 20}MB, 模式 {self.discard_mode}"
+        )
+
+
+class TabBudgetManager(TabMonitor):
+    """
+    标签页预算。
+
+    通过 Target 事件跟踪默认上下文中的标签页，导航或变为可见时刷新最近使用时间。未冻结的
+    标签页超过预算时，按最近最少使用的顺序冻结（或按配置关闭）后台标签页，并记录其 URL 以便按需
+    重新打开。上下文池等其他上下文中的标签页和会话恢复的占位页不计入预算。
+    """
+
+    name = "标签页预算"
+
+    def __init__(
+        self,
+        cdp_url: str,
+        budget: int = 10,
+        policy: str = "freeze",
+        interval: float = 5.0,
+        history: int = 100,
+    ):
+        if policy not in ("freeze", "close"):
+            raise ValueError(f"Invalid tab policy: {policy}")
+        if budget < 1:
+            raise ValueError(f"Tab budget must be at least 1: {budget}")
+        super().__init__(cdp_url, interval)
+        self.budget = budget
+        self.policy = policy
+        self.history = history
+
+        # targetId -> url、title、browserContextId、last_used、hidden
+        self._tabs: Dict[str, Dict[str, Any]] = {}
+        # 被关闭或冻结的标签页，按时间排序，最多保留 history 个
+        self.parked: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"closed": 0, "frozen": 0, "reopened": 0}
+
+    @classmethod
+    def from_env(cls, cdp_url: str) -> "TabBudgetManager":
+        return cls(
+            cdp_url,
+            budget=TAB_BUDGET,
+            policy=os.getenv("BROWSER_TAB_POLICY", "freeze"),
+            interval=float(os.getenv("BROWSER_TAB_CHECK_INTERVAL", "5")),
+        )
+
+    def _reset(self):
+        super()._reset()
+        self._tabs.clear()
+
+    async def _on_connect(self, cdp: CDPConnection):
+        cdp.on("Target.targetCreated", self._on_target_created)
+        cdp.on("Target.targetInfoChanged", self._on_target_info_changed)
+        cdp.on("Target.targetDestroyed", self._on_target_destroyed)
+        # 开启后会为已有的 target 补发 targetCreated 事件
+        await cdp.send("Target.setDiscoverTargets", {"discover": True})
+
+    def _on_target_created(self, params: Dict):
+        target = params["targetInfo"]
+        if target.get("type") != "page":
+            return
+        self._tabs[target["targetId"]] = {
+            "url": target.get("url", ""),
+            "title": target.get("title", ""),
+            "context": target.get("browserContextId"),
+            "last_used": time.monotonic(),
+            "hidden": False,
+        }
+        if len(self._tabs) - len(self._frozen) > self.budget:
+            # 超出预算，不等下一个检查周期
+            self._wake.set()
+
+    def _on_target_info_changed(self, params: Dict):
+        target = params["targetInfo"]
+        tab = self._tabs.get(target["targetId"])
+        if tab is None:
+            return
+        if target.get("url", "") != tab["url"]:
+            # 发生导航，视为一次使用
+            tab["last_used"] = time.monotonic()
+        tab["url"] = target.get("url", "")
+        tab["title"] = target.get("title", "")
+
+    def _on_target_destroyed(self, params: Dict):
+        target_id = params["targetId"]
+        self._tabs.pop(target_id, None)
+        self._forget(target_id)
+        entry = self.parked.get(target_id)
+        if entry is not None:
+            # 冻结的标签页被关闭后只能重新打开 URL
+            entry["policy"] = "close"
+
+    async def _is_visible(self, target_id: str) -> Optional[bool]:
+        """标签页当前是否可见；无法判断时返回 None"""
+        try:
+            session = await self._session(target_id)
+            result = await session.send(
+                "Runtime.evaluate",
+                {"expression": "document.visibilityState", "returnByValue": True},
+                timeout=2.0,
+            )
+        except Exception:
+            return None
+        return result.get("result", {}).get("value") == "visible"
+
+    async def _park(self, target_id: str):
+        tab = self._tabs[target_id]
+        if self.policy == "close":
+            await self.cdp.send("Target.closeTarget", {"targetId": target_id})
+            self.stats["closed"] += 1
+        else:
+            await self._freeze(target_id)
+            self.stats["frozen"] += 1
+        self.parked.pop(target_id, None)
+        self.parked[target_id] = {
+            "target_id": target_id,
+            "url": tab["url"],
+            "title": tab["title"],
+            "policy": self.policy,
+            "parked_at": time.time(),
+        }
+        while len(self.parked) > self.history:
+            self.parked.popitem(last=False)
+        TABS_PARKED.inc(policy=self.policy)
+        logger.info(f"标签页超出预算，{self.policy} 最久未使用的后台标签页: {tab['url']}")
+
+    async def _thaw(self, target_id: str):
+        await super()._thaw(target_id)
+        self.parked.pop(target_id, None)
+
+    async def check(self):
+        """刷新可见性，解冻重新可见的标签页，超出预算时处理最久未使用的后台标签页"""
+        cdp = await self._ensure_cdp()
+        excluded = await self._excluded_contexts(cdp)
+        # 恢复的占位页几乎不占内存，关闭它们会丢失会话记录中的标签页；切到前台加载后才计入
+        tab_ids = [
+            target_id
+            for target_id, tab in self._tabs.items()
+            if tab["context"] not in excluded and not is_placeholder_url(tab["url"])
+        ]
+
+        now = time.monotonic()
+        visible = await asyncio.gather(*(self._is_visible(target_id) for target_id in tab_ids))
+        for target_id, is_visible in zip(tab_ids, visible):
+            tab = self._tabs.get(target_id)
+            if tab is None or is_visible is None:
+                continue
+            tab["hidden"] = not is_visible
+            if is_visible:
+                tab["last_used"] = now
+                if target_id in self._frozen:
+                    await self._thaw(target_id)
+
+        live = [
+            target_id for target_id in tab_ids
+            if target_id in self._tabs and target_id not in self._frozen
+        ]
+        excess = len(live) - self.budget
+        if excess <= 0:
+            return
+        live.sort(key=lambda target_id: self._tabs[target_id]["last_used"])
+        # 最近使用的标签页始终保留
+        candidates = [target_id for target_id in live[:-1] if self._tabs[target_id]["hidden"]]
+        for target_id in candidates[:excess]:
+            try:
+                await self._park(target_id)
+            except Exception as e:
+                logger.debug(f"处理超出预算的标签页失败: {target_id} {e}")
+
+    async def reopen(self, target_id: Optional[str] = None) -> str:
+        """重新打开被关闭或冻结的标签页（默认最近一个），返回其 targetId"""
+        if target_id is None:
+            if not self.parked:
+                raise ValueError("没有可重新打开的标签页")
+            target_id = next(reversed(self.parked))
+        entry = self.parked.pop(target_id, None)
+        if entry is None:
+            raise ValueError(f"没有记录该标签页: {target_id}")
+
+        cdp = await self._ensure_cdp()
+        self.stats["reopened"] += 1
+        if entry["policy"] == "freeze" and target_id in self._tabs:
+            await self._thaw(target_id)
+            await cdp.send("Target.activateTarget", {"targetId": target_id})
+            self._tabs[target_id]["last_used"] = time.monotonic()
+            return target_id
+        result = await cdp.send("Target.createTarget", {"url": entry["url"]})
+        return result["targetId"]
+
+    def report(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "budget": self.budget,
+            "policy": self.policy,
+            "tabs": [
+                {
+                    "target_id": target_id,
+                    "url": tab["url"],
+                    "title": tab["title"],
+                    "frozen": target_id in self._frozen,
+                    "idle_seconds": round(now - tab["last_used"], 1),
+                }
+                for target_id, tab in self._tabs.items()
+            ],
+            "parked": list(self.parked.values()),
+            "stats": dict(self.stats),
+        }
+
+    async def handle_report(self, body: bytes):
+        """GET /tabs"""
+        return json_response(self.report())
+
+    async def handle_reopen(self, body: bytes):
+        """POST /tabs/reopen，请求体为 JSON：target_id，省略时重新打开最近一个"""
+        try:
+            options = json.loads(body or b"{}")
+            target_id = options.get("target_id")
+        except (ValueError, AttributeError):
+            return json_response({"error": "invalid JSON body"}, 400)
+        try:
+            return json_response({"target_id": await self.reopen(target_id)})
+        except ValueError as e:
+            return json_response({"error": str(e)}, 404)
+
+    def describe(self) -> str:
+        return f"标签页预算: 最多 {self.budget} 个, 模式 {self.policy}"
+
 
 class BrowserGuard:
     """
@@ -475,25 +1210,85 @@ class BrowserGuard:
         self.browser: Optional[BrowserContext] = None
         self.pages: List[Page] = []
         self.current_page_index: int = 0
+        self.pool: Optional[BrowserContextPool] = None
+        # Playwright driver（Node 进程）在多次重启之间复用，只在 shutdown 时停止
+        self.playwright = None
+        self.launch_options: Dict = {}
+        self.init_script: str = ""
+        self._context_closed: bool = False
+        # 最近一次启动各阶段的耗时（秒）
+        self.startup_timings: Dict[str, float] = {}
+        self.profile_maintainer = ProfileMaintainer.from_env(USER_DATA_DIR)
+        # 最近一次启动前的 profile 维护结果
+        self.profile_report: Dict[str, Any] = {}
+        self.session_recorder: Optional[SessionRecorder] = (
+            SessionRecorder.from_env() if SESSION_RESTORE_ENABLED else None
+        )
+        # 监控循环的恢复和内存看门狗的主动重启互斥
+        self._restart_lock = asyncio.Lock()
+        self.memory_watchdog: Optional[ChromiumMemoryWatchdog] = None
+        self.tab_manager: Optional[TabBudgetManager] = None
+        self.interceptor: Optional[RequestInterceptor] = (
+            RequestInterceptor.from_env() if INTERCEPT_ENABLED else None
+        )
+        self.metrics_server: Optional[MetricsServer] = None
+        self.control_server: Optional[MetricsServer] = None
+        # 页面 -> 当前主框架导航的开始时间
+        self._navigation_started: Dict[Page, float] = {}
+        # 各级恢复的次数：新开页面 / 重启上下文 / 重新启动浏览器
+        self.recovery_counts: Dict[str, int] = {
+            "new_page": 0,
+            "context_restart": 0,
+            "relaunch": 0,
+        }
         self.width: int = int(match.group(1) if match else "1920")
         self.height: int = int(match.group(2) if match else "1080")
         logger.info(
             f"BrowserGuard initialized with width: {self.width}, height: {self.height}"
         )
 
+    async def _start_driver(self):
+        started = time.perf_counter()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+            logger.info("Playwright started")
+        self.startup_timings["driver_start"] = time.perf_counter() - started
+
+    async def _detect_identity(self) -> Tuple[Optional[str], int]:
+        """等待显示服务器就绪后探测浏览器版本和屏幕宽度（均有缓存）"""
+        if not await self._timed("display", wait_for_display_async(timeout=DISPLAY_WAIT_TIMEOUT)):
+            logger.warning("显示服务器未就绪，继续启动")
+        started = time.perf_counter()
+        chromium_version, screensize = await asyncio.gather(
+            _get_cached_chromium_version(),
+            _get_cached_screensize(),
+            return_exceptions=True,
+        )
+        if isinstance(chromium_version, BaseException):
+            chromium_version = None
+        if isinstance(screensize, BaseException):
+            logger.warning(f"获取屏幕尺寸失败，使用配置的分辨率: {screensize}")
+            screensize = (self.width, self.height)
+        self.startup_timings["identity"] = time.perf_counter() - started
+        return chromium_version, screensize[0]
+
     async def start(self):
         try:
-            # import this after x11 server is ready
-            import pyautogui
-
             logger.info("Starting browser initialization...")
-            playwright = await async_playwright().start()
-            logger.info("Playwright started, launching browser...")
+            self.startup_timings = {}
+            started = time.perf_counter()
+
+            # driver 启动、版本和屏幕尺寸探测、profile 维护互不依赖，并行进行
+            _, (chromium_version, screen_width), self.profile_report = await asyncio.gather(
+                self._start_driver(),
+                self._detect_identity(),
+                self._timed("profile", asyncio.to_thread(self.profile_maintainer.run)),
+            )
+            logger.info("Playwright ready, launching browser...")
 
             # Build environment-aware identity
             locale = os.getenv("CHROME_LOCALE", "zh-CN")
             tz = os.getenv("TZ", "Asia/Shanghai")
-            chromium_version = _get_chromium_version()
             user_agent = _build_user_agent(chromium_version, locale)
             ua_ch = _build_ua_ch_headers(chromium_version)
             languages = [locale, locale.split("-")[0], "en-US", "en"]
@@ -502,10 +1297,13 @@ class BrowserGuard:
             extra_args: List[str] = []
             if extra_flags:
                 extra_args = extra_flags.split(" ")
+            # 让浏览器自己把 HTTP 缓存控制在上限以内，启动前的维护只是兜底
+            if self.profile_maintainer.disk_cache_size:
+                extra_args.append(f"--disk-cache-size={self.profile_maintainer.disk_cache_size}")
 
             # Use non-headless mode for testing with slower timeouts
             launch_options = {
-                "user_data_dir": "/app/data/chrome_data",
+                "user_data_dir": USER_DATA_DIR,
                 "viewport": {"width": self.width, "height": self.height},
                 "headless": False,
                 "timeout": 60000.0,
@@ -551,27 +1349,20 @@ class BrowserGuard:
                 ],
             }
 
+            self.launch_options = launch_options
+            self.init_script = stealth_js.replace("__LANGS__", json.dumps(languages))
+
             count = 0
             while count < 3:
                 try:
-                    self.browser = await playwright.chromium.launch_persistent_context(
-                        executable_path="/usr/bin/chromium", **launch_options
-                    )
-
-                    # Inject stealth evasions BEFORE first navigation
-                    try:
-                        script = stealth_js.replace("__LANGS__", json.dumps(languages))
-                        await self.browser.add_init_script(script=script)
-                    except Exception as _:
-                        pass
+                    await self._launch_context()
 
                     logger.info("Browser launched successfully")
-                    x, y = pyautogui.position()
-                    width, _ = get_screensize()
-                    pyautogui.click(width - 25, 115)
-                    pyautogui.moveTo(x, y)
-                    # await self.browser.pages[0].reload()
-                    await self.browser.pages[0].goto(init_url)
+                    # 工具栏点击和首次导航互不依赖
+                    await asyncio.gather(
+                        self._timed("toolbar_click", asyncio.to_thread(_click_toolbar, screen_width)),
+                        self._timed("first_navigation", self.browser.pages[0].goto(init_url)),
+                    )
                     break
                 except Exception as browser_error:
                     logger.info(f"Failed to launch browser: {browser_error}")
@@ -580,44 +1371,242 @@ class BrowserGuard:
             if count == 3:
                 raise RuntimeError("Failed to launch browser, retried 3 times")
 
+            if BROWSER_POOL_SIZE > 0:
+                await self._timed("pool", self._start_pool())
+
+            self.startup_timings["launch_attempts"] = count + 1
+            self.startup_timings["total"] = time.perf_counter() - started
+            LAUNCH_SECONDS.observe(self.startup_timings["total"], guard="playwright")
+            logger.info(f"Startup timings: {json.dumps(self.get_startup_timings())}")
             logger.info("Browser initialization completed successfully")
         except Exception as e:
             logger.info(f"Browser startup error: {str(e)}")
             raise RuntimeError(f"Browser initialization failed: {str(e)}")
 
-    async def shutdown(self):
-        """Clean up browser instance on shutdown"""
+    async def _timed(self, name: str, awaitable):
+        """等待 awaitable 并把耗时记入 startup_timings"""
+        started = time.perf_counter()
         try:
+            return await awaitable
+        finally:
+            self.startup_timings[name] = time.perf_counter() - started
+
+    def get_startup_timings(self) -> Dict[str, float]:
+        """最近一次启动的耗时分解，单位毫秒"""
+        return {
+            name: value if name == "launch_attempts" else round(value * 1000, 1)
+            for name, value in self.startup_timings.items()
+        }
+
+    async def _launch_context(self):
+        """用已构建好的启动参数启动持久化上下文，并在首次导航前注入 stealth 脚本"""
+        self.browser = await self._timed(
+            "launch",
+            self.playwright.chromium.launch_persistent_context(
+                executable_path="/usr/bin/chromium", **self.launch_options
+            ),
+        )
+        self._context_closed = False
+        self.browser.on("close", self._on_context_close)
+        for page in self.browser.pages:
+            self._track_page_load(page)
+        self.browser.on("page", self._track_page_load)
+
+        # Inject stealth evasions BEFORE first navigation
+        try:
+            await self._timed(
+                "init_script", self.browser.add_init_script(script=self.init_script)
+            )
+        except Exception as _:
+            pass
+
+        if self.interceptor:
+            await self._timed("intercept", self.interceptor.attach(self.browser))
+
+    def _track_page_load(self, page: Page):
+        """统计主框架从发起导航到 load 事件的耗时"""
+
+        def on_request(request):
+            try:
+                if request.is_navigation_request() and request.frame == page.main_frame:
+                    self._navigation_started[page] = time.perf_counter()
+            except Exception:
+                pass
+
+        def on_load(_):
+            started = self._navigation_started.pop(page, None)
+            if started is not None:
+                PAGE_LOAD_SECONDS.observe(time.perf_counter() - started)
+
+        page.on("request", on_request)
+        page.on("load", on_load)
+        page.on("close", lambda _: self._navigation_started.pop(page, None))
+
+    def _on_context_close(self, context: BrowserContext):
+        """上下文被关闭（浏览器进程退出或崩溃）"""
+        if context is self.browser:
+            self._context_closed = True
+
+    async def _start_pool(self):
+        """通过 CDP 连接到持久化上下文所在的 Chromium，在其上创建上下文池"""
+        browser = await self.playwright.chromium.connect_over_cdp("http://127.0.0.1:9222")
+        self.pool = BrowserContextPool.from_env(
+            browser,
+            context_options={key: self.launch_options[key] for key in POOL_CONTEXT_OPTIONS},
+            init_script=self.init_script,
+            context_setup=self.interceptor.attach if self.interceptor else None,
+        )
+        await self.pool.start()
+
+    async def _stop_pool(self):
+        if self.pool:
+            await self.pool.close()
+            # 只断开 CDP 连接，不会关闭 Chromium
+            await self.pool.browser.close()
+            self.pool = None
+
+    async def acquire_context(self, timeout: Optional[float] = None) -> ContextLease:
+        """从上下文池租用一个隔离的上下文"""
+        if not self.pool:
+            raise RuntimeError("Browser context pool is disabled, set BROWSER_POOL_SIZE")
+        return await self.pool.acquire(timeout)
+
+    async def release_context(self, lease: ContextLease):
+        """归还上下文，上下文会被重置"""
+        if self.pool:
+            await self.pool.release(lease)
+
+    async def _close_context(self):
+        """关闭上下文池和浏览器，保留 Playwright driver 供重启使用"""
+        try:
+            await self._stop_pool()
             if self.browser:
                 await self.browser.close()
-                self.browser = None
-                self.pages = []
-                self.current_page_index = 0
         except Exception as e:
-            logger.error(f"Shutdown error: {str(e)}")
+            logger.error(f"Close context error: {str(e)}")
+        finally:
+            self.browser = None
+            self.pages = []
+            self.current_page_index = 0
+
+    async def _stop_playwright(self):
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+            except Exception as e:
+                logger.error(f"Playwright stop error: {str(e)}")
+            self.playwright = None
+
+    async def shutdown(self):
+        """Clean up browser instance on shutdown"""
+        await self._close_context()
+        await self._stop_playwright()
+
+    async def _open_page(self):
+        """在现有上下文中新开标签页；上下文无响应时抛出 asyncio.TimeoutError"""
+        page = await asyncio.wait_for(self.browser.new_page(), RECOVERY_TIMEOUT)
+        try:
+            await page.goto(init_url)
+        except Exception as e:
+            # 导航失败不代表上下文有问题
+            logger.warning(f"新标签页导航失败: {e}")
+
+    async def _restart_context(self):
+        """
+        重启上下文：复用已构建的启动参数和 Playwright driver，
+        跳过版本探测、身份构建、启动重试和工具栏点击。
+        """
+        await self._stop_pool()
+        try:
+            await asyncio.wait_for(self.browser.close(), RECOVERY_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"关闭无响应的上下文出错: {e}")
+        await self._launch_context()
+        await self.browser.pages[0].goto(init_url)
+        if BROWSER_POOL_SIZE > 0:
+            await self._start_pool()
+
+    def _count_recovery(self, tier: str, reason: str):
+        self.recovery_counts[tier] += 1
+        RECOVERIES.inc(tier=tier, reason=reason)
+
+    async def _relaunch(self, reason: str = "crash"):
+        """完整地关闭并重新启动浏览器，然后恢复之前记录的标签页"""
+        self._count_recovery("relaunch", reason)
+        if self.session_recorder:
+            # 新浏览器的初始页面不能覆盖重启前记录的标签页
+            self.session_recorder.suspended = True
+        await self._close_context()
+        try:
+            await self.start()
+        except Exception:
+            # driver 本身可能已经失效，下次重启时重新创建
+            await self._stop_playwright()
+            raise
+        if self.session_recorder:
+            await self.session_recorder.restore(self.browser)
+
+    async def _recover(self):
+        """
+        分级恢复：
+        1. 上下文健康时只新开一个标签页
+        2. 新开页面失败（CDP 无响应）时重启上下文
+        3. 浏览器已崩溃或重启上下文失败时重新启动浏览器
+        """
+        if not self.browser or self._context_closed:
+            logger.info("浏览器已退出，重新启动浏览器...")
+            await self._relaunch()
+            return
+
+        try:
+            await self._open_page()
+            self._count_recovery("new_page", "tab_closed")
+            logger.info("已在现有上下文中新开标签页")
+            return
+        except Exception as e:
+            if self._context_closed:
+                logger.info(f"浏览器已退出，重新启动浏览器: {e}")
+                await self._relaunch()
+                return
+            logger.warning(f"新开标签页失败，重启上下文: {e}")
+
+        try:
+            await self._restart_context()
+            self._count_recovery("context_restart", "cdp_unresponsive")
+            logger.info("上下文已重启")
+        except Exception as e:
+            logger.error(f"重启上下文失败，重新启动浏览器: {e}")
+            await self._relaunch("restart_failed")
+
+    def get_intercept_report(self) -> Optional[Dict]:
+        """请求拦截的累计统计和最近的页面加载统计；未开启时返回 None"""
+        return self.interceptor.report() if self.interceptor else None
+
+    def get_recovery_stats(self) -> Dict[str, int]:
+        """各级恢复的次数"""
+        return dict(self.recovery_counts)
+
+    async def _memory_restart(self):
+        """内存看门狗触发的主动重启"""
+        async with self._restart_lock:
+            await self._relaunch("memory")
 
     async def _monitor_loop(self):
         """监控循环"""
         while self.running:
-            try:
-                # 检查标签页
-                logger.debug(f"浏览器状态: {self.browser}")
-                if not self.browser:
-                    logger.info("浏览器未启动，重新启动浏览器...")
-                    await self.shutdown()
-                    await self.start()
-                    continue
-                if not self.browser.pages:
-                    logger.info("浏览器没有打开标签页，重新启动浏览器...")
-                    await self.shutdown()
-                    await self.start()
+            async with self._restart_lock:
+                try:
+                    # 检查标签页
+                    logger.debug(f"浏览器状态: {self.browser}")
+                    if not self.browser or self._context_closed or not self.browser.pages:
+                        logger.info("浏览器没有打开标签页，开始恢复...")
+                        await self._recover()
 
-                logger.debug(f"浏览器标签页: {self.browser.pages}")
+                    logger.debug(f"浏览器标签页: {self.browser.pages}")
 
-            except Exception as e:
-                logger.error(f"监控循环出错: {e}")
-                await self.shutdown()
-                await self.start()
+                except Exception as e:
+                    logger.error(f"监控循环出错: {e}")
+                    await self._relaunch("monitor_error")
 
             await asyncio.sleep(self.check_interval)
 
@@ -628,12 +1617,53 @@ class BrowserGuard:
 
         self.running = True
 
+        if MEMORY_WATCHDOG_ENABLED:
+            self.memory_watchdog = ChromiumMemoryWatchdog.from_env(
+                "http://127.0.0.1:9222", self._memory_restart
+            )
+            self.memory_watchdog.start()
+        if TAB_BUDGET > 0:
+            self.tab_manager = TabBudgetManager.from_env("http://127.0.0.1:9222")
+            self.tab_manager.start()
+        if self.session_recorder:
+            if self.browser and not self._context_closed:
+                # 守护进程重启后先从磁盘上的记录恢复标签页，之后的记录才会覆盖该文件
+                self.session_recorder.suspended = True
+                try:
+                    await self.session_recorder.restore(self.browser)
+                except Exception as e:
+                    logger.warning(f"恢复上次记录的标签页失败: {e}")
+            self.session_recorder.start(lambda: None if self._context_closed else self.browser)
+        self.metrics_server = await _start_metrics_server(
+            lambda: len(self.browser.pages) if self.browser else 0,
+            lambda: self.memory_watchdog,
+        )
+        if self.tab_manager:
+            self.control_server = await _start_control_server(
+                {
+                    ("GET", "/tabs"): self.tab_manager.handle_report,
+                    ("POST", "/tabs/reopen"): self.tab_manager.handle_reopen,
+                }
+            )
+
         try:
             # 运行监控循环
             await self._monitor_loop()
         except Exception as e:
             logger.error(f"监控循环出错: {e}")
         finally:
+            for server in (self.metrics_server, self.control_server):
+                if server:
+                    await server.stop()
+            self.metrics_server = self.control_server = None
+            if self.memory_watchdog:
+                await self.memory_watchdog.stop()
+                self.memory_watchdog = None
+            if self.tab_manager:
+                await self.tab_manager.stop()
+                self.tab_manager = None
+            if self.session_recorder:
+                await self.session_recorder.stop()
             await self.shutdown()
 
     async def stop_async(self):
@@ -664,57 +1694,82 @@ class BrowserCDPGuard:
     Chromium 监控器，使用 CDP (Chrome DevTools Protocol) 直接控制浏览器。
 
     主要功能是在 Chromium 窗口被关闭或被最小化后自动打开新标签页或最大化窗口。
+    无头模式用于批量渲染：不依赖显示服务器，不做窗口最大化和 pyautogui 点击，
+    通过 render_pool 并行截图或打印 PDF。
     """
 
-    def __init__(self, check_interval: int = 1, executable_path: Optional[str] = None):
+    def __init__(
+        self,
+        check_interval: int = 1,
+        executable_path: Optional[str] = None,
+        watchdog_interval: float = 30.0,
+        headless: bool = False,
+    ):
         self.running = False
+        self.headless = headless
+        # 事件连接不可用时的轮询间隔
         self.check_interval = check_interval
+        # 事件连接正常时，看门狗兜底检查的间隔
+        self.watchdog_interval = watchdog_interval
         self.debugging_port = None
         self.browser_process = None
         self.cdp_url = "http://localhost:9222"
-        self.ws_connections = {}  # 存储每个标签页的 WebSocket 连接
         self.executable_path = executable_path or "/usr/bin/chromium"
+        # 复用连接的异步 HTTP 客户端，用于 DevTools HTTP 接口
+        self._http: Optional[httpx.AsyncClient] = None
+
+        # 浏览器级 CDP 连接，所有标签页的会话都复用这一个 WebSocket
+        self.cdp: Optional[CDPConnection] = None
+        # 并发调用只建立一个连接，并且只订阅一次事件
+        self._cdp_lock = asyncio.Lock()
+        self._page_targets: Dict[str, Dict] = {}
+        self._target_sessions: Dict[str, CDPSession] = {}
+        # 事件回调中启动的后台任务；保留引用，避免任务在完成前被回收
+        self._tasks: Set[asyncio.Task] = set()
+
+        # 监控循环的重启和内存看门狗的主动重启互斥
+        self._restart_lock = asyncio.Lock()
+        self.memory_watchdog: Optional[ChromiumMemoryWatchdog] = None
+        self.tab_manager: Optional[TabBudgetManager] = None
+
+        # 帧捕获服务；跨重连复用同一个对象，画面版本号保持单调递增
+        self.screencast: Optional[ScreencastCapture] = None
+        self._screencast_wanted: bool = False
+        # 多个事件可能同时触发切换，串行执行
+        self._screencast_follow_lock = asyncio.Lock()
+
+        self.metrics_server: Optional[MetricsServer] = None
+        self.control_server: Optional[MetricsServer] = None
+        # targetId -> 当前导航的开始时间
+        self._navigation_started: Dict[str, float] = {}
+
+        # 按需的性能 trace 录制，可通过控制接口的 POST /trace 触发
+        self.tracer: Optional[TraceCapture] = None
+        # 在第一个 await 之前占用，保证并发请求中只有一个能开始录制
+        self._trace_reserved = False
+        # 可交互元素快照，POST /snapshot
+        self.snapshotter: Optional[PageSnapshotter] = None
+        # 批量渲染的页面池，POST /render；随 CDP 连接一起重建
+        self.render_pool: Optional[RenderPool] = None
+        # 并发的渲染请求只创建一个渲染池
+        self._render_pool_lock = asyncio.Lock()
+        # 最近一次启动各阶段的耗时（秒）
+        self.startup_timings: Dict[str, float] = {}
 
     async def _send_cdp_command(
         self,
-        ws,
         command: str,
         params: Optional[Dict] = None,
         timeout: float = 5.0,
+        session_id: Optional[str] = None,
     ):
-        """发送 CDP 命令"""
-        if params is None:
-            params = {}
-
-        message = {"id": 1, "method": command, "params": params}
-
+        """发送 CDP 命令，失败时返回 None"""
         try:
-            data = json.dumps(message)
-            await ws.send(data)
-
-            # 使用 asyncio.wait_for 来实现超时
-            async def wait_for_response():
-                while True:
-                    response = await ws.recv()
-                    response_obj = json.loads(response)
-
-                    # 如果是事件消息，跳过继续等待
-                    if "method" in response_obj:
-                        logger.debug(f"收到事件消息: {response_obj['method']}")
-                        continue
-
-                    # 检查是否是我们发送的命令的响应
-                    if "id" in response_obj and response_obj["id"] == message["id"]:
-                        if "error" in response_obj:
-                            logger.error(f"CDP 命令错误: {response_obj['error']}")
-                            return None
-                        return response_obj.get("result", {})
-
-                    # 如果不是我们的响应，继续等待
-                    logger.info(f"收到未匹配的响应: {response_obj}")
-
-            return await asyncio.wait_for(wait_for_response(), timeout)
-
+            cdp = await self._ensure_cdp()
+            return await cdp.send(command, params, session_id=session_id, timeout=timeout)
+        except CDPError as e:
+            logger.error(f"CDP 命令错误: {e}")
+            return None
         except asyncio.TimeoutError:
             logger.error(f"CDP 命令超时: {command}")
             return None
@@ -724,14 +1779,15 @@ class BrowserCDPGuard:
 
     async def start(
         self,
-        headless: bool = False,
+        headless: Optional[bool] = None,
         debugging_port: int = 9222,
         retry_count: int = 6,
     ):
-        """启动 Chromium 浏览器进程"""
+        """启动 Chromium 浏览器进程；headless 为 None 时沿用构造时的设置（重启时保持不变）"""
         try:
-            import pyautogui
-
+            started = time.perf_counter()
+            if headless is not None:
+                self.headless = headless
             self.debugging_port = debugging_port
             self.cdp_url = f"http://localhost:{debugging_port}"
             url = os.getenv("CHROME_INIT_URL", "chrome://newtab/")
@@ -741,11 +1797,9 @@ class BrowserCDPGuard:
                 url,
                 f"--remote-debugging-port={debugging_port}",
                 "--remote-debugging-address=0.0.0.0",
-                "--window-position=0,0",
                 f"--window-size={SCREEN_WIDTH},{SCREEN_HEIGHT}",
                 "--no-first-run",
                 "--no-default-browser-check",
-                "--start-maximized",
                 "--no-sandbox",
                 "--disable-dbus",
                 "--disable-gpu",
@@ -754,7 +1808,7 @@ class BrowserCDPGuard:
                 "--log-file=/tmp/chromium_detailed.log",
                 "--disable-infobars",
                 "--disable-blink-features=AutomationControlled",
-                "--user-data-dir=/tmp/chromium_user_data",
+                f"--user-data-dir={CDP_USER_DATA_DIR}",
                 "--allow-file-access-from-files",  # This is a dangerous flag, use it at your own risk
                 "--load-extension=/app/pdf-viewer",
                 '--js-flags="--max_old_space_size=512"',
@@ -766,35 +1820,58 @@ class BrowserCDPGuard:
 
             chrome_args.extend(extra_args)
 
-            if headless:
+            if self.headless:
                 chrome_args.append("--headless")
+            else:
+                chrome_args.extend(["--window-position=0,0", "--start-maximized"])
 
+            self.startup_timings = {}
+            if not self.headless:
+                display_started = time.perf_counter()
+                if not await wait_for_display_async(timeout=DISPLAY_WAIT_TIMEOUT):
+                    logger.warning("显示服务器未就绪，继续启动")
+                self.startup_timings["display"] = time.perf_counter() - display_started
+
+            await asyncio.to_thread(ProfileMaintainer.from_env(CDP_USER_DATA_DIR).run)
+
+            launch_started = time.perf_counter()
             count = 0
             while count < retry_count:
-                # 启动浏览器进程
-                self.browser_process = subprocess.Popen(
-                    chrome_args,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
+                # 上一次运行留下的端口文件会让等待立即返回
+                port_file = os.path.join(CDP_USER_DATA_DIR, "DevToolsActivePort")
+                try:
+                    os.remove(port_file)
+                except FileNotFoundError:
+                    pass
+
+                # 启动浏览器进程；日志写入 --log-file，不需要管道
+                self.browser_process = await asyncio.create_subprocess_exec(
+                    *chrome_args,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
                 )
 
-                # 等待浏览器启动
-                time.sleep(0.5 * ((1.2) ** (count + 1)))
-
-                # 检查浏览器是否成功启动
-                if not self._is_browser_running():
+                # 等待 DevTools 端口就绪或进程提前退出，然后检查浏览器是否成功启动
+                await self._wait_for_devtools(port_file)
+                if not await self._is_browser_running():
                     count += 1
-                    self.browser_process.kill()
+                    if self.browser_process.returncode is None:
+                        self.browser_process.kill()
+                    await self.browser_process.wait()
                     logger.error(f"浏览器启动失败，尝试第 {count} 次")
-                    time.sleep(0.1 * (2**count))
+                    await asyncio.sleep(0.1 * (2**count))
                     continue
                 break
 
-            x, y = pyautogui.position()
-            width, _ = get_screensize()
-            pyautogui.click(width - 25, 115)
-            pyautogui.moveTo(x, y)
+            self.startup_timings["launch"] = time.perf_counter() - launch_started
+            if not self.headless:
+                width, _ = await _get_cached_screensize()
+                await asyncio.to_thread(_click_toolbar, width)
 
+            self.startup_timings["launch_attempts"] = count + 1
+            self.startup_timings["total"] = time.perf_counter() - started
+            LAUNCH_SECONDS.observe(self.startup_timings["total"], guard="cdp")
+            logger.info(f"Startup timings: {json.dumps(self.get_startup_timings())}")
             logger.info("Chromium 已启动并连接")
             return True
 
@@ -803,14 +1880,40 @@ class BrowserCDPGuard:
             await self.stop_async()
             return False
 
+    async def _wait_for_devtools(self, port_file: str) -> bool:
+        """
+        Chromium 在调试端口开始监听后写入 DevToolsActivePort；等待该文件出现或进程退出，
+        不按固定时长休眠
+        """
+        ready = asyncio.ensure_future(wait_for_path_async(port_file, DEVTOOLS_WAIT_TIMEOUT))
+        exited = asyncio.ensure_future(self.browser_process.wait())
+        try:
+            await asyncio.wait({ready, exited}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (ready, exited):
+                task.cancel()
+        return ready.done() and not ready.cancelled() and ready.result()
+
+    def get_startup_timings(self) -> Dict[str, float]:
+        """最近一次启动的耗时分解，单位毫秒"""
+        return {
+            name: value if name == "launch_attempts" else round(value * 1000, 1)
+            for name, value in self.startup_timings.items()
+        }
+
     async def connect_to_cdp(self, url: str):
         """连接到 CDP"""
         self.cdp_url = url
 
-    def _is_browser_running(self) -> bool:
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=5.0)
+        return self._http
+
+    async def _is_browser_running(self) -> bool:
         """检查浏览器是否在运行"""
         try:
-            response = requests.get(self.cdp_url + "/json/version", timeout=5)
+            response = await self._http_client().get(self.cdp_url + "/json/version")
             return response.status_code == 200
         except Exception as e:
             logger.error(f"检查浏览器是否在运行失败: {e}")
@@ -819,22 +1922,41 @@ class BrowserCDPGuard:
     async def get_cdp_tabs(self):
         """获取所有标签页"""
         try:
-            response = requests.get(f"{self.cdp_url}/json/list", timeout=5)
+            response = await self._http_client().get(f"{self.cdp_url}/json/list")
             if response.status_code != 200:
                 raise ValueError(f"获取标签页失败，状态码: {response.status_code}")
 
             tabs = response.json()
+            foreign = await self._foreign_target_ids()
             # 过滤出 type 为 "page" 的标签页，这些是正常的网页标签页，而不是其他类型的标签页（如 DevTools 等）
-            return [tab for tab in tabs if tab.get("type") == "page"]
+            return [tab for tab in tabs if tab.get("type") == "page" and tab.get("id") not in foreign]
         except Exception as e:
             raise ValueError(f"获取标签页失败: {e}")
 
+    async def _foreign_target_ids(self) -> Set[str]:
+        """
+        不属于默认浏览器上下文的 target（如渲染池的页面）。/json/list 不区分上下文，
+        通过已建立的浏览器级连接查询；没有连接时也就不存在由本进程创建的上下文
+        """
+        if not self.cdp or self.cdp.closed:
+            return set()
+        contexts, targets = await asyncio.gather(
+            self.cdp.send("Target.getBrowserContexts"), self.cdp.send("Target.getTargets")
+        )
+        # getBrowserContexts 只返回默认上下文以外的上下文
+        extra = set(contexts.get("browserContextIds", []))
+        return {
+            target["targetId"]
+            for target in targets.get("targetInfos", [])
+            if target.get("browserContextId") in extra
+        }
+
     async def open_new_tab(self, url: str = "chrome://newtab/"):
         """打开新标签页"""
         try:
             # 使用 PUT 方法创建新标签页
-            response = requests.put(
-                f"{self.cdp_url}/json/new", json={"url": url}, timeout=5
+            response = await self._http_client().put(
+                f"{self.cdp_url}/json/new", json={"url": url}
             )
             if response.status_code != 200:
                 print(response.text)
@@ -850,65 +1972,11 @@ class BrowserCDPGuard:
             logger.error(f"打开新标签页失败: {e}")
             return False
 
-    async def _connect_to_tab(self, ws_url: str):
-        """连接到标签页的 WebSocket"""
-        try:
-            # 如果已经存在连接，先关闭
-            if ws_url in self.ws_connections:
-                try:
-                    await self.ws_connections[ws_url].close()
-                except Exception as e:
-                    logger.error(f"关闭 WebSocket 连接失败: {e}")
-                del self.ws_connections[ws_url]
-
-            # 创建新连接
-            ws = await websockets.connect(
-                ws_url,
-                # ping_interval=None,  # 禁用自动ping
-                close_timeout=5,
-                max_size=None,
-            )
-
-            # 启用 Browser 域
-            self.ws_connections[ws_url] = ws
-            return ws
-        except Exception as e:
-            logger.error(f"连接到标签页 WebSocket 失败: {e}")
-            return None
-
     async def maximize_window(self, tab_id: str):
         """最大化窗口"""
-        ws_url = None
         try:
-            # 获取标签页信息
-            tabs = await self.get_cdp_tabs()
-            tab_info = next((tab for tab in tabs if tab["id"] == tab_id), None)
-
-            if not tab_info:
-                logger.warning(f"找不到标签页: {tab_id}")
-                return
-
-            # 获取或创建 WebSocket 连接
-            ws_url = tab_info["webSocketDebuggerUrl"]
-            ws = self.ws_connections.get(ws_url)
-
-            # 检查连接是否有效
-            if not ws:
-                logger.debug("WebSocket 连接已关闭，重新连接")
-                ws = None
-                if ws_url in self.ws_connections:
-                    del self.ws_connections[ws_url]
-
-            if not ws:
-                logger.debug(f"创建新的 WebSocket 连接: {ws_url}")
-                ws = await self._connect_to_tab(ws_url)
-                if not ws:
-                    logger.error("无法创建 WebSocket 连接")
-                    return
-
             # 先获取当前窗口状态
             window_state = await self._send_cdp_command(
-                ws,
                 "Browser.getWindowForTarget",
                 {"targetId": tab_id},  # 使用标签页ID而不是固定的windowId
                 timeout=3.0,
@@ -923,26 +1991,13 @@ class BrowserCDPGuard:
                 logger.error("无法获取窗口ID")
                 return
 
-            bounds: Dict = window_state.get("bounds", {})
-            current_state = bounds.get("windowState", "")
-
-            # 获取当前窗口状态
-            bounds_state = await self._send_cdp_command(
-                ws, "Browser.getWindowBounds", {"windowId": window_id}, timeout=3.0
-            )
-
-            if not bounds_state:
-                logger.error("获取窗口边界失败")
-                return
-
-            current_state = bounds_state.get("bounds", {}).get("windowState", "")
+            current_state = window_state.get("bounds", {}).get("windowState", "")
             logger.debug(f"当前窗口状态: {current_state}")
 
             # 如果窗口不是最大化状态，则进行最大化
             if current_state == "minimized":
                 # 恢复窗口
                 result = await self._send_cdp_command(
-                    ws,
                     "Browser.setWindowBounds",
                     {"windowId": window_id, "bounds": {"windowState": "normal"}},
                     timeout=3.0,
@@ -952,7 +2007,6 @@ class BrowserCDPGuard:
             elif current_state != "maximized":
                 # 最大化窗口
                 result = await self._send_cdp_command(
-                    ws,
                     "Browser.setWindowBounds",
                     {"windowId": window_id, "bounds": {"windowState": "maximized"}},
                     timeout=3.0,
@@ -961,48 +2015,399 @@ class BrowserCDPGuard:
                 if result is None:
                     logger.error("窗口最大化失败")
 
-        except websockets.exceptions.ConnectionClosed:
-            logger.warning("WebSocket 连接已关闭，将在下次循环重试")
-            if ws_url in self.ws_connections:
-                del self.ws_connections[ws_url]
         except Exception as e:
             logger.error(f"最大化窗口失败: {e}")
-            if ws_url and ws_url in self.ws_connections:
-                del self.ws_connections[ws_url]
 
-    async def _monitor_loop(self):
-        """监控循环"""
-        while self.running:
+    async def _ensure_cdp(self) -> CDPConnection:
+        """返回可用的浏览器级 CDP 连接，必要时重新连接并订阅 Target 事件"""
+        if self.cdp and not self.cdp.closed:
+            return self.cdp
+
+        async with self._cdp_lock:
+            # 等锁期间可能已由其他调用方连接
+            if self.cdp and not self.cdp.closed:
+                return self.cdp
+            response = await self._http_client().get(f"{self.cdp_url}/json/version")
+            self.cdp = await CDPConnection.connect(response.json()["webSocketDebuggerUrl"])
+            self._page_targets.clear()
+            self._target_sessions.clear()
+            self.cdp.on("Target.targetCreated", self._on_target_created)
+            self.cdp.on("Target.targetInfoChanged", self._on_target_info_changed)
+            self.cdp.on("Target.targetDestroyed", self._on_target_destroyed)
+            # 开启后会为已有的 target 补发 targetCreated 事件
+            await self.cdp.send("Target.setDiscoverTargets", {"discover": True})
+            logger.info("已订阅浏览器 Target 事件")
+            if self._screencast_wanted:
+                self._spawn(self._follow_screencast())
+            return self.cdp
+
+    def _spawn(self, coro):
+        """启动后台任务并保留引用，任务结束后自动移除"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _close_cdp(self):
+        """关闭浏览器级 CDP 连接"""
+        if self.screencast:
+            await self.screencast.stop()
+        if self.render_pool:
+            await self.render_pool.close()
+            self.render_pool = None
+        cdp, self.cdp = self.cdp, None
+        self._target_sessions.clear()
+        if cdp:
+            try:
+                await cdp.close()
+            except Exception as e:
+                logger.error(f"关闭 CDP 连接失败: {e}")
+
+    def _on_target_created(self, params: Dict):
+        target = params["targetInfo"]
+        if self.render_pool and target.get("browserContextId") == self.render_pool.context_id:
+            # 渲染池的页面由 RenderPool 自己管理，不计入标签页
+            return
+        if target.get("type") == "page":
+            self._page_targets[target["targetId"]] = target
+            self._spawn(self._watch_page_target(target["targetId"]))
+            if self._screencast_wanted and not (self.screencast and self.screencast.running):
+                self._spawn(self._follow_screencast())
+
+    def _on_target_info_changed(self, params: Dict):
+        target = params["targetInfo"]
+        if target["targetId"] in self._page_targets:
+            self._page_targets[target["targetId"]] = target
+
+    def _on_target_destroyed(self, params: Dict):
+        self._target_sessions.pop(params["targetId"], None)
+        if self.screencast and self.screencast.target_id == params["targetId"]:
+            self._spawn(self._follow_screencast())
+        self._navigation_started.pop(params["targetId"], None)
+        if self.snapshotter:
+            self.snapshotter.forget(params["targetId"])
+        if self._page_targets.pop(params["targetId"], None) and not self._page_targets:
+            logger.info("最后一个标签页已关闭，创建新标签页...")
+            RECOVERIES.inc(tier="new_page", reason="tab_closed")
+            self._spawn(self.open_new_tab())
+
+    async def _watch_page_target(self, target_id: str):
+        """附加到新标签页，通过 visibilitychange 回调感知窗口最小化（无头模式只记录页面加载耗时）"""
+        try:
+            session = await self.cdp.attach(target_id)
+        except Exception as e:
+            logger.debug(f"附加到标签页失败: {target_id} {e}")
+            return
+        self._target_sessions[target_id] = session
+
+        def on_binding_called(params: Dict):
+            if params.get("name") == VISIBILITY_BINDING:
+                # 页面变为不可见，可能是窗口被最小化
+                self._spawn(self.maximize_window(target_id))
+
+        def on_frame_started_loading(params: Dict):
+            # 页面 target 的主框架 ID 与 targetId 相同
+            if params.get("frameId") == target_id:
+                self._navigation_started[target_id] = time.perf_counter()
+
+        def on_load_event_fired(params: Dict):
+            started = self._navigation_started.pop(target_id, None)
+            if started is not None:
+                PAGE_LOAD_SECONDS.observe(time.perf_counter() - started)
+
+        session.on("Page.frameStartedLoading", on_frame_started_loading)
+        session.on("Page.loadEventFired", on_load_event_fired)
+        commands = [session.send("Page.enable")]
+        if not self.headless:
+            session.on("Runtime.bindingCalled", on_binding_called)
+            commands += [
+                session.send("Runtime.enable"),
+                session.send("Runtime.addBinding", {"name": VISIBILITY_BINDING}),
+                session.send(
+                    "Page.addScriptToEvaluateOnNewDocument", {"source": VISIBILITY_SCRIPT}
+                ),
+                session.send("Runtime.evaluate", {"expression": VISIBILITY_SCRIPT}),
+            ]
+        # 同一连接上的命令可以流水线并发发送
+        results = await asyncio.gather(*commands, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.debug(f"初始化标签页监听失败: {target_id} {result}")
+        if not self.headless:
+            await self.maximize_window(target_id)
+
+    async def _restart_browser(self, reason: str = "monitor_error"):
+        """杀掉浏览器进程并重新启动"""
+        RECOVERIES.inc(tier="relaunch", reason=reason)
+        # 清理所有连接
+        await self._close_cdp()
+        try:
+            if self.browser_process:
+                self.browser_process.terminate()
+                self.browser_process.kill()
+                await self.browser_process.wait()
+        except Exception as e:
+            logger.error(f"停止浏览器进程失败: {e}")
+        await self.start(debugging_port=self.debugging_port or 9222)
+
+    async def _memory_restart(self):
+        """内存看门狗触发的主动重启"""
+        async with self._restart_lock:
+            await self._restart_browser("memory")
+
+    async def start_screencast(self, target_id: Optional[str] = None) -> ScreencastCapture:
+        """在指定标签页（默认第一个标签页）上启动帧捕获"""
+        cdp = await self._ensure_cdp()
+        if self.screencast is None:
+            self.screencast = ScreencastCapture.from_env(cdp, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.screencast.cdp = cdp
+        self._screencast_wanted = True
+
+        if target_id is None:
+            tabs = await self.get_cdp_tabs()
+            if not tabs:
+                raise ValueError("没有找到标签页")
+            target_id = tabs[0]["id"]
+        await self.screencast.start(target_id)
+        return self.screencast
+
+    async def stop_screencast(self):
+        self._screencast_wanted = False
+        if self.screencast:
+            await self.screencast.stop()
+
+    async def _follow_screencast(self):
+        """捕获的标签页关闭或连接重建后，切换到当前的第一个标签页"""
+        async with self._screencast_follow_lock:
+            if not self._screencast_wanted:
+                return
+            if self.screencast:
+                await self.screencast.stop()
             try:
-                # 检查标签页
+                await self.start_screencast()
+            except Exception as e:
+                logger.debug(f"重新启动 screencast 失败: {e}")
+
+    def _screencast_status(self) -> Dict[str, Any]:
+        capture = self.screencast
+        return {
+            "running": bool(capture and capture.running),
+            "target_id": capture.target_id if capture else None,
+            "version": capture.version if capture else 0,
+            "stats": dict(capture.stats) if capture else {},
+        }
+
+    async def _screencast_route(self, body: bytes):
+        """POST /screencast，请求体为 JSON：enabled（默认 true，false 停止）、target_id；返回捕获状态"""
+        try:
+            options = json.loads(body or b"{}")
+            enabled = bool(options.get("enabled", True))
+        except (ValueError, TypeError, AttributeError):
+            return json_response({"error": "invalid JSON body"}, 400)
+        if not enabled:
+            await self.stop_screencast()
+            return json_response(self._screencast_status())
+        try:
+            await self.start_screencast(options.get("target_id"))
+        except ValueError as e:
+            return json_response({"error": str(e)}, 404)
+        except (CDPError, ConnectionError, asyncio.TimeoutError) as e:
+            return json_response({"error": f"screencast failed: {e}"}, 502)
+        return json_response(self._screencast_status())
+
+    async def _frame_route(self, body: bytes, query: Dict[str, str]):
+        """
+        GET /frame?since=N&wait=S，返回最新帧（image/jpeg），版本号在 X-Frame-Version 响应头中；
+        画面自版本 N 之后没有变化时返回 304，wait 为等待变化的最长秒数
+        """
+        try:
+            since = int(query["since"]) if "since" in query else None
+            wait = min(max(float(query.get("wait", 0)), 0.0), FRAME_MAX_WAIT)
+        except ValueError:
+            return json_response({"error": "since must be an integer and wait a number"}, 400)
+        capture = self.screencast
+        if capture is None or not capture.running:
+            return json_response({"error": "screencast is not running"}, 404)
+
+        if since is not None and wait:
+            await capture.wait_for_change(since, wait)
+        frame = capture.latest_frame()
+        if since is not None and (frame is None or not capture.changed_since(since)):
+            return 304, "image/jpeg", b"", {"X-Frame-Version": str(capture.version)}
+        if frame is None:
+            return json_response({"error": "no frame captured yet"}, 404)
+        return 200, "image/jpeg", frame["data"], {"X-Frame-Version": str(frame["version"])}
+
+    async def capture_trace(
+        self,
+        duration: float = 5.0,
+        target_id: Optional[str] = None,
+        reload: bool = False,
+        categories: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        在指定标签页（默认第一个标签页）上录制性能 trace，返回文件路径和摘要；
+        已有录制在进行时抛出 RuntimeError
+        """
+        if self._trace_reserved:
+            raise RuntimeError("A trace is already being recorded")
+        self._trace_reserved = True
+        try:
+            cdp = await self._ensure_cdp()
+            if self.tracer is None:
+                self.tracer = TraceCapture.from_env(cdp)
+            self.tracer.cdp = cdp
+
+            if target_id is None:
                 tabs = await self.get_cdp_tabs()
                 if not tabs:
-                    logger.info("没有打开的标签页，创建新标签页...")
-                    await self.open_new_tab()
-                    await asyncio.sleep(1)  # 等待标签页创建完成
-                    continue
+                    raise ValueError("没有找到标签页")
+                target_id = tabs[0]["id"]
+            return await self.tracer.capture(
+                target_id, duration, reload=reload, categories=categories
+            )
+        finally:
+            self._trace_reserved = False
 
-                # 只对第一个标签页进行最大化检查
-                await self.maximize_window(tabs[0]["id"])
+    async def _trace_route(self, body: bytes):
+        """POST /trace，请求体为 JSON：duration、target_id、reload、categories，均可省略"""
+        try:
+            options = json.loads(body or b"{}")
+            duration = float(options.get("duration", 5.0))
+        except (ValueError, TypeError, AttributeError):
+            return json_response({"error": "invalid JSON body"}, 400)
+        categories = options.get("categories")
+        if categories is not None and not (
+            isinstance(categories, list) and all(isinstance(c, str) for c in categories)
+        ):
+            return json_response({"error": "categories must be a list of strings"}, 400)
+        try:
+            summary = await self.capture_trace(
+                duration,
+                target_id=options.get("target_id"),
+                reload=bool(options.get("reload", False)),
+                categories=categories,
+            )
+        except RuntimeError as e:
+            return json_response({"error": str(e)}, 409)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 404)
+        return json_response(summary)
+
+    async def snapshot_page(
+        self, target_id: Optional[str] = None, since: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        返回标签页（默认第一个标签页）的可交互元素快照；since 为上一次快照的版本号时
+        只返回差异
+        """
+        cdp = await self._ensure_cdp()
+        if self.snapshotter is None:
+            self.snapshotter = PageSnapshotter(cdp)
+        self.snapshotter.cdp = cdp
+
+        if target_id is None:
+            tabs = await self.get_cdp_tabs()
+            if not tabs:
+                raise ValueError("没有找到标签页")
+            target_id = tabs[0]["id"]
+        return await self.snapshotter.capture(target_id, since=since)
 
+    async def _snapshot_route(self, body: bytes):
+        """POST /snapshot，请求体为 JSON：target_id、since，均可省略"""
+        try:
+            options = json.loads(body or b"{}")
+            since = options.get("since")
+            since = int(since) if since is not None else None
+        except (ValueError, TypeError, AttributeError):
+            return json_response({"error": "invalid JSON body"}, 400)
+        try:
+            snapshot = await self.snapshot_page(options.get("target_id"), since=since)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 404)
+        return json_response(snapshot)
+
+    async def get_render_pool(self) -> RenderPool:
+        """返回已启动的渲染池；CDP 连接重建后旧的池随之失效，这里按需重新创建"""
+        async with self._render_pool_lock:
+            cdp = await self._ensure_cdp()
+            if self.render_pool is None or self.render_pool.cdp is not cdp:
+                # 先发布再启动：池中页面的 targetCreated 事件需要据此识别并跳过；
+                # 其他调用方都经由这把锁取池，不会拿到尚未启动的池
+                self.render_pool = RenderPool.from_env(cdp)
+                try:
+                    await self.render_pool.start()
+                except Exception:
+                    pool, self.render_pool = self.render_pool, None
+                    await pool.close()
+                    raise
+            return self.render_pool
+
+    async def _render_route(self, body: bytes):
+        """
+        POST /render，请求体为 JSON：html 或 url（二选一）、format（png / jpeg / webp / pdf，
+        默认 png）、full_page、timeout；成功时直接返回图片或 PDF
+        """
+        try:
+            options = json.loads(body or b"{}")
+            output = options.get("format", "png")
+            timeout = float(options.get("timeout", 30.0))
+        except (ValueError, TypeError, AttributeError):
+            return json_response({"error": "invalid JSON body"}, 400)
+        pool = await self.get_render_pool()
+        try:
+            data = await pool.render(
+                html=options.get("html"),
+                url=options.get("url"),
+                output=output,
+                full_page=bool(options.get("full_page", False)),
+                timeout=timeout,
+            )
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+        except RuntimeError as e:
+            # 渲染池已关闭（浏览器重启中）或暂时没有可用页面
+            return json_response({"error": str(e)}, 503)
+        except (CDPError, ConnectionError, asyncio.TimeoutError) as e:
+            return json_response({"error": f"render failed: {e}"}, 502)
+        return 200, CONTENT_TYPES[output], data
+
+    async def _monitor_loop(self):
+        """监控循环：标签页关闭和窗口最小化由 CDP 事件驱动处理，这里只作为低频看门狗"""
+        while self.running:
+            try:
+                await self._ensure_cdp()
             except Exception as e:
-                logger.error(f"监控循环出错: {e}")
-                # 清理所有连接
-                for ws in self.ws_connections.values():
-                    try:
-                        await ws.close()
-                    except Exception as e:
-                        logger.error(f"关闭 WebSocket 连接失败: {e}")
-                self.ws_connections.clear()
+                logger.warning(f"建立浏览器事件连接失败，退回轮询模式: {e}")
+                await self._close_cdp()
+
+            async with self._restart_lock:
                 try:
-                    if self.browser_process:
-                        self.browser_process.terminate()
-                        self.browser_process.kill()
+                    # 检查标签页
+                    tabs = await self.get_cdp_tabs()
+                    if not tabs:
+                        logger.info("没有打开的标签页，创建新标签页...")
+                        RECOVERIES.inc(tier="new_page", reason="no_tabs")
+                        await self.open_new_tab()
+                        await asyncio.sleep(1)  # 等待标签页创建完成
+                        continue
+
+                    # 只对第一个标签页进行最大化检查；无头模式没有窗口
+                    if not self.headless:
+                        await self.maximize_window(tabs[0]["id"])
+
                 except Exception as e:
-                    logger.error(f"停止浏览器进程失败: {e}")
-                await self.start()
+                    logger.error(f"监控循环出错: {e}")
+                    await self._restart_browser()
 
-            await asyncio.sleep(self.check_interval)
+            # 事件连接正常时只需低频兜底；连接断开会提前唤醒
+            if self.cdp and not self.cdp.closed:
+                try:
+                    await asyncio.wait_for(self.cdp.wait_closed(), self.watchdog_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(self.check_interval)
 
     async def start_monitoring(self):
         """开始监控"""
@@ -1011,6 +2416,32 @@ class BrowserCDPGuard:
 
         self.running = True
 
+        if MEMORY_WATCHDOG_ENABLED:
+            self.memory_watchdog = ChromiumMemoryWatchdog.from_env(
+                self.cdp_url, self._memory_restart
+            )
+            self.memory_watchdog.start()
+        if TAB_BUDGET > 0:
+            self.tab_manager = TabBudgetManager.from_env(self.cdp_url)
+            self.tab_manager.start()
+
+        self.metrics_server = await _start_metrics_server(
+            lambda: len(self._page_targets) if self.cdp and not self.cdp.closed else None,
+            lambda: self.memory_watchdog,
+        )
+        routes: Dict[Tuple[str, str], RouteHandler] = {
+            ("POST", "/trace"): self._trace_route,
+            ("POST", "/snapshot"): self._snapshot_route,
+            ("POST", "/render"): self._render_route,
+            ("POST", "/screencast"): self._screencast_route,
+        }
+        if self.tab_manager:
+            routes[("GET", "/tabs")] = self.tab_manager.handle_report
+            routes[("POST", "/tabs/reopen")] = self.tab_manager.handle_reopen
+        self.control_server = await _start_control_server(
+            routes, {("GET", "/frame"): self._frame_route}
+        )
+
         try:
             # 运行监控循环
             await self._monitor_loop()
@@ -1023,25 +2454,42 @@ class BrowserCDPGuard:
         """异步停止监控和浏览器"""
         self.running = False
 
-        # 关闭所有 WebSocket 连接
-        for ws in self.ws_connections.values():
-            try:
-                await ws.close()
-            except Exception as e:
-                logger.error(f"关闭 WebSocket 连接失败: {e}")
-        self.ws_connections.clear()
+        for server in (self.metrics_server, self.control_server):
+            if server:
+                await server.stop()
+        self.metrics_server = self.control_server = None
+
+        if self.memory_watchdog:
+            await self.memory_watchdog.stop()
+            self.memory_watchdog = None
+
+        if self.tab_manager:
+            await self.tab_manager.stop()
+            self.tab_manager = None
+
+        # 关闭 CDP 连接
+        await self._close_cdp()
+
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
 
         # 关闭浏览器进程
         if self.browser_process:
             try:
                 self.browser_process.terminate()
                 await asyncio.sleep(0.1)  # 给进程一些时间来终止
-                if self.browser_process.poll() is None:
+                if self.browser_process.returncode is None:
                     self.browser_process.kill()
+                await self.browser_process.wait()
             except Exception as e:
                 logger.error(f"停止浏览器进程失败: {e}")
             self.browser_process = None
 
+        if self._http:
+            await self._http.aclose()
+            self._http = None
+
         logger.info("监控已停止")
 
     def stop(self):
@@ -1070,16 +2518,9 @@ class BrowserCDPGuard:
         tab_info = next((tab for tab in tabs if tab["type"] == "page"), None)
         if not tab_info:
             raise ValueError("没有找到标签页")
-        ws_url = tab_info["webSocketDebuggerUrl"]
-        ws = self.ws_connections.get(ws_url)
-        if not ws:
-            ws = await self._connect_to_tab(ws_url)
-            if not ws:
-                raise ValueError("无法连接到标签页的 WebSocket")
 
         # 先获取窗口ID
         window_state = await self._send_cdp_command(
-            ws,
             "Browser.getWindowForTarget",
             {"targetId": tab_info["id"]},
             timeout=3.0,
@@ -1094,7 +2535,6 @@ class BrowserCDPGuard:
 
         # 设置窗口大小
         await self._send_cdp_command(
-            ws,
             "Browser.setWindowBounds",
             {
                 "windowId": window_id,
@@ -1103,26 +2543,78 @@ class BrowserCDPGuard:
         )
 
 
-def wait_for_display(display=None, timeout=60):
-    """等待 X11 显示服务器准备就绪"""
-    if display is None:
-        display = os.getenv("DISPLAY", ":99")
+def display_socket_path(display: str) -> Optional[str]:
+    """本地显示（":99"、":99.0"、"unix:99"）对应的 X 套接字路径；远程显示返回 None"""
+    match = re.fullmatch(r"(unix)?:(\d+)(\.\d+)?", display)
+    return os.path.join(X11_SOCKET_DIR, f"X{match.group(2)}") if match else None
 
-    logger.info(f"等待显示服务器 {display} 准备就绪...")
 
-    start_time = time.time()
-    while time.time() - start_time < timeout:
+def _connect_display(display: str) -> bool:
+    """建立一次连接确认 X 服务器已在监听（套接字文件可能是上一个 X 服务器残留的）"""
+    path = display_socket_path(display)
+    if path is None:
         try:
-            # 尝试连接到 X11 显示服务器
             from Xlib import display as xlib_display
 
-            d = xlib_display.Display(display)
-            d.close()
-            logger.info(f"显示服务器 {display} 已准备就绪")
+            xlib_display.Display(display).close()
             return True
         except Exception as e:
             logger.debug(f"显示服务器未就绪: {e}")
-            time.sleep(0.5)
+            return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1.0)
+        try:
+            sock.connect(path)
+            return True
+        except OSError as e:
+            logger.debug(f"显示服务器未就绪: {e}")
+            return False
+
+
+def wait_for_display(display=None, timeout=60):
+    """
+    等待 X11 显示服务器准备就绪：本地显示通过 inotify 等待 /tmp/.X11-unix 下的套接字出现，
+    再连接一次确认；远程显示只能轮询连接
+    """
+    if display is None:
+        display = os.getenv("DISPLAY", ":99")
+
+    logger.info(f"等待显示服务器 {display} 准备就绪...")
+
+    start_time = time.monotonic()
+    path = display_socket_path(display)
+    while True:
+        remaining = timeout - (time.monotonic() - start_time)
+        if remaining <= 0:
+            break
+        if path is None or wait_for_path(path, remaining):
+            if _connect_display(display):
+                elapsed = (time.monotonic() - start_time) * 1000
+                logger.info(f"显示服务器 {display} 已准备就绪 ({elapsed:.0f}ms)")
+                return True
+            # 连接被拒绝：套接字是残留文件或服务器仍在初始化，稍后重试
+            time.sleep(min(0.1 if path else 0.5, max(remaining, 0)))
+
+    logger.error(f"超时：显示服务器 {display} 在 {timeout} 秒内未准备就绪")
+    return False
+
+
+async def wait_for_display_async(display=None, timeout=60) -> bool:
+    """wait_for_display 的异步版本，等待期间不占用线程"""
+    if display is None:
+        display = os.getenv("DISPLAY", ":99")
+
+    path = display_socket_path(display)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        if path is None or await wait_for_path_async(path, remaining):
+            if await asyncio.to_thread(_connect_display, display):
+                return True
+            await asyncio.sleep(min(0.1 if path else 0.5, max(remaining, 0)))
 
     logger.error(f"超时：显示服务器 {display} 在 {timeout} 秒内未准备就绪")
     return False
@@ -1155,19 +2647,73 @@ if __name__ == "__main__":
         default=60,
         help="Timeout in seconds for display wait (default: 60)",
     )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        default=os.getenv("BROWSER_HEADLESS", "false").lower() == "true",
+        help="Run the CDP guard headless for batch rendering: no display wait, "
+        "window maximization or pyautogui (default: from BROWSER_HEADLESS)",
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="PAGES",
+        default=0,
+        help="Start a headless browser, render PAGES pages through the render pool, "
+        "print the throughput as JSON and exit",
+    )
+    parser.add_argument(
+        "--benchmark-html",
+        type=str,
+        default=None,
+        help="HTML file rendered by --benchmark (default: a small built-in page)",
+    )
 
     args = parser.parse_args()
+    if args.benchmark:
+        args.headless = True
 
-    if args.wait_display:
+    if args.wait_display and args.headless:
+        logger.info("Headless mode, skipping display wait")
+    elif args.wait_display:
         success = wait_for_display(display=args.display, timeout=args.timeout)
         if not success:
             sys.exit(1)
         logger.info("Display server is ready")
 
-    if args.monitor:
+    if args.benchmark:
+
+        async def run_benchmark():
+            from browser_render import benchmark
+
+            if args.benchmark_html:
+                with open(args.benchmark_html) as f:
+                    html = f.read()
+            else:
+                html = "<h1>Browser Guard</h1>" + "<p>Lorem ipsum dolor sit amet.</p>" * 50
+            browser_guard = BrowserCDPGuard(headless=True)
+            if not await browser_guard.start():
+                return None
+            try:
+                pool = await browser_guard.get_render_pool()
+                return await benchmark(pool, html, pages=args.benchmark)
+            finally:
+                await browser_guard.stop_async()
+
+        import asyncio
+
+        result = asyncio.run(run_benchmark())
+        if result is None:
+            sys.exit(1)
+        print(json.dumps(result, indent=2))
+
+    elif args.monitor:
 
         async def run_monitor():
-            if os.getenv("USE_CDP", "false").lower() == "true":
+            if args.headless:
+                # 无头批量渲染只支持 CDP 守护
+                browser_guard = BrowserCDPGuard(headless=True)
+            elif os.getenv("USE_CDP", "false").lower() == "true":
                 browser_guard = BrowserCDPGuard()
             else:
                 browser_guard = BrowserGuard()
@@ -0,0 +1,351 @@
+"""
+请求拦截层
+
+基于 Playwright 的 context.route：按资源类型或域名拦截请求，并把静态资源（脚本、样式、
+字体、图片）缓存到本地磁盘，下次直接用缓存应答。每次页面加载统计命中率和节省的字节数。
+
+注意：开启路由后 Chromium 会对被路由的请求绕过自身的 HTTP 缓存，因此只在配置了
+BROWSER_INTERCEPT=true 时启用。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+from loguru import logger
+from playwright.async_api import BrowserContext, Page, Request, Route
+
+# 不匹配 s-maxage（只适用于共享缓存）
+MAX_AGE_PATTERN = re.compile(r"(?<![\w-])max-age=(\d+)")
+# 这些指令要求每次使用前向服务器验证或禁止存储；本缓存不做验证，直接不缓存
+UNCACHEABLE_DIRECTIVES = ("no-store", "no-cache", "private")
+# 只有 Last-Modified 时的启发式有效期：距上次修改时间的 10%（RFC 9111 4.2.2）
+HEURISTIC_FRACTION = 0.1
+# 响应体已经解压，这些头不能随缓存条目返回
+STRIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str], max_heuristic: float) -> float:
+    """
+    响应的新鲜期（秒），headers 的键为小写。依次取 max-age、Expires - Date，最后只在有
+    Last-Modified 时使用启发式有效期（不超过 max_heuristic）；都没有时为 0，不缓存。
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    match = MAX_AGE_PATTERN.search(cache_control)
+    if match:
+        return float(match.group(1))
+
+    date = _http_date(headers.get("date")) or time.time()
+    if "expires" in headers:
+        # 无法解析的 Expires（例如 "0"）表示已经过期
+        expires = _http_date(headers["expires"])
+        return max(0.0, expires - date) if expires is not None else 0.0
+
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified is not None and last_modified < date:
+        return min(max_heuristic, (date - last_modified) * HEURISTIC_FRACTION)
+    return 0.0
+
+
+class DiskResponseCache:
+    """
+    按大小上限淘汰（LRU）的磁盘响应缓存。
+
+    每个条目是一对文件：<key>.body 保存响应体，<key>.json 保存状态码、响应头和过期时间。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 << 20,
+        max_entry_bytes: int = 8 << 20,
+        # 启发式有效期的上限
+        default_ttl: float = 86400.0,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        # key -> 响应体大小，按最近使用排序
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        # get/put 在线程池中执行
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """启动时按访问时间重建 LRU 顺序"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, name[: -len(".body")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".json"
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _remove(self, key: str):
+        self.total_bytes -= self._entries.pop(key, 0)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """返回未过期的缓存条目：status、headers、body"""
+        with self._lock:
+            return self._get(url)
+
+    def _get(self, url: str) -> Optional[Dict[str, Any]]:
+        key = self.key_for(url)
+        if key not in self._entries:
+            return None
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["expires"] < time.time():
+                self._remove(key)
+                return None
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return {"status": meta["status"], "headers": meta["headers"], "body": body}
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> bool:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            return self._put(url, status, headers, body)
+
+    def _put(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> bool:
+        headers = {name.lower(): value for name, value in headers.items()}
+        cache_control = headers.get("cache-control", "").lower()
+        if any(directive in cache_control for directive in UNCACHEABLE_DIRECTIVES):
+            return False
+        # 缓存按 URL 索引，无法区分 Vary 指定的不同变体
+        if "vary" in headers:
+            return False
+        if len(body) > self.max_entry_bytes:
+            return False
+        ttl = freshness_lifetime(headers, self.default_ttl)
+        if ttl <= 0:
+            return False
+
+        key = self.key_for(url)
+        self._remove(key)
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(body_path, "wb") as f:
+                f.write(body)
+            with open(meta_path, "w") as f:
+                json.dump(
+                    {
+                        "url": url,
+                        "status": status,
+                        "headers": {
+                            name: value
+                            for name, value in headers.items()
+                            if name not in STRIPPED_HEADERS
+                        },
+                        "expires": time.time() + ttl,
+                    },
+                    f,
+                )
+        except OSError as e:
+            logger.debug(f"写入响应缓存失败: {e}")
+            self._remove(key)
+            return False
+
+        self._entries[key] = len(body)
+        self.total_bytes += len(body)
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+        return True
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+class RequestInterceptor:
+    """拦截 BrowserContext 的所有请求：屏蔽、命中缓存或放行并写入缓存"""
+
+    def __init__(
+        self,
+        block_types: Iterable[str] = (),
+        block_domains: Iterable[str] = (),
+        cache: Optional[DiskResponseCache] = None,
+        cache_types: Iterable[str] = ("stylesheet", "script", "font", "image"),
+    ):
+        self.block_types: Set[str] = set(block_types)
+        self.block_domains: Set[str] = set(block_domains)
+        self.cache = cache
+        self.cache_types: Set[str] = set(cache_types)
+        self.totals: Dict[str, int] = self._new_stats()
+        # 每个页面当前这次加载的统计，以及最近完成的加载
+        self._page_stats: Dict[Page, Dict[str, int]] = {}
+        self._load_urls: Dict[Page, str] = {}
+        self.recent_loads: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_env(cls) -> "RequestInterceptor":
+        cache_dir = os.getenv("BROWSER_CACHE_DIR", "/app/data/response_cache")
+        cache_mb = int(os.getenv("BROWSER_CACHE_MAX_MB", "256"))
+        return cls(
+            block_types=_split(os.getenv("BROWSER_BLOCK_RESOURCE_TYPES", "")),
+            block_domains=_split(os.getenv("BROWSER_BLOCK_DOMAINS", "")),
+            cache=DiskResponseCache(cache_dir, cache_mb << 20) if cache_mb > 0 else None,
+            cache_types=_split(os.getenv("BROWSER_CACHE_TYPES", "stylesheet,script,font,image")),
+        )
+
+    @staticmethod
+    def _new_stats() -> Dict[str, int]:
+        return {"requests": 0, "blocked": 0, "cache_hits": 0, "cache_misses": 0, "bytes_saved": 0}
+
+    def _is_blocked(self, request: Request) -> bool:
+        if request.resource_type in self.block_types:
+            return True
+        host = (urlsplit(request.url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.block_domains)
+
+    def _count(self, request: Request, name: str, value: int = 1):
+        self.totals[name] += value
+        try:
+            page = request.frame.page
+        except Exception:
+            # Service Worker 等请求没有所属页面
+            return
+        stats = self._page_stats.get(page)
+        if stats is not None:
+            stats[name] += value
+
+    def _on_navigation(self, request: Request):
+        """主框架发起新的导航：结束上一次加载的统计"""
+        try:
+            page = request.frame.page
+            if request.frame != page.main_frame or page not in self._page_stats:
+                return
+        except Exception:
+            return
+        self._finish_load(page)
+        self._page_stats[page] = self._new_stats()
+        self._load_urls[page] = request.url
+
+    async def _handle(self, route: Route, request: Request):
+        if request.is_navigation_request():
+            self._on_navigation(request)
+        self._count(request, "requests")
+        if self._is_blocked(request):
+            self._count(request, "blocked")
+            await route.abort("blockedbyclient")
+            return
+
+        cacheable = (
+            self.cache is not None
+            and request.method == "GET"
+            and request.resource_type in self.cache_types
+        )
+        if not cacheable:
+            await route.continue_()
+            return
+
+        entry = await asyncio.to_thread(self.cache.get, request.url)
+        if entry:
+            self._count(request, "cache_hits")
+            self._count(request, "bytes_saved", len(entry["body"]))
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+
+        self._count(request, "cache_misses")
+        response = await route.fetch()
+        body = await response.body()
+        if response.status == 200:
+            await asyncio.to_thread(self.cache.put, request.url, response.status, response.headers, body)
+        await route.fulfill(response=response, body=body)
+
+    async def _safe_handle(self, route: Route, request: Request):
+        try:
+            await self._handle(route, request)
+        except Exception as e:
+            logger.debug(f"拦截请求出错 {request.url}: {e}")
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    def _track_page(self, page: Page):
+        self._page_stats[page] = self._new_stats()
+        page.on("close", lambda _: self._finish_load(page, closing=True))
+
+    def _finish_load(self, page: Page, closing: bool = False):
+        """记录一次页面加载的统计并写日志"""
+        if closing:
+            stats = self._page_stats.pop(page, None)
+            url = self._load_urls.pop(page, None)
+        else:
+            stats = self._page_stats.get(page)
+            url = self._load_urls.get(page)
+        if not stats or not stats["requests"]:
+            return
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        report = {
+            "url": url or page.url,
+            **stats,
+            "hit_rate": round(stats["cache_hits"] / lookups, 3) if lookups else 0.0,
+        }
+        self.recent_loads = (self.recent_loads + [report])[-50:]
+        logger.info(
+            f"页面加载拦截统计 {report['url']}: 请求 {stats['requests']}, 屏蔽 {stats['blocked']}, "
+            f"缓存命中率 {report['hit_rate']:.0%}, 节省 {stats['bytes_saved'] >> 10}KB"
+        )
+
+    async def attach(self, context: BrowserContext):
+        """在上下文上启用拦截，并跟踪已有和新建页面的加载统计"""
+        for page in context.pages:
+            self._track_page(page)
+        context.on("page", self._track_page)
+        await context.route("**/*", self._safe_handle)
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.totals["cache_hits"] + self.totals["cache_misses"]
+        return {
+            **self.totals,
+            "hit_rate": round(self.totals["cache_hits"] / lookups, 3) if lookups else 0.0,
+            "cache_bytes": self.cache.total_bytes if self.cache else 0,
+            "recent_loads": list(self.recent_loads),
+        }
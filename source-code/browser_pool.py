@@ -0,0 +1,220 @@
+"""
+浏览器上下文池
+
+在同一个 Chromium 上维护 N 个预热的隔离上下文（无痕模式，互不共享 cookie 和存储），
+通过异步的 lease/release 接口分配给并发的会话。上下文在归还后整体关闭并重建，
+保证下一个租用者拿到的是干净的状态。并发高峰后预热数量随之增加（不超过 max_size），
+空闲超时后再收缩到最小数量。
+
+    pool = BrowserContextPool(browser, min_size=2, max_size=8)
+    await pool.start()
+    async with pool.lease() as lease:
+        await lease.page.goto("https://example.com")
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from playwright.async_api import Browser, BrowserContext, Page
+
+
+class ContextLease:
+    """一次租用：上下文、初始页面和租用时间"""
+
+    def __init__(self, context: BrowserContext, page: Page):
+        self.lease_id: str = uuid.uuid4().hex
+        self.context = context
+        self.page = page
+        self.leased_at: float = time.time()
+
+
+class BrowserContextPool:
+    """
+    Chromium 上下文池。
+
+    min_size 个上下文常驻预热，最多同时租出 max_size 个；超出时 acquire 排队等待。
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        min_size: int = 2,
+        max_size: int = 8,
+        idle_timeout: float = 300.0,
+        context_options: Optional[Dict[str, Any]] = None,
+        init_script: Optional[str] = None,
+        context_setup: Optional[Callable[[BrowserContext], Awaitable[Any]]] = None,
+    ):
+        self.browser = browser
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.idle_timeout = idle_timeout
+        self.context_options: Dict[str, Any] = context_options or {}
+        self.init_script = init_script
+        # 新建上下文后的额外初始化，例如挂载请求拦截
+        self.context_setup = context_setup
+
+        self._idle: List[Dict[str, Any]] = []
+        # 预热目标：min_size 与最近并发租用峰值中的较大者，空闲收缩时回落
+        self._warm_target = self.min_size
+        self._leases: Dict[str, ContextLease] = {}
+        self._semaphore = asyncio.Semaphore(self.max_size)
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+        self._shrink_task: Optional[asyncio.Task] = None
+        self.running: bool = False
+
+    @classmethod
+    def from_env(cls, browser: Browser, **kwargs) -> "BrowserContextPool":
+        """从环境变量读取池大小：BROWSER_POOL_SIZE / BROWSER_POOL_MAX / BROWSER_POOL_IDLE_TIMEOUT"""
+        min_size = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        return cls(
+            browser,
+            min_size=min_size,
+            max_size=int(os.getenv("BROWSER_POOL_MAX", str(max(min_size, 8)))),
+            idle_timeout=float(os.getenv("BROWSER_POOL_IDLE_TIMEOUT", "300")),
+            **kwargs,
+        )
+
+    async def _new_context(self) -> Dict[str, Any]:
+        context = await self.browser.new_context(**self.context_options)
+        if self.init_script:
+            await context.add_init_script(script=self.init_script)
+        if self.context_setup:
+            await self.context_setup(context)
+        page = await context.new_page()
+        return {"context": context, "page": page, "idle_since": time.time()}
+
+    async def _close_entry(self, context: BrowserContext):
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"关闭上下文出错: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self):
+        """补充空闲上下文到预热目标（已租出的也计入总数，不超过 max_size）；加锁避免并发补充"""
+        async with self._lock:
+            while (
+                self.running
+                and len(self._idle) < self._warm_target
+                and len(self._idle) + len(self._leases) < self.max_size
+            ):
+                try:
+                    entry = await self._new_context()
+                except Exception as e:
+                    logger.error(f"预热上下文失败: {e}")
+                    return
+                if not self.running:
+                    await self._close_entry(entry["context"])
+                    return
+                self._idle.append(entry)
+
+    async def _shrink_loop(self):
+        """空闲超过 idle_timeout 的上下文被关闭，直到只剩 min_size 个"""
+        interval = max(1.0, min(self.idle_timeout / 2, 30.0))
+        while self.running:
+            await asyncio.sleep(interval)
+            now = time.time()
+            expired: List[Dict[str, Any]] = []
+            while len(self._idle) > self.min_size:
+                oldest = min(self._idle, key=lambda entry: entry["idle_since"])
+                if now - oldest["idle_since"] < self.idle_timeout:
+                    break
+                self._idle.remove(oldest)
+                expired.append(oldest)
+            if expired:
+                # 高峰已过，后续只补充到剩余的空闲数量
+                self._warm_target = max(self.min_size, len(self._idle))
+            for entry in expired:
+                await self._close_entry(entry["context"])
+            if expired:
+                logger.info(f"收缩上下文池: 关闭 {len(expired)} 个空闲上下文")
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        await self._refill()
+        self._shrink_task = asyncio.create_task(self._shrink_loop())
+        logger.info(
+            f"上下文池已启动: 预热 {len(self._idle)} 个, 最大并发 {self.max_size}"
+        )
+
+    async def acquire(self, timeout: Optional[float] = None) -> ContextLease:
+        """租用一个干净的上下文；池已满时等待，超时抛出 asyncio.TimeoutError"""
+        if not self.running:
+            raise RuntimeError("Browser context pool is not running")
+
+        await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        try:
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                entry = await self._new_context()
+        except Exception:
+            self._semaphore.release()
+            raise
+
+        lease = ContextLease(entry["context"], entry["page"])
+        self._leases[lease.lease_id] = lease
+        self._warm_target = min(self.max_size, max(self._warm_target, len(self._leases)))
+        # 被取走的预热上下文在后台补上
+        self._spawn(self._refill())
+        return lease
+
+    async def release(self, lease: ContextLease):
+        """归还上下文：关闭并重建，下一个租用者不会看到上一次的 cookie、存储和页面"""
+        if self._leases.pop(lease.lease_id, None) is None:
+            return
+        try:
+            await self._close_entry(lease.context)
+        finally:
+            self._semaphore.release()
+        if self.running:
+            self._spawn(self._refill())
+
+    @asynccontextmanager
+    async def lease(self, timeout: Optional[float] = None):
+        lease = await self.acquire(timeout)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "idle": len(self._idle),
+            "leased": len(self._leases),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+    async def close(self):
+        """关闭池内所有上下文，包括仍被租用的"""
+        self.running = False
+        if self._shrink_task:
+            self._shrink_task.cancel()
+            self._shrink_task = None
+        for task in list(self._tasks):
+            task.cancel()
+
+        contexts = [entry["context"] for entry in self._idle]
+        self._idle = []
+        contexts += [lease.context for lease in self._leases.values()]
+        for lease_id in list(self._leases):
+            self._leases.pop(lease_id)
+            self._semaphore.release()
+        await asyncio.gather(
+            *(self._close_entry(context) for context in contexts),
+            return_exceptions=True,
+        )
+        logger.info("上下文池已关闭")
@@ -0,0 +1,234 @@
+"""
+Chromium 用户数据目录维护
+
+每次启动浏览器之前运行：按子目录限制缓存和站点存储的大小，删除崩溃转储和过期的
+Singleton 锁。HTTP 缓存的上限同时通过 --disk-cache-size 交给浏览器自己淘汰；站点存储
+超限时只整体删除，不删除其中的单个文件。配置了黄金 profile 时，可以用它替换当前目录，快速得到干净的启动状态。
+
+这里的操作都是阻塞的文件系统调用，在异步代码中应通过 asyncio.to_thread 调用。
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+from loguru import logger
+
+# 可以整体删除的缓存目录，浏览器会按需重建
+DISPOSABLE_DIRS = {
+    "Default/Cache",
+    "Default/Code Cache",
+    "Default/GPUCache",
+    "Default/DawnCache",
+    "Default/DawnGraphiteCache",
+    "GrShaderCache",
+    "GraphiteDawnCache",
+    "ShaderCache",
+    "component_crx_cache",
+}
+# 各子目录的默认大小上限（MB）。站点存储（IndexedDB 的 .leveldb / .blob、Service Worker
+# 的数据库和 CacheStorage）内部互相引用，并由 QuotaManager 记录用量，删除单个子项会留下
+# 不一致的数据，所以超限时整个目录连同 QuotaManager 数据库一起删除，由浏览器重建
+DEFAULT_CAPS_MB = {
+    "Default/Cache": 256,
+    "Default/Code Cache": 128,
+    "Default/GPUCache": 32,
+    "Default/DawnCache": 32,
+    "Default/DawnGraphiteCache": 32,
+    "GrShaderCache": 32,
+    "GraphiteDawnCache": 32,
+    "ShaderCache": 32,
+    "component_crx_cache": 32,
+    "Default/Service Worker": 192,
+    "Default/IndexedDB": 256,
+    "Default/File System": 64,
+}
+QUOTA_FILES = ("Default/QuotaManager", "Default/QuotaManager-journal")
+CRASH_DIRS = ("Crash Reports", "Crashpad")
+SINGLETON_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie")
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _remove(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def parse_caps(value: str) -> Dict[str, int]:
+    """解析 "Default/Cache=256,Default/IndexedDB=512" 形式的配置（MB）"""
+    caps = {}
+    for item in value.split(","):
+        name, _, size = item.partition("=")
+        if name.strip() and size.strip():
+            caps[name.strip()] = int(size)
+    return caps
+
+
+class ProfileMaintainer:
+    """启动前维护一个 Chromium 用户数据目录"""
+
+    def __init__(
+        self,
+        profile_dir: str,
+        caps_mb: Optional[Dict[str, int]] = None,
+        golden_dir: Optional[str] = None,
+        reset: bool = False,
+    ):
+        self.profile_dir = profile_dir
+        self.caps = {
+            name: size << 20 for name, size in (DEFAULT_CAPS_MB if caps_mb is None else caps_mb).items()
+        }
+        self.golden_dir = golden_dir
+        # 为 True 时每次启动都从黄金 profile 重建，否则只在目录不存在时使用
+        self.reset = reset
+
+    @classmethod
+    def from_env(cls, profile_dir: str) -> "ProfileMaintainer":
+        caps = dict(DEFAULT_CAPS_MB)
+        caps.update(parse_caps(os.getenv("BROWSER_PROFILE_CAPS_MB", "")))
+        return cls(
+            profile_dir,
+            caps_mb=caps,
+            golden_dir=os.getenv("BROWSER_GOLDEN_PROFILE") or None,
+            reset=os.getenv("BROWSER_PROFILE_RESET", "false").lower() == "true",
+        )
+
+    def _lock_owner(self) -> Optional[Tuple[str, int]]:
+        """SingletonLock 是指向 "主机名-PID" 的符号链接"""
+        try:
+            target = os.readlink(os.path.join(self.profile_dir, "SingletonLock"))
+        except OSError:
+            return None
+        host, _, pid = target.rpartition("-")
+        return (host, int(pid)) if pid.isdigit() else None
+
+    def in_use(self) -> bool:
+        """本机上仍有进程持有该 profile 的锁"""
+        owner = self._lock_owner()
+        if owner is None:
+            return False
+        host, pid = owner
+        return host == socket.gethostname() and psutil.pid_exists(pid)
+
+    def _clear_singletons(self, removed: List[str]):
+        for name in SINGLETON_FILES:
+            path = os.path.join(self.profile_dir, name)
+            if os.path.lexists(path):
+                _remove(path)
+                removed.append(name)
+
+    def _restore_golden(self) -> bool:
+        """
+        用黄金 profile 替换当前目录。使用 cp --reflink=auto：在支持写时复制的文件系统上
+        几乎是瞬间完成，否则退化为普通复制。不使用硬链接，因为 Chromium 会原地改写
+        SQLite / LevelDB 文件，硬链接会把这些修改写回黄金 profile。
+        """
+        if not self.golden_dir or not os.path.isdir(self.golden_dir):
+            return False
+        if os.path.isdir(self.profile_dir) and not self.reset:
+            return False
+
+        staging = f"{self.profile_dir}.seed-{os.getpid()}"
+        _remove(staging)
+        os.makedirs(os.path.dirname(os.path.abspath(self.profile_dir)), exist_ok=True)
+        try:
+            subprocess.run(
+                ["cp", "-a", "--reflink=auto", self.golden_dir, staging],
+                check=True,
+                capture_output=True,
+                timeout=120,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"复制黄金 profile 失败，改用 shutil: {e}")
+            _remove(staging)
+            shutil.copytree(self.golden_dir, staging, symlinks=True)
+
+        # 先把旧目录移开再换入新目录，中途失败也不会留下半个 profile
+        old = f"{self.profile_dir}.old-{os.getpid()}"
+        if os.path.exists(self.profile_dir):
+            os.rename(self.profile_dir, old)
+        os.rename(staging, self.profile_dir)
+        _remove(old)
+        return True
+
+    @property
+    def disk_cache_size(self) -> Optional[int]:
+        """HTTP 缓存的上限（字节），用于 --disk-cache-size"""
+        return self.caps.get("Default/Cache")
+
+    def _enforce_cap(self, name: str, cap: int) -> int:
+        """超限的目录整体删除；站点存储目录同时删除 QuotaManager 数据库，让用量重新统计"""
+        path = os.path.join(self.profile_dir, name)
+        if not os.path.isdir(path):
+            return 0
+        size = _tree_size(path)
+        if size <= cap:
+            return 0
+        _remove(path)
+        if name not in DISPOSABLE_DIRS:
+            for quota_name in QUOTA_FILES:
+                quota_path = os.path.join(self.profile_dir, quota_name)
+                if os.path.lexists(quota_path):
+                    try:
+                        size += os.lstat(quota_path).st_size
+                    except OSError:
+                        pass
+                    _remove(quota_path)
+        return size
+
+    def run(self) -> Dict[str, Any]:
+        """执行一次维护，返回释放的空间和删除的条目"""
+        started = time.perf_counter()
+        report: Dict[str, Any] = {"restored": False, "freed_bytes": 0, "removed": []}
+        if self.in_use():
+            logger.warning(f"profile 正在被使用，跳过维护: {self.profile_dir}")
+            report["skipped"] = True
+            return report
+
+        report["restored"] = self._restore_golden()
+        if not os.path.isdir(self.profile_dir):
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return report
+
+        # 锁的持有进程已经退出（例如浏览器崩溃），残留的锁会让新进程以为 profile 被占用
+        self._clear_singletons(report["removed"])
+
+        for name in CRASH_DIRS:
+            path = os.path.join(self.profile_dir, name)
+            if os.path.isdir(path):
+                report["freed_bytes"] += _tree_size(path)
+                _remove(path)
+                report["removed"].append(name)
+
+        for name, cap in self.caps.items():
+            freed = self._enforce_cap(name, cap)
+            if freed:
+                report["freed_bytes"] += freed
+                report["removed"].append(name)
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if report["removed"] or report["restored"]:
+            logger.info(
+                f"profile 维护完成 {self.profile_dir}: 释放 {report['freed_bytes'] >> 20}MB, "
+                f"清理 {report['removed']}, 从黄金 profile 恢复: {report['restored']}"
+            )
+        return report
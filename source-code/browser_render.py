@@ -0,0 +1,316 @@
+"""
+无头批量渲染
+
+在一个独立的 BrowserContext 中预先创建固定数量的页面 target，作为渲染池：每个任务借用
+一个空闲页面，载入 HTML 或 URL，等待字体和图片加载完成后截图或打印 PDF，再归还页面。
+页面复用，不为每个任务创建和销毁 target，但每个 HTML 任务前都先回到空白页，上一个任务
+的全局变量、定时器和所在源不会带入下一个任务；某个页面出错时只替换它自己。
+
+    pool = RenderPool.from_env(guard.cdp)
+    await pool.start()
+    png = await pool.render(html="<h1>hello</h1>")
+    pdf = await pool.render(url="https://example.com/", output="pdf")
+    print(await benchmark(pool, "<h1>hello</h1>", pages=100))
+"""
+
+import asyncio
+import base64
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+
+from cdp_client import CDPConnection, CDPError, CDPSession
+from guard_metrics import metrics
+
+OUTPUT_FORMATS = ("png", "jpeg", "webp", "pdf")
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "pdf": "application/pdf",
+}
+# 字体加载完成且所有图片加载结束（成功或失败）后才开始截图
+READY_SCRIPT = """Promise.all([
+    document.fonts.ready,
+    ...Array.from(document.images, (img) => img.complete ? null : new Promise((resolve) => {
+        img.addEventListener("load", resolve, { once: true });
+        img.addEventListener("error", resolve, { once: true });
+    })),
+]).then(() => true)"""
+
+# 替换出错页面失败后的重试间隔（秒），每次翻倍直到上限
+REPLACE_RETRY_DELAY = 1.0
+REPLACE_RETRY_MAX_DELAY = 30.0
+
+RENDER_SECONDS = metrics.histogram(
+    "browser_guard_render_seconds",
+    "Batch render duration from acquiring a pool page to the encoded output",
+    ["output", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+
+
+class RenderTarget:
+    """渲染池中的一个页面"""
+
+    def __init__(self, target_id: str, session: CDPSession):
+        self.target_id = target_id
+        self.session = session
+        self.loaded = asyncio.Event()
+        session.on("Page.loadEventFired", lambda _: self.loaded.set())
+        self.jobs = 0
+
+
+class RenderPool:
+    """固定大小的页面池，供并行渲染任务使用"""
+
+    def __init__(self, cdp: CDPConnection, size: int = 4, width: int = 1280, height: int = 800):
+        self.cdp = cdp
+        self.size = size
+        self.width = width
+        self.height = height
+        self.context_id: Optional[str] = None
+        # None 是关闭标记：取到它的任务放回后报错，依次唤醒所有等待者
+        self._idle: "asyncio.Queue[Optional[RenderTarget]]" = asyncio.Queue()
+        self._targets: Dict[str, RenderTarget] = {}
+        # 连续替换页面失败的次数；池中已没有页面时据此立即失败，而不是一直等待
+        self._replace_failures = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, cdp: CDPConnection) -> "RenderPool":
+        return cls(
+            cdp,
+            size=int(os.getenv("BROWSER_RENDER_POOL_SIZE", "4")),
+            width=int(os.getenv("BROWSER_RENDER_WIDTH", "1280")),
+            height=int(os.getenv("BROWSER_RENDER_HEIGHT", "800")),
+        )
+
+    @property
+    def started(self) -> bool:
+        return self.context_id is not None
+
+    async def _create_target(self) -> RenderTarget:
+        result = await self.cdp.send(
+            "Target.createTarget",
+            {
+                "url": "about:blank",
+                "browserContextId": self.context_id,
+                "width": self.width,
+                "height": self.height,
+                "background": True,
+            },
+        )
+        target_id = result["targetId"]
+        session = await self.cdp.attach(target_id)
+        await asyncio.gather(
+            session.send("Page.enable"),
+            session.send(
+                "Emulation.setDeviceMetricsOverride",
+                {"width": self.width, "height": self.height, "deviceScaleFactor": 1, "mobile": False},
+            ),
+        )
+        target = RenderTarget(target_id, session)
+        self._targets[target_id] = target
+        return target
+
+    async def _close_target(self, target: RenderTarget):
+        self._targets.pop(target.target_id, None)
+        try:
+            await self.cdp.send("Target.closeTarget", {"targetId": target.target_id})
+        except Exception as e:
+            logger.debug(f"关闭渲染页面失败 {target.target_id}: {e}")
+
+    async def start(self):
+        """创建独立的 BrowserContext 和池中的页面；CDP 连接断开时浏览器会自动销毁该上下文"""
+        if self.started:
+            return
+        # 丢弃上一次关闭留下的关闭标记
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        self._replace_failures = 0
+        result = await self.cdp.send("Target.createBrowserContext", {"disposeOnDetach": True})
+        self.context_id = result["browserContextId"]
+        targets = await asyncio.gather(*(self._create_target() for _ in range(self.size)))
+        for target in targets:
+            self._idle.put_nowait(target)
+        logger.info(f"渲染池已就绪: {self.size} 个页面, {self.width}x{self.height}")
+
+    async def close(self):
+        """销毁上下文；正在等待空闲页面的任务收到 RuntimeError，之后归还的页面直接丢弃"""
+        context_id, self.context_id = self.context_id, None
+        self._targets.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        self._idle.put_nowait(None)
+        if context_id and not self.cdp.closed:
+            try:
+                await self.cdp.send("Target.disposeBrowserContext", {"browserContextId": context_id})
+            except Exception as e:
+                logger.debug(f"销毁渲染上下文失败: {e}")
+
+    async def _navigate(self, target: RenderTarget, url: str, timeout: float):
+        target.loaded.clear()
+        result = await target.session.send("Page.navigate", {"url": url}, timeout=timeout)
+        if result.get("errorText"):
+            raise ValueError(f"加载失败 {url}: {result['errorText']}")
+        await asyncio.wait_for(target.loaded.wait(), timeout)
+
+    async def _load(self, target: RenderTarget, html: Optional[str], url: Optional[str], timeout: float):
+        session = target.session
+        if url is not None:
+            # 跨文档导航总会创建新的全局对象
+            await self._navigate(target, url, timeout)
+        else:
+            # setDocumentContent 只替换文档，window 上的全局变量、定时器和源都会保留，
+            # 所以先导航到空白页丢弃上一个任务的状态
+            await self._navigate(target, "about:blank", timeout)
+            # 页面 target 的主框架 ID 与 targetId 相同
+            await session.send(
+                "Page.setDocumentContent", {"frameId": target.target_id, "html": html}, timeout=timeout
+            )
+        await session.send(
+            "Runtime.evaluate",
+            {"expression": READY_SCRIPT, "awaitPromise": True, "returnByValue": True},
+            timeout=timeout,
+        )
+
+    async def _capture(self, target: RenderTarget, output: str, full_page: bool, timeout: float) -> bytes:
+        session = target.session
+        if output == "pdf":
+            result = await session.send("Page.printToPDF", {"printBackground": True}, timeout=timeout)
+            return base64.b64decode(result["data"])
+
+        params: Dict[str, Any] = {"format": output}
+        if full_page:
+            layout = await session.send("Page.getLayoutMetrics")
+            content = layout.get("cssContentSize") or layout.get("contentSize", {})
+            params["captureBeyondViewport"] = True
+            params["clip"] = {
+                "x": 0,
+                "y": 0,
+                "width": max(content.get("width", self.width), 1),
+                "height": max(content.get("height", self.height), 1),
+                "scale": 1,
+            }
+        result = await session.send("Page.captureScreenshot", params, timeout=timeout)
+        return base64.b64decode(result["data"])
+
+    async def render(
+        self,
+        html: Optional[str] = None,
+        url: Optional[str] = None,
+        output: str = "png",
+        full_page: bool = False,
+        timeout: float = 30.0,
+    ) -> bytes:
+        """渲染 html 或 url（二选一）为 png / jpeg / webp 图片或 pdf，返回文件内容"""
+        if (html is None) == (url is None):
+            raise ValueError("html 和 url 必须且只能指定一个")
+        if output not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output}")
+        if not self.started:
+            raise RuntimeError("渲染池尚未启动")
+        if not self._targets and self._replace_failures:
+            raise RuntimeError("渲染池没有可用页面，创建新页面失败")
+
+        target = await asyncio.wait_for(self._idle.get(), timeout)
+        if target is None:
+            self._idle.put_nowait(None)
+            raise RuntimeError("渲染池已关闭")
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await self._load(target, html, url, timeout)
+            data = await self._capture(target, output, full_page, timeout)
+            target.jobs += 1
+            return data
+        except (CDPError, ConnectionError, asyncio.TimeoutError):
+            # 页面可能已崩溃或卡住，替换成新页面
+            status = "error"
+            await self._close_target(target)
+            target = None
+            raise
+        except ValueError:
+            status = "error"
+            raise
+        finally:
+            RENDER_SECONDS.observe(time.perf_counter() - started, output=output, status=status)
+            if target is None:
+                self._spawn(self._replace())
+            elif self._targets.get(target.target_id) is target:
+                self._idle.put_nowait(target)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _replace(self):
+        """创建新页面补回池中；失败时按指数退避重试，直到成功或渲染池关闭"""
+        context_id = self.context_id
+        delay = REPLACE_RETRY_DELAY
+        while self.started and self.context_id == context_id:
+            try:
+                target = await self._create_target()
+            except Exception as e:
+                self._replace_failures += 1
+                logger.error(f"替换渲染页面失败，{delay:g} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, REPLACE_RETRY_MAX_DELAY)
+                continue
+            self._replace_failures = 0
+            if self.context_id == context_id:
+                self._idle.put_nowait(target)
+            else:
+                self._targets.pop(target.target_id, None)
+            return
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "jobs": {target_id: target.jobs for target_id, target in self._targets.items()},
+        }
+
+
+async def benchmark(
+    pool: RenderPool,
+    html: str,
+    pages: int = 100,
+    output: str = "png",
+    full_page: bool = False,
+) -> Dict[str, Any]:
+    """用同一份 HTML 渲染 pages 次，所有任务同时提交，由渲染池限制并发；返回吞吐量和延迟"""
+    latencies: List[float] = []
+    errors = 0
+
+    async def job():
+        nonlocal errors
+        job_started = time.perf_counter()
+        try:
+            await pool.render(html=html, output=output, full_page=full_page)
+        except Exception as e:
+            errors += 1
+            logger.debug(f"基准测试任务失败: {e}")
+            return
+        latencies.append(time.perf_counter() - job_started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(job() for _ in range(pages)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "pages": len(latencies),
+        "errors": errors,
+        "pool_size": pool.size,
+        "output": output,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+    }
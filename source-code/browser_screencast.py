@@ -0,0 +1,217 @@
+"""
+基于 Page.startScreencast 的帧捕获
+
+浏览器只在页面重绘时推送 JPEG 帧，这里只保留最新一帧，并用感知哈希（dHash）判断画面
+是否真的变化：变化时版本号加一。观测方只需比较版本号，画面没变就可以跳过截图和重新编码。
+
+    capture = ScreencastCapture(guard.cdp, quality=70, max_width=1280)
+    await capture.start(target_id)
+    frame = capture.latest_frame()
+    if capture.changed_since(frame["version"]):
+        ...
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from cdp_client import CDPConnection, CDPSession
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时退化为按字节比较
+    Image = None
+
+
+def frame_hash(data: bytes) -> int:
+    """
+    计算帧的 64 位 dHash：缩放到 9x8 灰度图，比较相邻像素的明暗。
+    没有 Pillow 时返回内容摘要，只能识别完全相同的帧。
+    """
+    if Image is None:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG 可以在解码时直接按比例缩小，开销远小于完整解码
+        image.draft("L", (64, 64))
+        # L 模式每个像素一个字节
+        pixels = image.convert("L").resize((9, 8)).tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ScreencastCapture:
+    """在一个标签页上运行 screencast，保存最新帧和画面版本号"""
+
+    def __init__(
+        self,
+        cdp: CDPConnection,
+        quality: int = 80,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        every_nth_frame: int = 1,
+        hash_threshold: int = 2,
+    ):
+        self.cdp = cdp
+        self.quality = quality
+        self.max_width = max_width
+        self.max_height = max_height
+        self.every_nth_frame = every_nth_frame
+        # 汉明距离不超过该值的帧视为同一画面（仅 dHash 有效）
+        self.hash_threshold = hash_threshold if Image is not None else 0
+
+        self.session: Optional[CDPSession] = None
+        self.target_id: Optional[str] = None
+        self.version: int = 0
+        self._frame: Optional[Dict[str, Any]] = None
+        self._hash: Optional[int] = None
+        self._pending: Optional[Dict[str, Any]] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+        # 标签页关闭和连接重建都可能触发切换，start / stop 必须串行，否则旧会话不会被分离
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {"frames": 0, "changed": 0, "dropped": 0}
+
+    @classmethod
+    def from_env(cls, cdp: CDPConnection, width: int, height: int) -> "ScreencastCapture":
+        return cls(
+            cdp,
+            quality=int(os.getenv("SCREENCAST_QUALITY", "80")),
+            max_width=int(os.getenv("SCREENCAST_MAX_WIDTH", str(width))),
+            max_height=int(os.getenv("SCREENCAST_MAX_HEIGHT", str(height))),
+            every_nth_frame=int(os.getenv("SCREENCAST_EVERY_NTH_FRAME", "1")),
+            hash_threshold=int(os.getenv("SCREENCAST_HASH_THRESHOLD", "2")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.session is not None
+
+    async def start(self, target_id: str):
+        """在指定标签页上开始 screencast，已在其他标签页运行时先停止"""
+        async with self._lock:
+            if self.target_id == target_id and self.running:
+                return
+            await self._stop()
+
+            session = await self.cdp.attach(target_id)
+            self.session = session
+            self.target_id = target_id
+            # 换了标签页，第一帧总是算作画面变化
+            self._hash = None
+            session.on("Page.screencastFrame", lambda params: self._on_frame(session, params))
+            try:
+                await self._start_session(session)
+            except BaseException:
+                await self._stop()
+                raise
+            logger.info(f"Screencast 已启动: {target_id}")
+
+    async def _start_session(self, session: CDPSession):
+        params: Dict[str, Any] = {
+            "format": "jpeg",
+            "quality": self.quality,
+            "everyNthFrame": self.every_nth_frame,
+        }
+        if self.max_width:
+            params["maxWidth"] = self.max_width
+        if self.max_height:
+            params["maxHeight"] = self.max_height
+        await session.send("Page.enable")
+        await session.send("Page.startScreencast", params)
+
+    async def stop(self):
+        async with self._lock:
+            await self._stop()
+
+    async def _stop(self):
+        session, self.session = self.session, None
+        self.target_id = None
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        self._pending = None
+        if session:
+            try:
+                await session.send("Page.stopScreencast")
+                await session.detach()
+            except Exception as e:
+                logger.debug(f"停止 screencast 失败: {e}")
+
+    def _on_frame(self, session: CDPSession, params: Dict):
+        if session is not self.session:
+            # 已停止或被替换的会话上迟到的帧
+            return
+        # 必须确认每一帧，否则浏览器不再推送
+        asyncio.create_task(self._ack(session, params["sessionId"]))
+        self.stats["frames"] += 1
+        if self._pending is not None:
+            # 上一帧还没处理，直接用新帧替换
+            self.stats["dropped"] += 1
+        self._pending = params
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._process_frames())
+
+    async def _ack(self, session: CDPSession, frame_session_id: int):
+        try:
+            await session.send("Page.screencastFrameAck", {"sessionId": frame_session_id})
+        except Exception as e:
+            logger.debug(f"确认 screencast 帧失败: {e}")
+
+    async def _process_frames(self):
+        """逐帧解码和哈希（在线程中运行），始终只处理最新的待处理帧"""
+        while self._pending is not None:
+            params, self._pending = self._pending, None
+            data = base64.b64decode(params["data"])
+            try:
+                value = await asyncio.to_thread(frame_hash, data)
+            except Exception as e:
+                logger.debug(f"计算帧哈希失败: {e}")
+                continue
+
+            changed = self._hash is None or hamming_distance(value, self._hash) > self.hash_threshold
+            if changed:
+                self._hash = value
+                self.version += 1
+                self.stats["changed"] += 1
+            self._frame = {
+                "data": data,
+                "version": self.version,
+                "timestamp": params.get("metadata", {}).get("timestamp", time.time()),
+                "metadata": params.get("metadata", {}),
+                "target_id": self.target_id,
+            }
+            if changed:
+                async with self._changed:
+                    self._changed.notify_all()
+
+    def latest_frame(self) -> Optional[Dict[str, Any]]:
+        """最新一帧：JPEG 数据、画面版本号、时间戳和 screencast 元数据"""
+        return self._frame
+
+    def changed_since(self, version: int) -> bool:
+        """画面自 version 之后是否变化过"""
+        return self.version > version
+
+    async def wait_for_change(self, version: int, timeout: Optional[float] = None) -> bool:
+        """等待画面版本超过 version，超时返回 False"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.version > version), timeout
+                )
+            except asyncio.TimeoutError:
+                return False
+        return True
@@ -0,0 +1,203 @@
+"""
+标签页会话的记录与恢复
+
+定期记录 BrowserContext 中每个标签页的 URL、标题、滚动位置以及哪个标签页处于前台，
+保存在内存中并原子地写入磁盘。浏览器重启后懒恢复：前台标签页立即加载并滚动到原位置，
+后台标签页先打开一个占位页，等它第一次被切换到前台时才加载真实页面。
+"""
+
+import asyncio
+import html
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import quote
+
+from loguru import logger
+from playwright.async_api import BrowserContext, Page
+
+CAPTURE_SCRIPT = """() => ({
+    x: Math.round(window.scrollX),
+    y: Math.round(window.scrollY),
+    title: document.title,
+    visible: document.visibilityState === "visible",
+})"""
+# 只在页面从后台切到前台时跳转，避免刚创建时短暂处于前台的占位页立即加载
+PLACEHOLDER_MARKER = "<!--browser-session-placeholder-->"
+PLACEHOLDER_PREFIX = "data:text/html;charset=utf-8,"
+PLACEHOLDER_TEMPLATE = PLACEHOLDER_MARKER + """<!DOCTYPE html><title>{title}</title>
+<script>
+document.addEventListener("visibilitychange", () => {{
+    if (document.visibilityState === "visible") location.replace({url});
+}});
+</script>"""
+SKIPPED_SCHEMES = ("about:", "chrome:", "data:", "devtools:")
+
+
+def placeholder_url(tab: Dict[str, Any]) -> str:
+    document = PLACEHOLDER_TEMPLATE.format(
+        title=html.escape(tab.get("title") or tab["url"]),
+        # URL 中的 "</script>" 不能提前结束脚本
+        url=json.dumps(tab["url"]).replace("</", "<\\/"),
+    )
+    return PLACEHOLDER_PREFIX + quote(document)
+
+
+def is_placeholder_url(url: str) -> bool:
+    """是否为尚未加载真实页面的恢复占位页"""
+    return url.startswith(PLACEHOLDER_PREFIX + quote(PLACEHOLDER_MARKER))
+
+
+class SessionRecorder:
+    """记录并恢复一个 BrowserContext 的标签页"""
+
+    def __init__(self, path: str, interval: float = 10.0, max_tabs: int = 50):
+        self.path = path
+        self.interval = interval
+        self.max_tabs = max_tabs
+        self.tabs: List[Dict[str, Any]] = []
+        # 为 True 时不记录（浏览器重启到恢复完成之间，初始页面不能覆盖已记录的标签页）
+        self.suspended = False
+        # 尚未加载的占位页 -> 对应的标签页记录
+        self._placeholders: Dict[Page, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "SessionRecorder":
+        return cls(
+            os.getenv("BROWSER_SESSION_FILE", "/app/data/browser_session.json"),
+            interval=float(os.getenv("BROWSER_SESSION_SAVE_INTERVAL", "10")),
+            max_tabs=int(os.getenv("BROWSER_SESSION_MAX_TABS", "50")),
+        )
+
+    async def _capture_page(self, page: Page) -> Optional[Dict[str, Any]]:
+        pending = self._placeholders.get(page)
+        if pending is not None:
+            return dict(pending, active=False)
+        if page.url.startswith(SKIPPED_SCHEMES):
+            return None
+        try:
+            state = await asyncio.wait_for(page.evaluate(CAPTURE_SCRIPT), 2.0)
+        except Exception:
+            # 页面无响应或正在导航，只记录 URL
+            state = {"x": 0, "y": 0, "title": "", "visible": False}
+        return {
+            "url": page.url,
+            "title": state["title"],
+            "scroll": [state["x"], state["y"]],
+            "active": state["visible"],
+        }
+
+    async def capture(self, context: BrowserContext) -> List[Dict[str, Any]]:
+        """记录当前的标签页，至多一个标记为前台"""
+        results = await asyncio.gather(
+            *(self._capture_page(page) for page in context.pages if not page.is_closed()),
+            return_exceptions=True,
+        )
+        tabs = [tab for tab in results if isinstance(tab, dict)][: self.max_tabs]
+        active = next((tab for tab in tabs if tab["active"]), tabs[0] if tabs else None)
+        for tab in tabs:
+            tab["active"] = tab is active
+        return tabs
+
+    def _write(self, tabs: List[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump({"saved_at": time.time(), "tabs": tabs}, f, ensure_ascii=False)
+        os.replace(temp, self.path)
+
+    async def save(self, context: Optional[BrowserContext]):
+        """记录并在有变化时写入磁盘；浏览器已退出或没有可记录的标签页时保留上一次的记录"""
+        if self.suspended or context is None:
+            return
+        tabs = await self.capture(context)
+        if not tabs or tabs == self.tabs:
+            return
+        self.tabs = tabs
+        await asyncio.to_thread(self._write, tabs)
+
+    def load(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("tabs", [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    async def _scroll(self, page: Page, tab: Dict[str, Any]):
+        x, y = tab.get("scroll") or (0, 0)
+        if x or y:
+            try:
+                await page.evaluate("([x, y]) => window.scrollTo(x, y)", [x, y])
+            except Exception as e:
+                logger.debug(f"恢复滚动位置失败 {tab['url']}: {e}")
+
+    def _restore_lazily(self, page: Page, tab: Dict[str, Any]):
+        """占位页跳转到真实页面并加载完成后，恢复滚动位置"""
+        self._placeholders[page] = tab
+
+        def on_load(_):
+            if page.url.startswith("data:"):
+                return
+            page.remove_listener("load", on_load)
+            self._placeholders.pop(page, None)
+            asyncio.create_task(self._scroll(page, tab))
+
+        page.on("load", on_load)
+        page.on("close", lambda _: self._placeholders.pop(page, None))
+
+    async def restore(
+        self, context: BrowserContext, tabs: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """恢复记录的标签页，返回恢复的数量；完成后重新开始记录"""
+        try:
+            tabs = tabs or self.tabs or self.load()
+            if not tabs:
+                return 0
+            active = next((tab for tab in tabs if tab.get("active")), tabs[0])
+
+            for tab in tabs:
+                if tab is active:
+                    continue
+                try:
+                    page = await context.new_page()
+                    self._restore_lazily(page, tab)
+                    await page.goto(placeholder_url(tab))
+                except Exception as e:
+                    logger.debug(f"创建占位标签页失败 {tab['url']}: {e}")
+
+            page = context.pages[0] if context.pages else await context.new_page()
+            try:
+                await page.goto(active["url"])
+                await self._scroll(page, active)
+            except Exception as e:
+                logger.warning(f"恢复前台标签页失败 {active['url']}: {e}")
+            await page.bring_to_front()
+            logger.info(f"已恢复 {len(tabs)} 个标签页，后台标签页将在切换到前台时加载")
+            return len(tabs)
+        finally:
+            self.suspended = False
+
+    async def _loop(self, get_context: Callable[[], Optional[BrowserContext]]):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save(get_context())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"记录标签页失败: {e}")
+
+    def start(self, get_context: Callable[[], Optional[BrowserContext]]):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(get_context))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
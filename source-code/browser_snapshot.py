@@ -0,0 +1,278 @@
+"""
+页面状态快照
+
+一次并发取回 DOMSnapshot.captureSnapshot、Accessibility.getFullAXTree 和页面布局信息，
+合并成只包含可交互元素的精简列表：每个元素带稳定的 ID（backendNodeId，在同一文档的
+生命周期内不变）、角色、可访问名称和包围盒。同一标签页的连续快照可以只返回差异。
+
+    snapshotter = PageSnapshotter(guard.cdp)
+    full = await snapshotter.capture(target_id)
+    diff = await snapshotter.capture(target_id, since=full["version"])
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from cdp_client import CDPConnection, CDPError, CDPSession
+
+COMPUTED_STYLES = ["visibility", "opacity", "cursor"]
+INTERACTIVE_TAGS = {"A", "BUTTON", "INPUT", "SELECT", "TEXTAREA", "SUMMARY", "OPTION"}
+INTERACTIVE_ROLES = {
+    "button", "link", "checkbox", "radio", "textbox", "searchbox", "combobox", "listbox",
+    "option", "menuitem", "menuitemcheckbox", "menuitemradio", "tab", "switch", "slider",
+    "spinbutton", "treeitem", "gridcell",
+}
+# 名称的兜底来源，依次尝试
+NAME_ATTRIBUTES = ("aria-label", "placeholder", "title", "alt", "value", "name")
+MAX_TEXT = 100
+# 密码和支付卡字段的值不出现在快照中，只标记是否已填写
+MASKED_VALUE = "***"
+SENSITIVE_AUTOCOMPLETE = {"current-password", "new-password", "one-time-code"}
+
+
+def is_sensitive(attrs: Dict[str, str]) -> bool:
+    """type=password 或 autocomplete 含 cc-* / 密码类令牌的输入框"""
+    if attrs.get("type", "").lower() == "password":
+        return True
+    tokens = attrs.get("autocomplete", "").lower().split()
+    return any(token.startswith("cc-") or token in SENSITIVE_AUTOCOMPLETE for token in tokens)
+
+
+def _string(strings: List[str], index: int) -> str:
+    return strings[index] if isinstance(index, int) and 0 <= index < len(strings) else ""
+
+
+def _rare(data: Optional[Dict], strings: Optional[List[str]] = None) -> Dict[int, Any]:
+    """把 RareBooleanData / RareStringData / RareIntegerData 展开为 节点下标 -> 值"""
+    if not data:
+        return {}
+    if "value" not in data:
+        return dict.fromkeys(data.get("index", []), True)
+    values = data["value"]
+    if strings is not None:
+        values = [_string(strings, value) for value in values]
+    return dict(zip(data["index"], values))
+
+
+def _ax_index(ax_nodes: List[Dict]) -> Dict[int, Tuple[str, str]]:
+    """backendDOMNodeId -> (角色, 可访问名称)"""
+    index = {}
+    for node in ax_nodes:
+        backend_id = node.get("backendDOMNodeId")
+        if backend_id is None or node.get("ignored"):
+            continue
+        role = (node.get("role") or {}).get("value", "")
+        name = (node.get("name") or {}).get("value", "")
+        index[backend_id] = (str(role), str(name))
+    return index
+
+
+def document_url(dom: Dict[str, Any]) -> str:
+    documents = dom.get("documents", [])
+    return _string(dom.get("strings", []), documents[0].get("documentURL")) if documents else ""
+
+
+def parse_snapshot(
+    dom: Dict[str, Any], ax_nodes: List[Dict], viewport: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """合并 DOM 快照和可访问性树，返回可见的可交互元素"""
+    strings = dom.get("strings", [])
+    documents = dom.get("documents", [])
+    ax = _ax_index(ax_nodes)
+    elements: List[Dict[str, Any]] = []
+    # 每个文档的坐标偏移：iframe 内文档的包围盒相对于该文档自身
+    offsets: Dict[int, Tuple[float, float]] = {0: (0.0, 0.0)}
+    pending = [0] if documents else []
+
+    while pending:
+        doc_index = pending.pop(0)
+        document = documents[doc_index]
+        offset_x, offset_y = offsets[doc_index]
+        nodes = document["nodes"]
+        layout = document.get("layout", {})
+        bounds: Dict[int, List[float]] = {}
+        styles: Dict[int, List[int]] = {}
+        for position, node_index in enumerate(layout.get("nodeIndex", [])):
+            bounds[node_index] = layout["bounds"][position]
+            styles[node_index] = layout["styles"][position]
+
+        parents = nodes.get("parentIndex", [])
+        names = nodes.get("nodeName", [])
+        backend_ids = nodes.get("backendNodeId", [])
+        attributes = nodes.get("attributes", [])
+        clickable = _rare(nodes.get("isClickable"))
+        input_values = _rare(nodes.get("inputValue"), strings)
+        checked = _rare(nodes.get("inputChecked"))
+        content_documents = _rare(nodes.get("contentDocumentIndex"))
+        # 节点下标 -> 是否位于可交互元素内部（父节点总是排在子节点之前）
+        inside: List[bool] = [False] * len(parents)
+
+        for index, parent in enumerate(parents):
+            tag = _string(strings, names[index]).upper()
+            attrs = attributes[index] if index < len(attributes) else []
+            attrs = {
+                _string(strings, attrs[i]).lower(): _string(strings, attrs[i + 1])
+                for i in range(0, len(attrs) - 1, 2)
+            }
+            box = bounds.get(index)
+            if index in content_documents and box is not None:
+                child = content_documents[index]
+                if child not in offsets and child < len(documents):
+                    offsets[child] = (offset_x + box[0], offset_y + box[1])
+                    pending.append(child)
+
+            parent_inside = parent >= 0 and inside[parent]
+            role, name = ax.get(backend_ids[index], ("", ""))
+            style = [_string(strings, value) for value in styles.get(index, [])]
+            pointer = len(style) > 2 and style[2] == "pointer"
+            native = (
+                tag in INTERACTIVE_TAGS
+                and not (tag == "A" and "href" not in attrs)
+                and attrs.get("type") != "hidden"
+            )
+            semantic = (
+                role in INTERACTIVE_ROLES
+                or attrs.get("contenteditable") in ("", "true")
+                # tabindex >= 0 表示可通过键盘聚焦
+                or attrs.get("tabindex", "").isdigit()
+            )
+            # 仅因点击监听或手型光标而可交互的节点，如果位于可交互元素内部则由外层元素代表
+            incidental = (index in clickable or pointer) and not parent_inside
+            interactive = native or semantic or incidental
+            inside[index] = parent_inside or interactive
+            if not interactive or box is None or box[2] <= 0 or box[3] <= 0:
+                continue
+            if style and (style[0] in ("hidden", "collapse") or style[1] == "0"):
+                continue
+
+            sensitive = is_sensitive(attrs)
+            if not name:
+                name = next(
+                    (
+                        attrs[key]
+                        for key in NAME_ATTRIBUTES
+                        if attrs.get(key) and not (sensitive and key == "value")
+                    ),
+                    "",
+                )
+            element: Dict[str, Any] = {
+                "id": backend_ids[index],
+                "tag": tag.lower(),
+                "role": role,
+                "name": " ".join(name.split())[:MAX_TEXT],
+                "bbox": [
+                    round(box[0] + offset_x),
+                    round(box[1] + offset_y),
+                    round(box[2]),
+                    round(box[3]),
+                ],
+            }
+            if index in input_values:
+                value = str(input_values[index])
+                element["value"] = (MASKED_VALUE if value else "") if sensitive else value[:MAX_TEXT]
+            if index in checked:
+                element["checked"] = True
+            for key in ("href", "type"):
+                if attrs.get(key):
+                    element[key] = attrs[key][:MAX_TEXT * 2]
+            if "disabled" in attrs:
+                element["disabled"] = True
+            if viewport:
+                x, y, w, h = element["bbox"]
+                element["in_viewport"] = (
+                    x < viewport["x"] + viewport["width"] and x + w > viewport["x"]
+                    and y < viewport["y"] + viewport["height"] and y + h > viewport["y"]
+                )
+            elements.append(element)
+    return elements
+
+
+def diff_snapshots(previous: List[Dict[str, Any]], current: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按元素 ID 比较两次快照"""
+    before = {element["id"]: element for element in previous}
+    after = {element["id"]: element for element in current}
+    return {
+        "added": [element for element_id, element in after.items() if element_id not in before],
+        "removed": [element_id for element_id in before if element_id not in after],
+        "changed": [
+            element
+            for element_id, element in after.items()
+            if element_id in before and before[element_id] != element
+        ],
+    }
+
+
+class PageSnapshotter:
+    """按标签页缓存 CDP 会话和上一次快照，支持增量返回"""
+
+    def __init__(self, cdp: CDPConnection):
+        self.cdp = cdp
+        self._sessions: Dict[str, CDPSession] = {}
+        # targetId -> (版本号, URL, 元素列表)
+        self._last: Dict[str, Tuple[int, str, List[Dict[str, Any]]]] = {}
+        self._version = 0
+
+    async def _session(self, target_id: str) -> CDPSession:
+        session = self._sessions.get(target_id)
+        if session is None or session.connection is not self.cdp:
+            session = await self.cdp.attach(target_id)
+            self._sessions[target_id] = session
+        return session
+
+    async def _fetch(self, target_id: str):
+        session = await self._session(target_id)
+        return await asyncio.gather(
+            session.send(
+                "DOMSnapshot.captureSnapshot",
+                {"computedStyles": COMPUTED_STYLES, "includeDOMRects": False},
+                timeout=15.0,
+            ),
+            session.send("Accessibility.getFullAXTree", timeout=15.0),
+            session.send("Page.getLayoutMetrics"),
+        )
+
+    async def capture(self, target_id: str, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        返回标签页的快照。since 等于该标签页上一次快照的版本号且页面未跳转时，只返回
+        added / removed / changed；否则返回完整的 elements。
+        """
+        try:
+            dom, ax, metrics = await self._fetch(target_id)
+        except (ConnectionError, CDPError):
+            # 缓存的会话可能已断开，重新附加后再试一次
+            self._sessions.pop(target_id, None)
+            dom, ax, metrics = await self._fetch(target_id)
+
+        visual = metrics.get("cssVisualViewport", {})
+        viewport = {
+            "x": visual.get("pageX", 0),
+            "y": visual.get("pageY", 0),
+            "width": visual.get("clientWidth", 0),
+            "height": visual.get("clientHeight", 0),
+        }
+        url = document_url(dom)
+        elements = parse_snapshot(dom, ax.get("nodes", []), viewport)
+
+        self._version += 1
+        previous = self._last.get(target_id)
+        self._last[target_id] = (self._version, url, elements)
+        result: Dict[str, Any] = {
+            "version": self._version,
+            "target_id": target_id,
+            "url": url,
+            "viewport": {key: round(value) for key, value in viewport.items()},
+        }
+        if since is not None and previous and previous[0] == since and previous[1] == url:
+            result["base_version"] = since
+            result.update(diff_snapshots(previous[2], elements))
+        else:
+            result["elements"] = elements
+        logger.debug(f"页面快照 {target_id}: {len(elements)} 个可交互元素")
+        return result
+
+    def forget(self, target_id: str):
+        """标签页关闭后丢弃缓存"""
+        self._sessions.pop(target_id, None)
+        self._last.pop(target_id, None)
@@ -0,0 +1,364 @@
+"""
+按需录制性能 trace
+
+在标签页会话上通过 Tracing 域录制，transferMode=ReturnAsStream 让浏览器把数据写入自己的
+临时流，结束后用 IO.read 分块读回：每块直接追加到磁盘文件，同时交给增量解析器汇总，
+整份 trace 不会在内存中保存。摘要包含最长的任务、布局/绘制耗时和网络瀑布。
+
+    tracer = TraceCapture(guard.cdp, "/app/data/traces")
+    summary = await tracer.capture(target_id, duration=5, reload=True)
+"""
+
+import asyncio
+import base64
+import codecs
+import heapq
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from cdp_client import CDPConnection
+
+DEFAULT_CATEGORIES = (
+    "devtools.timeline",
+    "disabled-by-default-devtools.timeline",
+    "disabled-by-default-devtools.timeline.frame",
+    "toplevel",
+    "loading",
+    "blink.user_timing",
+    "v8.execute",
+)
+# 超过 50ms 的任务视为长任务（与 Long Tasks API 一致）
+LONG_TASK_US = 50_000
+TASK_EVENTS = {"RunTask", "ThreadControllerImpl::RunTask"}
+LAYOUT_EVENTS = {"Layout", "UpdateLayoutTree"}
+PAINT_EVENTS = {"PrePaint", "Paint", "Layerize", "CompositeLayers", "RasterTask"}
+
+
+class TraceEventStream:
+    """
+    trace JSON 的增量解析器。
+
+    流的格式是 {"traceEvents": [...], ...} 或裸数组；这里逐个解码数组中的事件对象，
+    不完整的尾部留到下一块数据到达后再解析。
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._in_array = False
+        self._done = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        if self._done:
+            return []
+        self._buffer += text
+        events: List[Dict[str, Any]] = []
+        position = 0
+        if not self._in_array:
+            start = self._buffer.find("[")
+            if start < 0:
+                return events
+            self._in_array = True
+            position = start + 1
+
+        length = len(self._buffer)
+        while True:
+            while position < length and self._buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= length:
+                break
+            if self._buffer[position] == "]":
+                # 事件数组结束，后面的 metadata 不需要
+                self._done = True
+                position = length
+                break
+            try:
+                event, end = self._decoder.raw_decode(self._buffer, position)
+            except ValueError:
+                # 对象还不完整
+                break
+            if isinstance(event, dict):
+                events.append(event)
+            position = end
+        self._buffer = self._buffer[position:]
+        return events
+
+
+class TraceSummary:
+    """边解析边汇总：只保留前 N 个长任务和每个请求的时间点"""
+
+    def __init__(self, top_tasks: int = 10, max_requests: int = 200):
+        self.top_tasks = top_tasks
+        self.max_requests = max_requests
+        self.event_count = 0
+        self._start_ts: Optional[int] = None
+        self._end_ts: Optional[int] = None
+        self._threads: Dict[Tuple[Any, Any], str] = {}
+        # 最小堆，只保留最长的 top_tasks 个任务
+        self._long_tasks: List[Tuple[int, int, Any, Any]] = []
+        self.long_task_count = 0
+        self.long_task_us = 0
+        self._render_us: Dict[str, int] = {}
+        self._requests: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, event: Dict[str, Any]):
+        self.event_count += 1
+        phase = event.get("ph")
+        name = event.get("name", "")
+        if phase == "M":
+            if name == "thread_name":
+                self._threads[(event.get("pid"), event.get("tid"))] = event.get("args", {}).get("name", "")
+            return
+
+        ts = event.get("ts")
+        if not isinstance(ts, (int, float)) or ts <= 0:
+            return
+        duration = event.get("dur", 0) if phase == "X" else 0
+        if self._start_ts is None or ts < self._start_ts:
+            self._start_ts = ts
+        if self._end_ts is None or ts + duration > self._end_ts:
+            self._end_ts = ts + duration
+
+        if phase == "X":
+            if name in TASK_EVENTS and duration >= LONG_TASK_US:
+                self.long_task_count += 1
+                self.long_task_us += duration
+                item = (duration, ts, event.get("pid"), event.get("tid"))
+                if len(self._long_tasks) < self.top_tasks:
+                    heapq.heappush(self._long_tasks, item)
+                else:
+                    heapq.heappushpop(self._long_tasks, item)
+            elif name in LAYOUT_EVENTS or name in PAINT_EVENTS:
+                self._render_us[name] = self._render_us.get(name, 0) + duration
+        elif name.startswith("Resource"):
+            self._add_network(name, ts, event.get("args", {}).get("data") or {})
+
+    def _add_network(self, name: str, ts: float, data: Dict[str, Any]):
+        request_id = data.get("requestId")
+        if not request_id:
+            return
+        if name == "ResourceSendRequest":
+            if request_id in self._requests or len(self._requests) >= self.max_requests:
+                return
+            self._requests[request_id] = {
+                "url": data.get("url", ""),
+                "method": data.get("requestMethod", ""),
+                "priority": data.get("priority", ""),
+                "start": ts,
+            }
+            return
+        request = self._requests.get(request_id)
+        if request is None:
+            return
+        if name == "ResourceReceiveResponse":
+            request["response"] = ts
+            request["status"] = data.get("statusCode")
+            request["mime_type"] = data.get("mimeType", "")
+            request["from_cache"] = bool(data.get("fromCache"))
+        elif name == "ResourceFinish":
+            request["end"] = ts
+            request["bytes"] = data.get("encodedDataLength", 0)
+            request["failed"] = bool(data.get("didFail"))
+
+    def _ms(self, ts: Optional[float]) -> Optional[float]:
+        if ts is None or self._start_ts is None:
+            return None
+        return round((ts - self._start_ts) / 1000, 2)
+
+    def result(self) -> Dict[str, Any]:
+        long_tasks = [
+            {
+                "start_ms": self._ms(ts),
+                "duration_ms": round(duration / 1000, 2),
+                "thread": self._threads.get((pid, tid), str(tid)),
+            }
+            for duration, ts, pid, tid in sorted(self._long_tasks, reverse=True)
+        ]
+        render_ms = {name: round(us / 1000, 2) for name, us in sorted(self._render_us.items())}
+
+        waterfall = []
+        for request in sorted(self._requests.values(), key=lambda item: item["start"]):
+            end = request.get("end")
+            waterfall.append(
+                {
+                    "url": request["url"],
+                    "method": request["method"],
+                    "priority": request["priority"],
+                    "status": request.get("status"),
+                    "mime_type": request.get("mime_type", ""),
+                    "from_cache": request.get("from_cache", False),
+                    "bytes": request.get("bytes", 0),
+                    "failed": request.get("failed", False),
+                    "start_ms": self._ms(request["start"]),
+                    "response_ms": self._ms(request.get("response")),
+                    "end_ms": self._ms(end),
+                    "duration_ms": round((end - request["start"]) / 1000, 2) if end else None,
+                }
+            )
+
+        return {
+            "events": self.event_count,
+            "span_ms": self._ms(self._end_ts) or 0.0,
+            "long_tasks": {
+                "count": self.long_task_count,
+                "total_ms": round(self.long_task_us / 1000, 2),
+                "top": long_tasks,
+            },
+            "layout_ms": round(sum(self._render_us.get(name, 0) for name in LAYOUT_EVENTS) / 1000, 2),
+            "paint_ms": round(sum(self._render_us.get(name, 0) for name in PAINT_EVENTS) / 1000, 2),
+            "render_breakdown_ms": render_ms,
+            "network": waterfall,
+        }
+
+
+class TraceCapture:
+    """在一个标签页上录制 trace，同一时间只允许一次录制"""
+
+    def __init__(
+        self,
+        cdp: CDPConnection,
+        output_dir: str,
+        categories: Sequence[str] = DEFAULT_CATEGORIES,
+        max_duration: float = 30.0,
+        keep: int = 20,
+    ):
+        self.cdp = cdp
+        self.output_dir = output_dir
+        self.categories = list(categories)
+        self.max_duration = max_duration
+        # 目录中最多保留的 trace 文件数
+        self.keep = keep
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, cdp: CDPConnection) -> "TraceCapture":
+        categories = os.getenv("BROWSER_TRACE_CATEGORIES", "")
+        return cls(
+            cdp,
+            os.getenv("BROWSER_TRACE_DIR", "/app/data/traces"),
+            categories=[c.strip() for c in categories.split(",") if c.strip()] or DEFAULT_CATEGORIES,
+            max_duration=float(os.getenv("BROWSER_TRACE_MAX_SECONDS", "30")),
+            keep=int(os.getenv("BROWSER_TRACE_KEEP", "20")),
+        )
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def capture(
+        self,
+        target_id: str,
+        duration: float = 5.0,
+        reload: bool = False,
+        categories: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        """录制 duration 秒（reload 为 True 时先重新加载页面），返回 trace 文件路径和摘要"""
+        if self.busy:
+            raise RuntimeError("A trace is already being recorded")
+        async with self._lock:
+            duration = max(0.1, min(duration, self.max_duration))
+            session = await self.cdp.attach(target_id)
+            try:
+                return await self._record(session, target_id, duration, reload, categories)
+            finally:
+                try:
+                    await session.detach()
+                except Exception as e:
+                    logger.debug(f"断开 trace 会话失败: {e}")
+
+    async def _record(self, session, target_id, duration, reload, categories) -> Dict[str, Any]:
+        complete = asyncio.get_running_loop().create_future()
+
+        def on_complete(params: Dict):
+            if not complete.done():
+                complete.set_result(params)
+
+        session.on("Tracing.tracingComplete", on_complete)
+        await session.send(
+            "Tracing.start",
+            {
+                "traceConfig": {
+                    "includedCategories": list(categories or self.categories),
+                    "recordMode": "recordAsMuchAsPossible",
+                },
+                "transferMode": "ReturnAsStream",
+                "streamFormat": "json",
+                "streamCompression": "none",
+            },
+        )
+        started = time.time()
+        try:
+            if reload:
+                await session.send("Page.reload", {"ignoreCache": False})
+            await asyncio.sleep(duration)
+        finally:
+            await session.send("Tracing.end", timeout=30.0)
+        params = await asyncio.wait_for(complete, 60.0)
+        if "stream" not in params:
+            raise RuntimeError("Tracing finished without a stream handle")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{target_id[:8]}.json"
+        )
+        summary = TraceSummary()
+        size = await self._drain(session, params["stream"], path, summary)
+        self._prune()
+
+        result = {
+            "path": path,
+            "bytes": size,
+            "target_id": target_id,
+            "duration_s": round(time.time() - started, 2),
+            **summary.result(),
+        }
+        logger.info(
+            f"trace 已保存 {path}: {size >> 10}KB, 长任务 {result['long_tasks']['count']} 个, "
+            f"布局 {result['layout_ms']}ms, 绘制 {result['paint_ms']}ms"
+        )
+        return result
+
+    async def _drain(self, session, handle: str, path: str, summary: TraceSummary) -> int:
+        """分块读取浏览器端的流，写入文件并增量汇总"""
+        parser = TraceEventStream()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        size = 0
+        with open(path, "wb") as f:
+            try:
+                while True:
+                    chunk = await session.send("IO.read", {"handle": handle, "size": 1 << 20}, timeout=30.0)
+                    data = chunk.get("data", "")
+                    raw = base64.b64decode(data) if chunk.get("base64Encoded") else data.encode()
+                    if raw:
+                        # 写文件放到线程中，避免阻塞事件循环
+                        await asyncio.to_thread(f.write, raw)
+                        size += len(raw)
+                        for event in parser.feed(decoder.decode(raw)):
+                            summary.add(event)
+                    if chunk.get("eof"):
+                        break
+            finally:
+                try:
+                    await session.send("IO.close", {"handle": handle})
+                except Exception as e:
+                    logger.debug(f"关闭 trace 流失败: {e}")
+        return size
+
+    def _prune(self):
+        """只保留最新的 keep 个 trace 文件"""
+        try:
+            names = sorted(
+                name for name in os.listdir(self.output_dir)
+                if name.startswith("trace-") and name.endswith(".json")
+            )
+        except OSError:
+            return
+        for name in names[: max(0, len(names) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
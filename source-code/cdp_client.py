@@ -0,0 +1,222 @@
+"""
+CDP (Chrome DevTools Protocol) 客户端
+
+一个浏览器级 WebSocket 连接上复用多个 target 会话（Target.attachToTarget + flatten）。
+命令使用单调递增的 id，由唯一的读取任务把响应分发给对应的 future、把事件分发给订阅者，
+因此同一连接上可以并发发送多条命令，事件也不会被丢弃。
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import websockets
+from loguru import logger
+
+EventCallback = Callable[[Dict[str, Any]], Any]
+# 命令耗时观察者：(method, 耗时秒数, 是否成功)
+LatencyObserver = Callable[[str, float, bool], None]
+_latency_observers: List[LatencyObserver] = []
+
+
+def add_latency_observer(observer: LatencyObserver):
+    """注册命令耗时观察者，对所有 CDPConnection 生效"""
+    if observer not in _latency_observers:
+        _latency_observers.append(observer)
+
+
+def _notify_latency(method: str, elapsed: float, ok: bool):
+    for observer in _latency_observers:
+        try:
+            observer(method, elapsed, ok)
+        except Exception as e:
+            logger.debug(f"CDP 耗时观察者出错: {e}")
+
+
+class CDPError(Exception):
+    """CDP 命令返回的错误"""
+
+    def __init__(self, method: str, error: Dict[str, Any]):
+        self.method = method
+        self.code = error.get("code")
+        self.error_message = error.get("message", "")
+        super().__init__(f"{method}: {self.error_message} ({self.code})")
+
+
+class CDPSession:
+    """附加到某个 target 的会话，命令和事件都经过所属的 CDPConnection"""
+
+    def __init__(self, connection: "CDPConnection", session_id: str, target_id: str):
+        self.connection = connection
+        self.session_id = session_id
+        self.target_id = target_id
+
+    async def send(
+        self, method: str, params: Optional[Dict] = None, timeout: float = 5.0
+    ) -> Dict[str, Any]:
+        return await self.connection.send(
+            method, params, session_id=self.session_id, timeout=timeout
+        )
+
+    def on(self, event: str, callback: EventCallback):
+        self.connection.on(event, callback, session_id=self.session_id)
+
+    def off(self, event: str, callback: EventCallback):
+        self.connection.off(event, callback, session_id=self.session_id)
+
+    async def detach(self):
+        try:
+            await self.connection.send(
+                "Target.detachFromTarget", {"sessionId": self.session_id}
+            )
+        finally:
+            self.connection._drop_session(self.session_id)
+
+
+class CDPConnection:
+    """浏览器级 CDP 连接"""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._next_id = 0
+        self._pending: Dict[int, Tuple[asyncio.Future, Optional[str]]] = {}
+        self._listeners: Dict[Tuple[Optional[str], str], List[EventCallback]] = {}
+        self._sessions: Dict[str, CDPSession] = {}
+        self._callback_tasks: Set[asyncio.Future] = set()
+        self._closed = asyncio.Event()
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, ws_url: str) -> "CDPConnection":
+        ws = await websockets.connect(ws_url, close_timeout=5, max_size=None)
+        return cls(ws)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def close(self):
+        try:
+            await self._ws.close()
+        finally:
+            await self._closed.wait()
+
+    async def send(
+        self,
+        method: str,
+        params: Optional[Dict] = None,
+        session_id: Optional[str] = None,
+        timeout: float = 5.0,
+    ) -> Dict[str, Any]:
+        """发送命令并等待响应；出错时抛出 CDPError / asyncio.TimeoutError / ConnectionError"""
+        if self.closed:
+            raise ConnectionError("CDP connection closed")
+
+        self._next_id += 1
+        command_id = self._next_id
+        message: Dict[str, Any] = {
+            "id": command_id,
+            "method": method,
+            "params": params or {},
+        }
+        if session_id:
+            message["sessionId"] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = (future, session_id)
+        started = time.perf_counter()
+        try:
+            await self._ws.send(json.dumps(message))
+            response = await asyncio.wait_for(future, timeout)
+        except BaseException:
+            _notify_latency(method, time.perf_counter() - started, False)
+            raise
+        finally:
+            self._pending.pop(command_id, None)
+
+        _notify_latency(method, time.perf_counter() - started, "error" not in response)
+        if "error" in response:
+            raise CDPError(method, response["error"])
+        return response.get("result", {})
+
+    def on(self, event: str, callback: EventCallback, session_id: Optional[str] = None):
+        """订阅事件；session_id 为 None 表示浏览器级事件，event 为 "*" 表示该会话的所有事件"""
+        self._listeners.setdefault((session_id, event), []).append(callback)
+
+    def off(self, event: str, callback: EventCallback, session_id: Optional[str] = None):
+        callbacks = self._listeners.get((session_id, event), [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    async def attach(self, target_id: str, timeout: float = 5.0) -> CDPSession:
+        """以 flatten 模式附加到 target，会话复用当前连接"""
+        result = await self.send(
+            "Target.attachToTarget",
+            {"targetId": target_id, "flatten": True},
+            timeout=timeout,
+        )
+        session = CDPSession(self, result["sessionId"], target_id)
+        self._sessions[session.session_id] = session
+        return session
+
+    def _drop_session(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        for key in [key for key in self._listeners if key[0] == session_id]:
+            del self._listeners[key]
+        for command_id, (future, pending_session) in list(self._pending.items()):
+            if pending_session == session_id and not future.done():
+                future.set_exception(ConnectionError("CDP session detached"))
+
+    def _dispatch(self, message: Dict[str, Any]):
+        session_id = message.get("sessionId")
+        method = message["method"]
+        params = message.get("params", {})
+
+        if method == "Target.detachedFromTarget" and session_id is None:
+            self._drop_session(params.get("sessionId"))
+
+        for callback in list(self._listeners.get((session_id, method), [])):
+            self._invoke(callback, params, method)
+        # 通配订阅者收到完整的事件（method + params）
+        for callback in list(self._listeners.get((session_id, "*"), [])):
+            self._invoke(callback, {"method": method, "params": params}, method)
+
+    def _invoke(self, callback: EventCallback, payload: Dict[str, Any], method: str):
+        try:
+            result = callback(payload)
+            if inspect.isawaitable(result):
+                # 异步回调单独运行，不能阻塞读取任务
+                task = asyncio.ensure_future(result)
+                self._callback_tasks.add(task)
+                task.add_done_callback(self._callback_tasks.discard)
+        except Exception as e:
+            logger.error(f"CDP 事件回调出错 {method}: {e}")
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if "id" in message:
+                    pending = self._pending.get(message["id"])
+                    if pending and not pending[0].done():
+                        pending[0].set_result(message)
+                    elif not pending:
+                        logger.debug(f"收到未匹配的响应: {message['id']}")
+                    continue
+                if "method" in message:
+                    self._dispatch(message)
+        except websockets.exceptions.ConnectionClosed:
+            logger.debug("CDP 连接已关闭")
+        except Exception as e:
+            logger.error(f"CDP 读取任务出错: {e}")
+        finally:
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("CDP connection closed"))
+            self._sessions.clear()
+            self._closed.set()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Fake Jupyter Kernel
+按 Jupyter 消息协议应答的替身 kernel，不执行任何代码，只按脚本化的延迟和输出大小回复。
+用于在没有真实 kernel 噪声的情况下压测 kernel_server。
+
+安装 kernelspec:
+    python fake_kernel.py install --prefix /tmp/fake-kernel
+    JUPYTER_PATH=/tmp/fake-kernel/share/jupyter JUPYTER_KERNEL_NAME=fake-kernel python kernel_server.py
+
+单个 cell 可以用注释覆盖默认脚本，例如 `# fake: latency=0.5 bytes=4096 error=1`。
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import zmq
+from jupyter_client.session import Session
+
+KERNEL_NAME = "fake-kernel"
+DIRECTIVE_PATTERN = re.compile(r"#\s*fake:\s*(.*)")
+
+
+def parse_range(value: str) -> Tuple[float, float]:
+    """解析 "0.05" 或 "0.01-0.2" 形式的取值范围"""
+    low, _, high = value.partition("-")
+    return float(low), float(high or low)
+
+
+def install_kernelspec(prefix: str, env: Dict[str, str]) -> str:
+    """在 prefix 下写入 kernelspec，返回可用作 JUPYTER_PATH 的目录"""
+    jupyter_path = os.path.join(prefix, "share", "jupyter")
+    kernel_dir = os.path.join(jupyter_path, "kernels", KERNEL_NAME)
+    os.makedirs(kernel_dir, exist_ok=True)
+    with open(os.path.join(kernel_dir, "kernel.json"), "w") as f:
+        json.dump(
+            {
+                "argv": [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "-f",
+                    "{connection_file}",
+                ],
+                "display_name": "Fake Kernel",
+                "language": "python",
+                "interrupt_mode": "signal",
+                "env": env,
+            },
+            f,
+            indent=2,
+        )
+    return jupyter_path
+
+
+class FakeKernel:
+    """只实现 kernel_server 会用到的消息：kernel_info、execute、interrupt、shutdown"""
+
+    def __init__(
+        self,
+        connection_file: str,
+        latency: Tuple[float, float] = (0.01, 0.01),
+        output_bytes: Tuple[float, float] = (64, 64),
+    ):
+        with open(connection_file, "r") as f:
+            config = json.load(f)
+
+        self.latency = latency
+        self.output_bytes = output_bytes
+        self.execution_count = 0
+        self.running = True
+        self.interrupted = threading.Event()
+        self.session = Session(
+            key=config["key"].encode(),
+            signature_scheme=config.get("signature_scheme", "hmac-sha256"),
+            username="kernel",
+        )
+
+        self.context = zmq.Context()
+        address = f"{config['transport']}://{config['ip']}:"
+        self.shell = self.context.socket(zmq.ROUTER)
+        self.shell.bind(address + str(config["shell_port"]))
+        self.control = self.context.socket(zmq.ROUTER)
+        self.control.bind(address + str(config["control_port"]))
+        self.stdin = self.context.socket(zmq.ROUTER)
+        self.stdin.bind(address + str(config["stdin_port"]))
+        self.iopub = self.context.socket(zmq.PUB)
+        self.iopub.bind(address + str(config["iopub_port"]))
+        self.hb = self.context.socket(zmq.REP)
+        self.hb.bind(address + str(config["hb_port"]))
+
+    def _heartbeat_loop(self):
+        """心跳：原样回显"""
+        while self.running:
+            try:
+                self.hb.send(self.hb.recv())
+            except zmq.ZMQError:
+                return
+
+    def _publish(self, msg_type: str, content: Dict[str, Any], parent: Dict[str, Any]):
+        self.session.send(
+            self.iopub,
+            msg_type,
+            content,
+            parent=parent,
+            ident=f"kernel.fake.{msg_type}".encode(),
+        )
+
+    def _script_for(self, code: str) -> Dict[str, float]:
+        """根据默认配置和 cell 内的 fake 指令决定本次执行的延迟和输出"""
+        script = {
+            "latency": random.uniform(*self.latency),
+            "bytes": random.uniform(*self.output_bytes),
+            "error": 0.0,
+        }
+        match = DIRECTIVE_PATTERN.search(code)
+        if match:
+            for item in match.group(1).split():
+                key, _, value = item.partition("=")
+                if key in script and value:
+                    script[key] = random.uniform(*parse_range(value))
+        return script
+
+    def _handle_execute(self, socket, idents, msg):
+        content = msg["content"]
+        silent = content.get("silent", False)
+        if not silent:
+            self.execution_count += 1
+        script = self._script_for(content.get("code", ""))
+
+        self._publish("status", {"execution_state": "busy"}, msg)
+        self._publish(
+            "execute_input",
+            {"code": content.get("code", ""), "execution_count": self.execution_count},
+            msg,
+        )
+
+        self.interrupted.clear()
+        interrupted = self.interrupted.wait(script["latency"])
+        if interrupted or script["error"]:
+            ename = "KeyboardInterrupt" if interrupted else "FakeKernelError"
+            error = {
+                "ename": ename,
+                "evalue": "",
+                "traceback": [f"{ename}: scripted by fake kernel"],
+            }
+            self._publish("error", error, msg)
+            reply = {"status": "error", "execution_count": self.execution_count, **error}
+        else:
+            size = int(script["bytes"])
+            if size > 0 and not silent:
+                self._publish(
+                    "stream", {"name": "stdout", "text": "x" * size}, msg
+                )
+            reply = {
+                "status": "ok",
+                "execution_count": self.execution_count,
+                "user_expressions": {},
+                "payload": [],
+            }
+
+        self.session.send(socket, "execute_reply", reply, parent=msg, ident=idents)
+        self._publish("status", {"execution_state": "idle"}, msg)
+
+    def _handle(self, socket):
+        idents, msg = self.session.recv(socket, mode=0)
+        if msg is None:
+            return
+        msg_type = msg["header"]["msg_type"]
+
+        if msg_type == "execute_request":
+            self._handle_execute(socket, idents, msg)
+            return
+
+        self._publish("status", {"execution_state": "busy"}, msg)
+        if msg_type == "kernel_info_request":
+            self.session.send(
+                socket,
+                "kernel_info_reply",
+                {
+                    "status": "ok",
+                    "protocol_version": "5.3",
+                    "implementation": KERNEL_NAME,
+                    "implementation_version": "1.0.0",
+                    "language_info": {
+                        "name": "python",
+                        "version": sys.version.split()[0],
+                        "mimetype": "text/x-python",
+                        "file_extension": ".py",
+                    },
+                    "banner": "Fake Kernel",
+                },
+                parent=msg,
+                ident=idents,
+            )
+        elif msg_type == "interrupt_request":
+            self.interrupted.set()
+            self.session.send(
+                socket, "interrupt_reply", {"status": "ok"}, parent=msg, ident=idents
+            )
+        elif msg_type == "shutdown_request":
+            self.running = False
+            self.session.send(
+                socket,
+                "shutdown_reply",
+                {"status": "ok", "restart": msg["content"].get("restart", False)},
+                parent=msg,
+                ident=idents,
+            )
+        self._publish("status", {"execution_state": "idle"}, msg)
+
+    def run(self):
+        # SIGINT 作为中断信号；SIGUSR2 是 profiler 的信号，替身 kernel 忽略即可
+        signal.signal(signal.SIGINT, lambda signum, frame: self.interrupted.set())
+        signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+        poller = zmq.Poller()
+        poller.register(self.shell, zmq.POLLIN)
+        poller.register(self.control, zmq.POLLIN)
+        self._publish("status", {"execution_state": "starting"}, {})
+        while self.running:
+            events = dict(poller.poll(timeout=500))
+            # control 优先，和真实 kernel 一致
+            if self.control in events:
+                self._handle(self.control)
+            if self.shell in events:
+                self._handle(self.shell)
+
+        # 留一点时间让最后的回复发送出去
+        time.sleep(0.1)
+        self.context.destroy(linger=100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Jupyter Kernel")
+    subparsers = parser.add_subparsers(dest="command")
+    install_parser = subparsers.add_parser("install", help="Install kernelspec")
+    install_parser.add_argument("--prefix", required=True, help="Install prefix")
+    parser.add_argument("-f", dest="connection_file", help="Connection file")
+    parser.add_argument(
+        "--latency",
+        default=os.getenv("FAKE_KERNEL_LATENCY", "0.01"),
+        help="Execution latency in seconds, e.g. 0.05 or 0.01-0.2",
+    )
+    parser.add_argument(
+        "--output-bytes",
+        default=os.getenv("FAKE_KERNEL_OUTPUT_BYTES", "64"),
+        help="Stream output size per execution, e.g. 1024 or 100-10000",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "install":
+        path = install_kernelspec(
+            args.prefix,
+            {
+                "FAKE_KERNEL_LATENCY": args.latency,
+                "FAKE_KERNEL_OUTPUT_BYTES": args.output_bytes,
+            },
+        )
+        print(path)
+        sys.exit(0)
+
+    if not args.connection_file:
+        parser.error("-f connection file is required")
+
+    FakeKernel(
+        args.connection_file,
+        latency=parse_range(args.latency),
+        output_bytes=parse_range(args.output_bytes),
+    ).run()
@@ -0,0 +1,300 @@
+"""
+Browser Guard 指标
+
+进程内的计数器、仪表和直方图，以 Prometheus 文本格式导出；内置一个极简的 asyncio HTTP
+服务，除 /metrics 外还可以注册其他路由，供外部进程触发 guard 内的操作。
+
+    metrics.counter("browser_guard_restarts_total", "...", ["reason"]).inc(reason="crash")
+    server = MetricsServer(port=9333)
+    await server.start()
+"""
+
+import asyncio
+import json
+import math
+import threading
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from urllib.parse import parse_qsl
+
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表：可以直接 set，也可以注册在导出时求值的回调"""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, callback: Callable[[], Optional[float]]):
+        """导出时调用 callback 取值（仅用于无标签的仪表），返回 None 表示暂无数据"""
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        if self._callback is not None:
+            try:
+                value = self._callback()
+            except Exception as e:
+                logger.debug(f"读取指标 {self.name} 失败: {e}")
+                value = None
+            if value is not None:
+                lines.append(f"{self.name} {_format_value(value)}")
+            return lines
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> (每个桶的计数, 总和, 总数)
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class GuardMetrics:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labels, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程级的默认注册表
+metrics = GuardMetrics()
+
+# 路由处理函数接收请求体，返回 (状态码, Content-Type, 响应体)，可以再附带一个额外响应头的字典；
+# 以 query=True 注册的处理函数还会收到查询参数
+RouteHandler = Callable[..., Awaitable[Tuple]]
+
+
+def json_response(payload: Any, status: int = 200) -> Tuple[int, str, bytes]:
+    return status, "application/json", json.dumps(payload, ensure_ascii=False).encode()
+
+
+class MetricsServer:
+    """极简 HTTP/1.1 服务：GET /metrics 导出指标，其余路由通过 add_route 注册"""
+
+    MAX_BODY = 1 << 20
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9333, registry: GuardMetrics = metrics):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        # (method, path) -> (处理函数, 是否传入查询参数)
+        self._routes: Dict[Tuple[str, str], Tuple[RouteHandler, bool]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.add_route("GET", "/metrics", self._metrics)
+        self.add_route("GET", "/health", self._health)
+
+    def add_route(self, method: str, path: str, handler: RouteHandler, query: bool = False):
+        """注册路由；query 为 True 时处理函数以 (请求体, 查询参数字典) 调用"""
+        self._routes[(method.upper(), path)] = (handler, query)
+
+    async def _metrics(self, body: bytes) -> Tuple[int, str, bytes]:
+        return 200, "text/plain; version=0.0.4; charset=utf-8", self.registry.render().encode()
+
+    async def _health(self, body: bytes) -> Tuple[int, str, bytes]:
+        return json_response({"status": "ok"})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers: Dict[str, str] = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", "0"))
+            extra: Dict[str, str] = {}
+            if length > self.MAX_BODY:
+                status, content_type, payload = json_response({"error": "body too large"}, 413)
+            else:
+                body = await reader.readexactly(length) if length else b""
+                path, _, query = target.partition("?")
+                route = self._routes.get((method.upper(), path))
+                if route is None:
+                    status, content_type, payload = json_response({"error": "not found"}, 404)
+                else:
+                    handler, with_query = route
+                    try:
+                        if with_query:
+                            result = await handler(body, dict(parse_qsl(query)))
+                        else:
+                            result = await handler(body)
+                        status, content_type, payload = result[:3]
+                        if len(result) > 3:
+                            extra = result[3]
+                    except Exception as e:
+                        logger.error(f"处理 {method} {target} 出错: {e}")
+                        status, content_type, payload = json_response({"error": str(e)}, 500)
+
+            try:
+                reason = HTTPStatus(status).phrase
+            except ValueError:
+                reason = "OK" if status < 400 else "Error"
+            head = [
+                f"HTTP/1.1 {status} {reason}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}",
+            ]
+            head += [f"{name}: {value}" for name, value in extra.items()]
+            writer.write(
+                ("\r\n".join(head) + "\r\nConnection: close\r\n\r\n").encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 为 0 时由系统分配
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"指标服务已启动: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -14,7 +14,11 @@ from pydantic import BaseModel
 import time
 import signal
 import psutil
+import queue
+import resource
 import socket
+import threading
+import uuid
 
 from jupyter_client.manager import KernelManager
 
@@ -24,6 +28,112 @@ class ExecutionResult(BaseModel):
     output: str
     error: Optional[str] = None
     images: Optional[List[str]] = None
+    profile: Optional[Dict[str, Any]] = None
+    error_type: Optional[str] = None
+
+
+# kernel 侧采样器：只注册 SIGUSR2 处理函数，未开启采样时没有任何额外开销。
+# 服务端先写请求文件（start/stop、采样间隔、输出路径），再向 kernel 进程发送信号。
+PROFILER_CODE = r'''
+def __kimi_install_profiler(request_path):
+    import json, os, signal, sys, threading
+
+    state = {"thread": None, "stop": None, "stacks": {}, "samples": 0}
+
+    def sample(target, interval, stop, stacks):
+        current_frames = sys._current_frames
+        while not stop.wait(interval):
+            frame = current_frames().get(target)
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if parts:
+                key = ";".join(reversed(parts))
+                stacks[key] = stacks.get(key, 0) + 1
+                state["samples"] += 1
+
+    def handle(signum, frame):
+        with open(request_path) as f:
+            request = json.load(f)
+        if request["action"] == "start":
+            if state["thread"] is not None:
+                return
+            state["stacks"], state["samples"] = {}, 0
+            state["stop"] = threading.Event()
+            state["thread"] = threading.Thread(
+                target=sample,
+                args=(threading.main_thread().ident, request["interval"], state["stop"], state["stacks"]),
+                name="kimi-profiler",
+                daemon=True,
+            )
+            state["thread"].start()
+            return
+        if state["thread"] is not None:
+            state["stop"].set()
+            state["thread"].join()
+            state["thread"] = None
+        tmp_path = request["output"] + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"samples": state["samples"], "stacks": state["stacks"]}, f)
+        os.replace(tmp_path, request["output"])
+
+    signal.signal(signal.SIGUSR2, handle)
+
+__kimi_install_profiler(__REQUEST_PATH__)
+del __kimi_install_profiler
+'''
+
+# kernel 侧预热：init_code 之后在低优先级后台线程里导入常用的重型库，
+# 把导入耗时藏在 agent 思考时间里。每个模块的耗时写入报告文件，供状态接口读取。
+WARMUP_CODE = r'''
+def __kimi_start_warmup(modules, report_path):
+    import importlib, json, os, threading, time
+
+    def write(report):
+        tmp_path = report_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+        os.replace(tmp_path, report_path)
+
+    def warmup():
+        try:
+            # Linux 上每个线程有独立的 nice 值，这里只降低预热线程的优先级
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        report = {"state": "running", "modules": {}}
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                report["modules"][name] = {"success": True}
+            except Exception as e:
+                report["modules"][name] = {"success": False, "error": f"{e.__class__.__name__}: {e}"}
+            report["modules"][name]["seconds"] = round(time.perf_counter() - start, 4)
+            write(report)
+        report["state"] = "done"
+        write(report)
+
+    threading.Thread(target=warmup, name="kimi-warmup", daemon=True).start()
+
+__kimi_start_warmup(__MODULES__, __REPORT_PATH__)
+del __kimi_start_warmup
+'''
+
+
+class KernelStatusSnapshot(BaseModel):
+    """后台监控线程定期刷新的 kernel 状态快照"""
+
+    success: bool = True
+    kernel_alive: bool = False
+    kernel_pid: Optional[int] = None
+    connection_file: Optional[str] = None
+    connection_info: Dict[str, Any] = {}
+    client_connected: bool = False
+    warmup: Optional[Dict[str, Any]] = None
+    updated_at: float = 0.0
 
 
 def get_host_ip():
@@ -35,11 +145,207 @@ def get_host_ip():
         return "0.0.0.0"
 
 
+def parse_size(value: Optional[str]) -> Optional[int]:
+    """解析 "512M"、"2G" 或字节数形式的大小"""
+    if not value:
+        return None
+    value = value.strip().upper().rstrip("B")
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class KernelSandbox:
+    """为 kernel 进程设置资源上限：优先放入独立的 cgroup v2，不可写时回退到 rlimit"""
+
+    def __init__(
+        self,
+        memory_limit: Optional[int] = None,
+        cpu_limit: Optional[float] = None,
+        pids_limit: Optional[int] = None,
+        cgroup_parent: str = "/sys/fs/cgroup/kimi-kernels",
+    ):
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self.pids_limit = pids_limit
+        self.cgroup_parent = cgroup_parent
+        self.mode: Optional[str] = None
+        self.cgroup_path: Optional[str] = None
+        self._oom_kills = 0
+
+    @classmethod
+    def from_env(cls) -> "KernelSandbox":
+        cpu_limit = os.getenv("KERNEL_CPU_LIMIT")
+        pids_limit = os.getenv("KERNEL_PIDS_LIMIT")
+        return cls(
+            memory_limit=parse_size(os.getenv("KERNEL_MEMORY_LIMIT")),
+            cpu_limit=float(cpu_limit) if cpu_limit else None,
+            pids_limit=int(pids_limit) if pids_limit else None,
+            cgroup_parent=os.getenv(
+                "KERNEL_CGROUP_PARENT", "/sys/fs/cgroup/kimi-kernels"
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.memory_limit or self.cpu_limit or self.pids_limit)
+
+    def prepare(self) -> Dict[str, Any]:
+        """创建 cgroup（或准备 rlimit），返回传给 start_kernel 的额外参数"""
+        self.release()
+        if not self.enabled:
+            return {}
+
+        try:
+            self._create_cgroup(f"kernel-{uuid.uuid4().hex[:12]}")
+            self.mode = "cgroup"
+        except OSError as e:
+            print(f"cgroup not available, falling back to rlimits: {str(e)}")
+            self.release()
+            self.mode = "rlimit"
+            if self.pids_limit:
+                print(
+                    "Warning: KERNEL_PIDS_LIMIT is not enforced without cgroups "
+                    "(RLIMIT_NPROC counts every process of the user, not the kernel's)"
+                )
+        return {"preexec_fn": self._preexec}
+
+    def _create_cgroup(self, name: str):
+        controllers = " ".join(
+            f"+{controller}"
+            for controller, limit in (
+                ("memory", self.memory_limit),
+                ("cpu", self.cpu_limit),
+                ("pids", self.pids_limit),
+            )
+            if limit
+        )
+        os.makedirs(self.cgroup_parent, exist_ok=True)
+        # 上级 cgroup 可能已经开启了控制器，失败时以子 cgroup 的写入结果为准
+        try:
+            with open(
+                os.path.join(os.path.dirname(self.cgroup_parent), "cgroup.subtree_control"),
+                "w",
+            ) as f:
+                f.write(controllers)
+        except OSError:
+            pass
+        with open(os.path.join(self.cgroup_parent, "cgroup.subtree_control"), "w") as f:
+            f.write(controllers)
+
+        self.cgroup_path = os.path.join(self.cgroup_parent, name)
+        os.makedirs(self.cgroup_path, exist_ok=True)
+        settings = {}
+        if self.memory_limit:
+            settings["memory.max"] = str(self.memory_limit)
+            # OOM 时杀掉整个 kernel 进程树，而不是随机挑一个子进程
+            settings["memory.oom.group"] = "1"
+        if self.cpu_limit:
+            settings["cpu.max"] = f"{int(self.cpu_limit * 100000)} 100000"
+        if self.pids_limit:
+            settings["pids.max"] = str(self.pids_limit)
+        for filename, value in settings.items():
+            with open(os.path.join(self.cgroup_path, filename), "w") as f:
+                f.write(value)
+        self._oom_kills = self._read_oom_kills()
+
+    def _preexec(self):
+        """在 kernel 子进程 exec 之前执行"""
+        if self.mode == "cgroup" and self.cgroup_path:
+            with open(os.path.join(self.cgroup_path, "cgroup.procs"), "w") as f:
+                f.write(str(os.getpid()))
+            return
+
+        # rlimit 只能限制内存。没有 CPU 核数上限的对应项；RLIMIT_NPROC 统计的是同一 UID 的
+        # 全部进程而不是 kernel 的进程树（服务本身的进程也算在内，可能让 kernel 无法创建线程），
+        # 对 root 又不生效，所以进程数上限不在 rlimit 模式下设置，只在 describe() 中报告
+        if self.memory_limit:
+            resource.setrlimit(
+                resource.RLIMIT_AS, (self.memory_limit, self.memory_limit)
+            )
+
+    def _read_oom_kills(self) -> int:
+        if not self.cgroup_path:
+            return 0
+        try:
+            with open(os.path.join(self.cgroup_path, "memory.events"), "r") as f:
+                for line in f:
+                    key, _, value = line.partition(" ")
+                    if key == "oom_kill":
+                        return int(value)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def check_oom(self) -> bool:
+        """自上次检查以来 cgroup 内是否发生过 OOM kill"""
+        count = self._read_oom_kills()
+        if count > self._oom_kills:
+            self._oom_kills = count
+            return True
+        return False
+
+    def describe_oom(self) -> str:
+        limit = (
+            f"{self.memory_limit / (1 << 30):.2f} GiB" if self.memory_limit else "unknown"
+        )
+        return f"Kernel was killed: out of memory (limit {limit})"
+
+    def release(self):
+        """删除 kernel 对应的 cgroup（进程退出后才能删除）"""
+        if self.cgroup_path:
+            try:
+                os.rmdir(self.cgroup_path)
+            except OSError as e:
+                print(f"Failed to remove cgroup {self.cgroup_path}: {str(e)}")
+        self.cgroup_path = None
+        self.mode = None
+
+    def unsupported(self) -> List[str]:
+        """当前模式下配置了但无法生效的限制"""
+        if self.mode != "rlimit":
+            return []
+        return [
+            name
+            for name, limit in (("cpu_limit", self.cpu_limit), ("pids_limit", self.pids_limit))
+            if limit
+        ]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "unsupported": self.unsupported(),
+            "cgroup_path": self.cgroup_path,
+            "memory_limit": self.memory_limit,
+            "cpu_limit": self.cpu_limit,
+            "pids_limit": self.pids_limit,
+            "oom_kills": self._oom_kills,
+        }
+
+
 class JupyterKernel:
-    def __init__(self):
+    def __init__(self, warmup_modules: Optional[List[str]] = None):
         self.km = None
         self.kc = None
         self.connection_file = None
+        self._profile_interval = 0.005
+        if warmup_modules is None:
+            warmup_modules = [
+                name.strip()
+                for name in os.getenv(
+                    "KERNEL_WARMUP_MODULES", "pandas,openpyxl,pdfplumber"
+                ).split(",")
+                if name.strip()
+            ]
+        self.warmup_modules = warmup_modules
+        self.sandbox = KernelSandbox.from_env()
+        self._kernel_pid: Optional[int] = None
+        self._connection_info: Dict[str, Any] = {}
+        self._status = KernelStatusSnapshot()
+        self._status_monitor: Optional[threading.Thread] = None
+        self._status_monitor_stop = threading.Event()
         self._start_kernel()
 
     def _start_kernel(self):
@@ -47,12 +353,20 @@ class JupyterKernel:
             if self.km:
                 self.shutdown()
 
-            self.km = KernelManager(ip=get_host_ip())
-            self.km.start_kernel()
+            self.km = KernelManager(
+                ip=get_host_ip(),
+                kernel_name=os.getenv("JUPYTER_KERNEL_NAME", "python3"),
+            )
+            self.km.start_kernel(**self.sandbox.prepare())
             self.connection_file = self.km.connection_file
             self.kc = self.km.client()
             self.kc.start_channels()
 
+            # PID 和连接文件在 kernel 生命周期内不变，启动时解析一次
+            self._kernel_pid = self._get_kernel_pid()
+            with open(self.connection_file, "r") as f:
+                self._connection_info = json.load(f)
+
             # 等待 kernel 完全准备好
             timeout = 30
             start_time = time.time()
@@ -116,6 +430,21 @@ else:
 plt.rcParams['axes.unicode_minus'] = False
 """
             self.execute(init_code)
+            self.execute(
+                PROFILER_CODE.replace(
+                    "__REQUEST_PATH__",
+                    json.dumps(self._sidecar_path("profile-request.json")),
+                )
+            )
+            if self.warmup_modules:
+                self.execute(
+                    WARMUP_CODE.replace(
+                        "__MODULES__", json.dumps(self.warmup_modules)
+                    ).replace(
+                        "__REPORT_PATH__", json.dumps(self._sidecar_path("warmup.json"))
+                    )
+                )
+            self.refresh_status()
         except Exception as e:
             print(f"Kernel initialization error: {str(e)}")
             self.shutdown()
@@ -141,7 +470,10 @@ plt.rcParams['axes.unicode_minus'] = False
             print(f"Kernel check failed: {str(e)}")
             self._start_kernel()
 
-    def execute(self, code: str, timeout: int = 30) -> ExecutionResult:
+    def execute(
+        self, code: str, timeout: int = 30, profile: bool = False
+    ) -> ExecutionResult:
+        profile_result = None
         try:
             # 确保 kernel 是活跃的
             self._ensure_kernel_alive()
@@ -150,14 +482,27 @@ plt.rcParams['axes.unicode_minus'] = False
             if not self.kc:
                 raise Exception("Kernel not initialized")
 
+            if profile:
+                try:
+                    self._signal_profiler("start")
+                except Exception as e:
+                    profile = False
+                    profile_result = {
+                        "success": False,
+                        "message": f"Failed to start profiler: {str(e)}",
+                    }
+
             msg_id = self.kc.execute(code)
 
             # 等待执行结果
             output = []
             error = None
+            error_type = None
             images = []
             start_time = time.time()
             removed_prefix = False
+            # 开启资源限制时缩短单次等待，kernel 被 OOM kill 后能尽快发现
+            poll_timeout = 1 if self.sandbox.mode else timeout + 1
 
             while True:
                 try:
@@ -167,9 +512,19 @@ plt.rcParams['axes.unicode_minus'] = False
                             output="",
                             error=f"Executing code timed out, timeout: {timeout} seconds",
                             images=[],
+                            profile=self._finish_profile() if profile else profile_result,
                         )
 
-                    msg = self.kc.get_iopub_msg(timeout=timeout + 1)
+                    try:
+                        msg = self.kc.get_iopub_msg(timeout=poll_timeout)
+                    except queue.Empty:
+                        if self.sandbox.mode and self.sandbox.check_oom():
+                            return self._out_of_memory_result(output, images)
+                        if poll_timeout < timeout + 1:
+                            if self.km and not self.km.is_alive():
+                                raise Exception("Kernel died unexpectedly")
+                            continue
+                        raise
                     msg_type = msg["header"]["msg_type"]
 
                     if msg_type == "stream":
@@ -177,6 +532,8 @@ plt.rcParams['axes.unicode_minus'] = False
                         output.append(msg["content"]["text"])
                     elif msg_type == "error":
                         error = "\n".join(msg["content"]["traceback"])
+                        if msg["content"].get("ename") == "MemoryError":
+                            error_type = "out_of_memory"
                     elif msg_type == "execute_result":
                         if isinstance(msg["content"]["data"], dict):
                             if "text/plain" in msg["content"]["data"]:
@@ -214,12 +571,19 @@ plt.rcParams['axes.unicode_minus'] = False
                 output=final_output,
                 error=error,
                 images=images,
+                profile=self._finish_profile() if profile else profile_result,
+                error_type=error_type,
             )
         except Exception as e:
             import traceback
 
             traceback.print_exc()
             print(f"Execution error: {e.__class__.__name__} {str(e)}")
+            if profile:
+                # 重启之前停止采样并取走结果，不留下采样线程和输出文件
+                profile_result = self._finish_profile()
+            if self.sandbox.mode and self.sandbox.check_oom():
+                return self._out_of_memory_result([], [])
             # 如果执行出错，尝试重启 kernel
             try:
                 self._start_kernel()
@@ -232,6 +596,7 @@ plt.rcParams['axes.unicode_minus'] = False
                     output="",
                     error=f"Executing code timed out, timeout: {timeout} seconds",
                     images=[],
+                    profile=profile_result,
                 )
             else:
                 return ExecutionResult(
@@ -239,8 +604,27 @@ plt.rcParams['axes.unicode_minus'] = False
                     output="",
                     error=f"{e.__class__.__name__}: {str(e)}",
                     images=[],
+                    profile=profile_result,
                 )
 
+    def _out_of_memory_result(
+        self, output: List[str], images: List[str]
+    ) -> ExecutionResult:
+        """kernel 被 cgroup OOM kill：返回结构化错误并重启 kernel"""
+        message = self.sandbox.describe_oom()
+        print(message)
+        try:
+            self._start_kernel()
+        except Exception as restart_error:
+            print(f"Failed to restart kernel: {str(restart_error)}")
+        return ExecutionResult(
+            success=False,
+            output="".join(output).strip(),
+            error=message,
+            images=images,
+            error_type="out_of_memory",
+        )
+
     def reset_kernel(self) -> Dict[str, Any]:
         """重置 kernel"""
         try:
@@ -296,24 +680,127 @@ plt.rcParams['axes.unicode_minus'] = False
                 "message": f"Failed to interrupt kernel: {str(e)}",
             }
 
+    def _sidecar_path(self, suffix: str) -> Optional[str]:
+        """与连接文件同目录的 kernel 辅助文件路径"""
+        if not self.connection_file:
+            return None
+        base, _ = os.path.splitext(self.connection_file)
+        return f"{base}-{suffix}"
+
+    def _read_warmup_report(self) -> Optional[Dict[str, Any]]:
+        """读取 kernel 侧写出的预热报告"""
+        report_path = self._sidecar_path("warmup.json")
+        if not self.warmup_modules or not report_path:
+            return None
+        if not os.path.exists(report_path):
+            return {"state": "pending", "modules": {}}
+        try:
+            with open(report_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _signal_profiler(self, action: str, interval: float = 0.005) -> int:
+        """写入采样请求并通过 SIGUSR2 通知 kernel 侧采样器"""
+        kernel_pid = self._get_kernel_pid()
+        request_path = self._sidecar_path("profile-request.json")
+        output_path = self._sidecar_path("profile.json")
+        if not kernel_pid or not request_path or not output_path:
+            raise Exception("Kernel not initialized")
+
+        if action == "start" and os.path.exists(output_path):
+            os.remove(output_path)
+        with open(request_path, "w") as f:
+            json.dump(
+                {"action": action, "interval": interval, "output": output_path}, f
+            )
+        psutil.Process(kernel_pid).send_signal(signal.SIGUSR2)
+        if action == "start":
+            self._profile_interval = interval
+        return kernel_pid
+
+    def _collect_profile(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """等待 kernel 写出采样结果，并汇总为 collapsed stack 和自身耗时排行"""
+        output_path = self._sidecar_path("profile.json")
+        if not output_path:
+            raise Exception("Kernel not initialized")
+
+        deadline = time.time() + timeout
+        while not os.path.exists(output_path):
+            if time.time() > deadline:
+                raise Exception("Timeout waiting for profile output")
+            time.sleep(0.02)
+        with open(output_path, "r") as f:
+            raw = json.load(f)
+        os.remove(output_path)
+
+        interval = self._profile_interval
+        stacks: Dict[str, int] = raw.get("stacks", {})
+        total = raw.get("samples", 0)
+        self_samples: Dict[str, int] = {}
+        for stack, count in stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            self_samples[leaf] = self_samples.get(leaf, 0) + count
+
+        top_self = [
+            {
+                "function": function,
+                "self_samples": count,
+                "self_seconds": round(count * interval, 4),
+                "self_percent": round(100.0 * count / total, 2) if total else 0.0,
+            }
+            for function, count in sorted(
+                self_samples.items(), key=lambda item: item[1], reverse=True
+            )[:20]
+        ]
+        return {
+            "success": True,
+            "samples": total,
+            "interval": interval,
+            # Brendan Gregg collapsed 格式，可直接导入 speedscope / flamegraph.pl
+            "collapsed": "\n".join(
+                f"{stack} {count}" for stack, count in sorted(stacks.items())
+            ),
+            "top_self": top_self,
+        }
+
+    def _finish_profile(self) -> Dict[str, Any]:
+        """停止采样并返回结果，失败时不影响执行结果"""
+        try:
+            self._signal_profiler("stop")
+            return self._collect_profile()
+        except Exception as e:
+            return {"success": False, "message": f"Failed to collect profile: {str(e)}"}
+
+    def profile_kernel(
+        self, duration: float = 5.0, interval: float = 0.005
+    ) -> Dict[str, Any]:
+        """对 kernel 当前的执行采样 duration 秒"""
+        try:
+            if not self.km:
+                return {"success": False, "message": "Kernel not initialized"}
+
+            kernel_pid = self._signal_profiler("start", interval)
+            time.sleep(duration)
+            self._signal_profiler("stop")
+            result = self._collect_profile()
+            return {**result, "kernel_pid": kernel_pid, "duration": duration}
+        except Exception as e:
+            return {"success": False, "message": f"Failed to profile kernel: {str(e)}"}
+
     def get_connection_info(self) -> Dict[str, Any]:
         """获取 kernel 连接信息"""
         try:
             if not self.km or not self.connection_file:
                 return {"success": False, "message": "Kernel not initialized"}
 
-            # 读取连接文件内容
-            connection_info = {}
-            if os.path.exists(self.connection_file):
-                with open(self.connection_file, "r") as f:
-                    connection_info = json.load(f)
-
+            # 连接文件内容和 PID 在 kernel 启动时已缓存
             return {
                 "success": True,
                 "connection_file": self.connection_file,
-                "connection_info": connection_info,
+                "connection_info": self._connection_info,
                 "kernel_alive": self.km.is_alive() if self.km else False,
-                "kernel_pid": self._get_kernel_pid(),
+                "kernel_pid": self._kernel_pid,
             }
         except Exception as e:
             return {
@@ -327,6 +814,7 @@ plt.rcParams['axes.unicode_minus'] = False
             "km_exists": self.km is not None,
             "km_type": str(type(self.km)) if self.km else None,
             "km_alive": self.km.is_alive() if self.km else False,
+            "sandbox": self.sandbox.describe(),
             "attributes": {},
             "methods_tried": {},
         }
@@ -446,17 +934,17 @@ plt.rcParams['axes.unicode_minus'] = False
                 "kernel_pid": None,
                 "connection_file": self.connection_file,
                 "client_connected": False,
+                "warmup": self._read_warmup_report(),
             }
 
             if self.km:
                 status["kernel_alive"] = self.km.is_alive()
-                status["kernel_pid"] = self._get_kernel_pid()
+                status["kernel_pid"] = self._kernel_pid
 
             if self.kc:
                 try:
-                    # 尝试获取 kernel 信息来检查连接状态
-                    self.kc.kernel_info()
-                    status["client_connected"] = True
+                    # 通过心跳判断连接状态，不占用 shell 通道，kernel 忙时也不会阻塞
+                    status["client_connected"] = self.kc.hb_channel.is_beating()
                 except:
                     status["client_connected"] = False
 
@@ -467,6 +955,62 @@ plt.rcParams['axes.unicode_minus'] = False
                 "message": f"Failed to get kernel status: {str(e)}",
             }
 
+    def refresh_status(self) -> KernelStatusSnapshot:
+        """重新计算状态快照"""
+        status = self.get_kernel_status()
+        if status.get("success"):
+            snapshot = KernelStatusSnapshot(
+                **{key: value for key, value in status.items() if key != "message"},
+                connection_info=self._connection_info,
+                updated_at=time.time(),
+            )
+        else:
+            snapshot = KernelStatusSnapshot(success=False, updated_at=time.time())
+        self._status = snapshot
+        return snapshot
+
+    def _status_monitor_loop(self, interval: float):
+        while not self._status_monitor_stop.wait(interval):
+            try:
+                self.refresh_status()
+            except Exception as e:
+                print(f"Status monitor error: {str(e)}")
+
+    def start_status_monitor(self, interval: float = 1.0):
+        """启动后台状态监控线程"""
+        if self._status_monitor and self._status_monitor.is_alive():
+            return
+        self._status_monitor_stop.clear()
+        self._status_monitor = threading.Thread(
+            target=self._status_monitor_loop,
+            args=(interval,),
+            name="kernel-status-monitor",
+            daemon=True,
+        )
+        self._status_monitor.start()
+
+    def stop_status_monitor(self):
+        """停止后台状态监控线程"""
+        self._status_monitor_stop.set()
+        if self._status_monitor:
+            self._status_monitor.join(timeout=5)
+            self._status_monitor = None
+
+    def get_status_snapshot(self, max_staleness: float = 5.0) -> Dict[str, Any]:
+        """
+        读取最近一次的状态快照，不访问 kernel；快照超过 max_staleness 秒（监控线程未运行或
+        已退出）时当场刷新一次，stale 表示返回的是刷新后的结果
+        """
+        snapshot = self._status
+        stale = time.time() - snapshot.updated_at > max_staleness
+        if stale:
+            snapshot = self.refresh_status()
+        return {
+            **snapshot.model_dump(),
+            "stale": stale,
+            "age": round(time.time() - snapshot.updated_at, 3),
+        }
+
     def shutdown(self):
         """安全地关闭 kernel"""
         try:
@@ -477,9 +1021,14 @@ plt.rcParams['axes.unicode_minus'] = False
         except Exception as e:
             print(f"Error during kernel shutdown: {str(e)}")
         finally:
+            # 关闭失败时 kernel 进程可能仍在，cgroup 删除会失败，但状态总是要清理
+            self.sandbox.release()
             self.kc = None
             self.km = None
             self.connection_file = None
+            self._kernel_pid = None
+            self._connection_info = {}
+            self.refresh_status()
 
 
 kernel = JupyterKernel()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Kernel Server 压测工具
+按配置的并发和路由权重驱动 kernel_server，统计每个路由的延迟分位数和错误率。
+
+配合 fake_kernel.py 使用时，kernel 本身的耗时是脚本化的，延迟的变化基本都来自服务端
+（例如事件循环被同步调用阻塞）。`/` 路由不访问 kernel，作为事件循环的探针单独统计。
+
+    python kernel_loadtest.py --spawn --concurrency 16 --duration 30
+    python kernel_loadtest.py --url http://localhost:8888 --mix health=1,status=1
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from fake_kernel import KERNEL_NAME, install_kernelspec
+
+ROUTES: Dict[str, Tuple[str, str]] = {
+    "health": ("GET", "/health"),
+    "status": ("GET", "/kernel/status"),
+    "connection": ("GET", "/kernel/connection"),
+    "connection-file": ("GET", "/kernel/connection-file"),
+    "interrupt": ("POST", "/kernel/interrupt"),
+    "reset": ("POST", "/kernel/reset"),
+    "execute": ("POST", "/kernel/execute"),
+}
+DEFAULT_MIX = "health=10,status=10,connection=5,connection-file=5,interrupt=1,reset=0.2,execute=5"
+CANARY_ROUTE = "canary"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析 "health=10,status=5" 形式的路由权重"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法分位数：第 ceil(pct / 100 * n) 个值，values 需已排序"""
+    if not values:
+        return 0.0
+    # 先乘后除，避免 0.07 * 100 这类浮点误差让 ceil 多进一位
+    index = max(0, min(len(values) - 1, math.ceil(pct * len(values) / 100.0) - 1))
+    return values[index]
+
+
+class LoadTest:
+    def __init__(
+        self,
+        base_url: str,
+        weights: Dict[str, float],
+        concurrency: int = 8,
+        duration: float = 30.0,
+        timeout: float = 30.0,
+        execute_code: str = "print('ok')",
+        canary_interval: float = 0.05,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.weights = weights
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.execute_code = execute_code
+        self.canary_interval = canary_interval
+        self.samples: Dict[str, List[Tuple[float, bool]]] = {}
+        self.lock = threading.Lock()
+        self.deadline = 0.0
+
+    def _record(self, route: str, latency: float, ok: bool):
+        with self.lock:
+            self.samples.setdefault(route, []).append((latency, ok))
+
+    def _request(self, session: requests.Session, route: str):
+        method, path = ROUTES[route]
+        body = {"code": self.execute_code} if route == "execute" else None
+        start = time.perf_counter()
+        try:
+            response = session.request(
+                method, self.base_url + path, json=body, timeout=self.timeout
+            )
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        self._record(route, time.perf_counter() - start, ok)
+
+    def _worker(self):
+        routes = list(self.weights)
+        weights = [self.weights[route] for route in routes]
+        with requests.Session() as session:
+            while time.time() < self.deadline:
+                self._request(session, random.choices(routes, weights)[0])
+
+    def _canary(self):
+        """固定频率请求不依赖 kernel 的 `/`，其延迟直接反映事件循环是否被阻塞"""
+        with requests.Session() as session:
+            while time.time() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    ok = session.get(self.base_url + "/", timeout=self.timeout).ok
+                except requests.RequestException:
+                    ok = False
+                self._record(CANARY_ROUTE, time.perf_counter() - start, ok)
+                time.sleep(self.canary_interval)
+
+    def discover_routes(self):
+        """execute 路由只有在服务端提供时才参与压测"""
+        try:
+            paths = requests.get(self.base_url + "/openapi.json", timeout=5).json()["paths"]
+        except (requests.RequestException, ValueError, KeyError):
+            return
+        for route in list(self.weights):
+            if ROUTES[route][1] not in paths:
+                print(f"Route {ROUTES[route][1]} not available, skipping")
+                del self.weights[route]
+
+    def run(self) -> Dict[str, Any]:
+        self.discover_routes()
+        if not self.weights:
+            raise ValueError("No routes to drive")
+
+        self.deadline = time.time() + self.duration
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency + 1) as executor:
+            futures = [executor.submit(self._worker) for _ in range(self.concurrency)]
+            if self.canary_interval > 0:
+                futures.append(executor.submit(self._canary))
+            for future in futures:
+                future.result()
+        return self.report(time.time() - started)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        total = errors = 0
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            failed = sum(1 for _, ok in samples if not ok)
+            if route != CANARY_ROUTE:
+                total += len(samples)
+                errors += failed
+            routes[route] = {
+                "requests": len(samples),
+                "errors": failed,
+                "error_rate": round(failed / len(samples), 4),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+            }
+        return {
+            "elapsed": round(elapsed, 2),
+            "concurrency": self.concurrency,
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "routes": routes,
+        }
+
+
+def spawn_server(port: int, latency: str, output_bytes: str, workdir: str) -> subprocess.Popen:
+    """用 fake kernel 启动 kernel_server，等待 /health 可用"""
+    env = dict(os.environ)
+    env["JUPYTER_PATH"] = install_kernelspec(
+        workdir,
+        {"FAKE_KERNEL_LATENCY": latency, "FAKE_KERNEL_OUTPUT_BYTES": output_bytes},
+    )
+    env["JUPYTER_KERNEL_NAME"] = KERNEL_NAME
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        [sys.executable, "kernel_server.py", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=here,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"kernel_server exited with code {process.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Timeout waiting for kernel_server to start")
+
+
+def print_report(report: Dict[str, Any]):
+    header = f"{'route':<16}{'reqs':>8}{'err%':>8}{'rps':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:<16}{stats['requests']:>8}{stats['error_rate'] * 100:>7.2f}%"
+            f"{stats['rps']:>9.1f}{stats['p50_ms']:>8.1f}ms{stats['p90_ms']:>8.1f}ms"
+            f"{stats['p99_ms']:>8.1f}ms{stats['max_ms']:>8.1f}ms"
+        )
+    print("-" * len(header))
+    print(
+        f"total {report['requests']} requests in {report['elapsed']}s, "
+        f"{report['rps']} rps, error rate {report['error_rate'] * 100:.2f}%"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kernel Server load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8888", help="Server URL")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Route weights, e.g. health=10,reset=0.5")
+    parser.add_argument("--code", default="print('ok')", help="Code sent to the execute route")
+    parser.add_argument(
+        "--canary-interval",
+        type=float,
+        default=0.05,
+        help="Interval of event-loop canary requests to / (0 to disable)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print report as JSON")
+    parser.add_argument(
+        "--spawn",
+        action="store_true",
+        help="Start kernel_server backed by the fake kernel on --port",
+    )
+    parser.add_argument("--port", type=int, default=18888, help="Port for --spawn")
+    parser.add_argument("--fake-latency", default="0.01-0.05", help="Fake kernel execution latency")
+    parser.add_argument("--fake-output-bytes", default="64-4096", help="Fake kernel output size")
+
+    args = parser.parse_args()
+
+    server: Optional[subprocess.Popen] = None
+    url = args.url
+    with tempfile.TemporaryDirectory(prefix="fake-kernel-") as workdir:
+        try:
+            if args.spawn:
+                server = spawn_server(
+                    args.port, args.fake_latency, args.fake_output_bytes, workdir
+                )
+                url = f"http://127.0.0.1:{args.port}"
+
+            result = LoadTest(
+                url,
+                parse_mix(args.mix),
+                concurrency=args.concurrency,
+                duration=args.duration,
+                timeout=args.timeout,
+                execute_code=args.code,
+                canary_interval=args.canary_interval,
+            ).run()
+            if args.json:
+                print(json.dumps(result, indent=2))
+            else:
+                print_report(result)
+        finally:
+            if server:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
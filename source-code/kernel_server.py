@@ -9,18 +9,20 @@
 #!/usr/bin/env python3
 """
 Jupyter Kernel Management Server
-提供 kernel 的 reset、interrupt 和 connectionFile 查询接口
+提供 kernel 的 reset、interrupt、profile 和 connectionFile 查询接口
 """
 
 import logging
+import os
 from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
 
 import uvicorn
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from jupyter_kernel import JupyterKernel
 
@@ -33,6 +35,10 @@ logger = logging.getLogger(__name__)
 # 全局 kernel 实例
 kernel_instance: Optional[JupyterKernel] = None
 
+# 状态快照的刷新间隔和最大允许的过期时间（秒）
+STATUS_INTERVAL = float(os.getenv("KERNEL_STATUS_INTERVAL", "1.0"))
+STATUS_MAX_STALENESS = float(os.getenv("KERNEL_STATUS_MAX_STALENESS", "5.0"))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -41,6 +47,7 @@ async def lifespan(app: FastAPI):
     try:
         logger.info("正在初始化 Jupyter Kernel...")
         kernel_instance = JupyterKernel()
+        kernel_instance.start_status_monitor(STATUS_INTERVAL)
         logger.info("Jupyter Kernel 初始化完成")
         yield
     except Exception as e:
@@ -49,6 +56,7 @@ async def lifespan(app: FastAPI):
     finally:
         if kernel_instance:
             logger.info("正在关闭 Jupyter Kernel...")
+            kernel_instance.stop_status_monitor()
             kernel_instance.shutdown()
             logger.info("Jupyter Kernel 已关闭")
 
@@ -88,6 +96,9 @@ class KernelStatusResponse(BaseModel):
     kernel_pid: Optional[int] = None
     connection_file: Optional[str] = None
     client_connected: bool
+    warmup: Optional[Dict[str, Any]] = None
+    stale: bool = False
+    age: Optional[float] = None
 
 
 class ConnectionInfoResponse(BaseModel):
@@ -101,6 +112,13 @@ class ConnectionInfoResponse(BaseModel):
     message: Optional[str] = None
 
 
+class ProfileRequest(BaseModel):
+    """采样请求模型"""
+
+    duration: float = Field(default=5.0, gt=0, le=60)
+    interval: float = Field(default=0.005, ge=0.001, le=1.0)
+
+
 # API 路由
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -119,7 +137,7 @@ async def health_check():
     if not kernel_instance:
         raise HTTPException(status_code=503, detail="Kernel not initialized")
 
-    status = kernel_instance.get_kernel_status()
+    status = kernel_instance.get_status_snapshot(STATUS_MAX_STALENESS)
     return JSONResponse(
         status_code=200 if status.get("success") else 503, content=status
     )
@@ -185,6 +203,39 @@ async def interrupt_kernel():
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.post("/kernel/profile", response_model=ApiResponse)
+async def profile_kernel(request: ProfileRequest):
+    """对当前执行进行统计采样"""
+    global kernel_instance
+    if not kernel_instance:
+        raise HTTPException(status_code=503, detail="Kernel not initialized")
+
+    try:
+        logger.info(f"收到 kernel 采样请求: {request.duration}s")
+        # 采样期间需要等待 duration 秒，放到线程池避免阻塞事件循环
+        result = await run_in_threadpool(
+            kernel_instance.profile_kernel, request.duration, request.interval
+        )
+
+        if result.get("success"):
+            return ApiResponse(
+                success=True,
+                message="Kernel profiled successfully",
+                data=result,
+            )
+        else:
+            logger.error(f"Kernel 采样失败: {result.get('message')}")
+            raise HTTPException(
+                status_code=500,
+                detail=result.get("message", "Failed to profile kernel"),
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"kernel 采样时发生错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
 @app.get("/kernel/connection", response_model=ConnectionInfoResponse)
 async def get_connection_info():
     """获取 kernel 连接信息"""
@@ -194,7 +245,7 @@ async def get_connection_info():
 
     try:
         logger.info("收到连接信息查询请求")
-        result = kernel_instance.get_connection_info()
+        result = kernel_instance.get_status_snapshot(STATUS_MAX_STALENESS)
 
         if result.get("success"):
             return ConnectionInfoResponse(
@@ -224,7 +275,7 @@ async def get_kernel_status():
         raise HTTPException(status_code=503, detail="Kernel not initialized")
 
     try:
-        result = kernel_instance.get_kernel_status()
+        result = kernel_instance.get_status_snapshot(STATUS_MAX_STALENESS)
 
         if result.get("success"):
             return KernelStatusResponse(
@@ -233,9 +284,12 @@ async def get_kernel_status():
                 kernel_pid=result.get("kernel_pid"),
                 connection_file=result.get("connection_file"),
                 client_connected=result.get("client_connected", False),
+                warmup=result.get("warmup"),
+                stale=result.get("stale", False),
+                age=result.get("age"),
             )
         else:
-            logger.error(f"获取 kernel 状态失败: {result.get('message')}")
+            logger.error("获取 kernel 状态失败")
             raise HTTPException(
                 status_code=500,
                 detail=result.get("message", "Failed to get kernel status"),
@@ -254,7 +308,7 @@ async def get_connection_file_path():
         raise HTTPException(status_code=503, detail="Kernel not initialized")
 
     try:
-        result = kernel_instance.get_connection_info()
+        result = kernel_instance.get_status_snapshot(STATUS_MAX_STALENESS)
 
         if result.get("success"):
             return {
@@ -0,0 +1,106 @@
+"""
+Shared test setup: makes the modules in source-code importable and provides a fake CDP
+connection for the modules built on cdp_client.
+"""
+
+import asyncio
+import inspect
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCDPSession:
+    """A target session that records commands and lets tests emit events."""
+
+    def __init__(self, connection, target_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.sent = []
+        self.listeners = {}
+        self.detached = False
+
+    async def send(self, method, params=None, timeout=5.0):
+        self.sent.append((method, params))
+        return await self.connection._handle(self, method, params or {})
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def off(self, event, callback):
+        if callback in self.listeners.get(event, []):
+            self.listeners[event].remove(callback)
+
+    def emit(self, event, params=None):
+        for callback in list(self.listeners.get(event, [])):
+            callback(params or {})
+
+    def emit_soon(self, event, params=None):
+        """Emit after the current command has returned, like a real browser would."""
+        asyncio.get_running_loop().call_soon(self.emit, event, params)
+
+    @property
+    def methods(self):
+        return [method for method, _ in self.sent]
+
+    async def detach(self):
+        self.detached = True
+
+
+class FakeCDPConnection:
+    """
+    A browser-level connection. handlers maps a CDP method to handler(session, params),
+    which returns the result (or an awaitable of it) or raises; session is None for
+    browser-level commands. Unhandled commands return {}. Every attach creates a new session.
+    """
+
+    def __init__(self, handlers=None, attach_delay=0.0):
+        self.handlers = dict(handlers or {})
+        self.attach_delay = attach_delay
+        self.calls = []
+        self.sessions = []
+        self.listeners = {}
+        self.closed = False
+
+    @property
+    def session(self):
+        """The most recently attached session."""
+        return self.sessions[-1]
+
+    async def _handle(self, session, method, params):
+        self.calls.append((session.target_id if session else None, method))
+        handler = self.handlers.get(method)
+        if handler is None:
+            return {}
+        result = handler(session, params)
+        if inspect.isawaitable(result):
+            result = await result
+        return {} if result is None else result
+
+    async def send(self, method, params=None, session_id=None, timeout=5.0):
+        return await self._handle(None, method, params or {})
+
+    def on(self, event, callback, session_id=None):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, params=None):
+        for callback in list(self.listeners.get(event, [])):
+            callback(params or {})
+
+    async def attach(self, target_id, timeout=5.0):
+        if self.attach_delay:
+            await asyncio.sleep(self.attach_delay)
+        session = FakeCDPSession(self, target_id)
+        self.sessions.append(session)
+        return session
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_cdp():
+    return FakeCDPConnection()
@@ -0,0 +1,851 @@
+"""
+Test cases for browser_guard.
+These tests verify that the async guard paths never block the event loop.
+"""
+
+import asyncio
+import os
+import socket
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("loguru")
+pytest.importorskip("playwright")
+pytest.importorskip("psutil")
+pytest.importorskip("websockets")
+
+import browser_guard
+from browser_guard import (
+    BrowserCDPGuard,
+    BrowserGuard,
+    ChromiumMemoryWatchdog,
+    TabBudgetManager,
+    _get_chromium_version,
+    display_socket_path,
+    wait_for_display,
+    wait_for_display_async,
+)
+from browser_session import placeholder_url
+from conftest import FakeCDPConnection
+
+# Largest acceptable gap between two event loop ticks
+MAX_LOOP_LAG = 0.1
+# How long the fake endpoints take to answer; a blocking call would stall the loop this long
+SLOW_RESPONSE = 0.3
+
+
+class SlowDevToolsHandler(BaseHTTPRequestHandler):
+    """Answers the DevTools HTTP endpoints after a delay."""
+
+    def _reply(self, body: bytes):
+        time.sleep(SLOW_RESPONSE)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/json/version":
+            self._reply(b'{"Browser": "Chromium/120.0.6099.109"}')
+        else:
+            self._reply(b'[{"id": "1", "type": "page", "url": "chrome://newtab/"}]')
+
+    def do_PUT(self):
+        self._reply(b'{"id": "2", "type": "page"}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def devtools_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowDevToolsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+async def run_with_lag_probe(coro, interval: float = 0.01):
+    """Run coro while measuring the largest event loop stall."""
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(loop.time() - start - interval)
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await task
+    return result, max(lags, default=0.0)
+
+
+class TestBrowserCDPGuardBlocking:
+    """DevTools HTTP calls must not stall the guard's event loop."""
+
+    def test_http_endpoints_do_not_block(self, devtools_url):
+        async def scenario():
+            guard = BrowserCDPGuard()
+            guard.cdp_url = devtools_url
+            try:
+                return await asyncio.gather(
+                    guard._is_browser_running(),
+                    guard.get_cdp_tabs(),
+                    guard.open_new_tab(),
+                )
+            finally:
+                await guard.stop_async()
+
+        (running, tabs, opened), lag = asyncio.run(run_with_lag_probe(scenario()))
+        assert running is True
+        assert [tab["id"] for tab in tabs] == ["1"]
+        assert opened is True
+        assert lag < MAX_LOOP_LAG
+
+
+class TestChromiumVersion:
+    """The version probe runs the browser binary without blocking."""
+
+    def test_version_probe_does_not_block(self, tmp_path):
+        executable = tmp_path / "chromium"
+        executable.write_text(
+            f"#!/bin/sh\nsleep {SLOW_RESPONSE}\necho 'Chromium 120.0.6099.109'\n"
+        )
+        executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+
+        version, lag = asyncio.run(
+            run_with_lag_probe(_get_chromium_version(str(executable)))
+        )
+        assert version == "120.0.6099.109"
+        assert lag < MAX_LOOP_LAG
+
+
+class TestChromiumVersionCache:
+    """The version probe only reruns when the binary changes."""
+
+    def test_cached_by_mtime(self, tmp_path, monkeypatch):
+        calls = tmp_path / "calls"
+        executable = tmp_path / "chromium"
+        executable.write_text(
+            f"#!/bin/sh\necho x >> {calls}\necho 'Chromium 120.0.6099.109'\n"
+        )
+        executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setattr(browser_guard, "IDENTITY_CACHE_PATH", str(tmp_path / "identity.json"))
+        monkeypatch.setattr(browser_guard, "_version_cache", {})
+
+        def probe():
+            return asyncio.run(browser_guard._get_cached_chromium_version(str(executable)))
+
+        assert probe() == "120.0.6099.109"
+        assert probe() == "120.0.6099.109"
+        assert len(calls.read_text().split()) == 1
+
+        # A new process only has the file cache
+        browser_guard._version_cache.clear()
+        assert probe() == "120.0.6099.109"
+        assert len(calls.read_text().split()) == 1
+
+        # Replacing the binary invalidates the cache
+        mtime = executable.stat().st_mtime + 10
+        os.utime(executable, (mtime, mtime))
+        assert probe() == "120.0.6099.109"
+        assert len(calls.read_text().split()) == 2
+
+
+class FakePage:
+    async def goto(self, url):
+        return None
+
+
+class FakeContext:
+    def __init__(self, hang: bool = False):
+        self.hang = hang
+        self.pages = []
+
+    async def new_page(self):
+        if self.hang:
+            await asyncio.sleep(3600)
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+
+class TestBrowserGuardRecovery:
+    """Closing the last tab should use the cheapest recovery tier that works."""
+
+    def _guard(self, context):
+        guard = BrowserGuard()
+        guard.browser = context
+        return guard
+
+    def test_new_page_when_context_healthy(self):
+        guard = self._guard(FakeContext())
+        asyncio.run(guard._recover())
+        assert guard.get_recovery_stats() == {"new_page": 1, "context_restart": 0, "relaunch": 0}
+        assert len(guard.browser.pages) == 1
+
+    def test_context_restart_when_cdp_unresponsive(self, monkeypatch):
+        monkeypatch.setattr(browser_guard, "RECOVERY_TIMEOUT", 0.05)
+        guard = self._guard(FakeContext(hang=True))
+        restarted = []
+
+        async def restart_context():
+            restarted.append(True)
+
+        guard._restart_context = restart_context
+        asyncio.run(guard._recover())
+        assert restarted == [True]
+        assert guard.get_recovery_stats()["context_restart"] == 1
+
+    def test_relaunch_on_crash(self):
+        guard = self._guard(FakeContext())
+        guard._context_closed = True
+        calls = []
+
+        async def close_context():
+            calls.append("close_context")
+
+        async def start():
+            calls.append("start")
+
+        guard._close_context = close_context
+        guard.start = start
+        asyncio.run(guard._recover())
+        assert calls == ["close_context", "start"]
+        assert guard.get_recovery_stats()["relaunch"] == 1
+
+
+def driver_processes():
+    """Playwright driver (node) processes started directly by this process."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == os.getpid() and "playwright" in cmdline:
+            pids.append(int(entry))
+    return pids
+
+
+@pytest.mark.skipif(
+    not os.getenv("BROWSER_GUARD_SOAK") or not os.path.exists("/usr/bin/chromium"),
+    reason="soak test needs Chromium and a display; set BROWSER_GUARD_SOAK=1",
+)
+class TestBrowserGuardSoak:
+    """Repeated relaunches must not leak drivers or slow down."""
+
+    RESTARTS = 100
+
+    def test_relaunch_reuses_driver(self):
+        async def scenario():
+            guard = BrowserGuard()
+            await guard.start()
+            driver = guard.playwright
+            counts, latencies = [], []
+            try:
+                for _ in range(self.RESTARTS):
+                    start = time.perf_counter()
+                    await guard._relaunch()
+                    latencies.append(time.perf_counter() - start)
+                    counts.append(len(driver_processes()))
+                    assert guard.playwright is driver
+            finally:
+                await guard.shutdown()
+            return counts, latencies, len(driver_processes())
+
+        counts, latencies, after_shutdown = asyncio.run(scenario())
+        assert max(counts) == min(counts) == 1
+        assert after_shutdown == 0
+        first = sorted(latencies[:10])[5]
+        last = sorted(latencies[-10:])[5]
+        assert last < first * 1.5 + 0.5
+
+
+class RecordingSession:
+    def __init__(self, target_id, log):
+        self.target_id = target_id
+        self.log = log
+
+    async def send(self, method, params=None, timeout=5.0):
+        self.log.append((self.target_id, method, params))
+        return {}
+
+
+class TestChromiumMemoryWatchdog:
+    """Memory pressure discards background tabs first, then restarts."""
+
+    MB = 1 << 20
+
+    def _watchdog(self, rss, tabs, restarts):
+        async def restart():
+            restarts.append(True)
+
+        watchdog = ChromiumMemoryWatchdog(
+            "http://127.0.0.1:9222",
+            restart,
+            soft_limit=1000 * self.MB,
+            hard_limit=2000 * self.MB,
+        )
+        log = []
+
+        async def sample():
+            return {"rss": rss, "tabs": tabs, "time": time.time()}
+
+        async def session(target_id):
+            return RecordingSession(target_id, log)
+
+        watchdog.sample = sample
+        watchdog._session = session
+        return watchdog, log
+
+    def test_soft_limit_freezes_largest_background_tab(self):
+        tabs = [
+            {"target_id": "active", "url": "a", "js_heap": 500 * self.MB, "hidden": False},
+            {"target_id": "big", "url": "b", "js_heap": 100 * self.MB, "hidden": True},
+            {"target_id": "small", "url": "c", "js_heap": 10 * self.MB, "hidden": True},
+        ]
+        restarts = []
+        watchdog, log = self._watchdog(1050 * self.MB, tabs, restarts)
+        asyncio.run(watchdog.check())
+        assert log == [("big", "Page.setWebLifecycleState", {"state": "frozen"})]
+        assert watchdog.stats["discarded"] == 1
+        assert restarts == []
+
+    def test_freeze_releases_nothing_so_one_tab_per_check(self):
+        tabs = [
+            {"target_id": "a", "url": "a", "js_heap": 10 * self.MB, "hidden": True},
+            {"target_id": "b", "url": "b", "js_heap": 20 * self.MB, "hidden": True},
+            {"target_id": "c", "url": "c", "js_heap": 30 * self.MB, "hidden": True},
+        ]
+        watchdog, log = self._watchdog(1500 * self.MB, tabs, [])
+
+        async def scenario():
+            await watchdog.check()
+            assert [entry[0] for entry in log] == ["c"]
+            await watchdog.check()
+
+        asyncio.run(scenario())
+        assert [entry[0] for entry in log] == ["c", "b"]
+
+    def test_close_counts_released_heap(self):
+        tabs = [
+            {"target_id": "a", "url": "a", "js_heap": 10 * self.MB, "hidden": True},
+            {"target_id": "b", "url": "b", "js_heap": 40 * self.MB, "hidden": True},
+            {"target_id": "c", "url": "c", "js_heap": 30 * self.MB, "hidden": True},
+            {"target_id": "d", "url": "d", "js_heap": 1 * self.MB, "hidden": False},
+        ]
+        watchdog, _ = self._watchdog(1060 * self.MB, tabs, [])
+        watchdog.discard_mode = "close"
+        closed = []
+
+        class FakeCDP:
+            async def send(self, method, params=None):
+                closed.append(params["targetId"])
+
+        watchdog.cdp = FakeCDP()
+        asyncio.run(watchdog.check())
+        assert closed == ["b", "c"]
+
+    def test_limits_follow_cgroup(self, tmp_path, monkeypatch):
+        memory_max = tmp_path / "memory.max"
+        monkeypatch.setattr(browser_guard, "CGROUP_MEMORY_MAX", str(memory_max))
+        memory_max.write_text(f"{1000 * self.MB}\n")
+        watchdog = ChromiumMemoryWatchdog("http://127.0.0.1:9222", lambda: None)
+        assert watchdog.soft_limit == 600 * self.MB
+        assert watchdog.hard_limit == 800 * self.MB
+
+        memory_max.write_text("max\n")
+        total = browser_guard.psutil.virtual_memory().total
+        assert ChromiumMemoryWatchdog("http://127.0.0.1:9222", lambda: None).hard_limit == int(total * 0.8)
+
+    def test_hard_limit_restarts_once_per_cooldown(self):
+        restarts = []
+        watchdog, _ = self._watchdog(2500 * self.MB, [], restarts)
+
+        async def scenario():
+            await watchdog.check()
+            await watchdog.check()
+
+        asyncio.run(scenario())
+        assert restarts == [True]
+        assert watchdog.stats["restarts"] == 1
+
+    def test_sample_skips_other_browser_contexts(self):
+        cdp = FakeCDPConnection({
+            "Target.getTargets": lambda session, params: {"targetInfos": [
+                {"targetId": "tab", "type": "page", "url": "https://tab/", "browserContextId": "default"},
+                {"targetId": "render", "type": "page", "url": "about:blank", "browserContextId": "pool"},
+                {"targetId": "worker", "type": "service_worker", "browserContextId": "default"},
+            ]},
+            "Target.getBrowserContexts": lambda session, params: {"browserContextIds": ["pool"]},
+            "Performance.getMetrics": lambda session, params: {
+                "metrics": [{"name": "JSHeapUsedSize", "value": 50 * self.MB}]
+            },
+            "Runtime.evaluate": lambda session, params: {"result": {"value": "hidden"}},
+        })
+        watchdog = ChromiumMemoryWatchdog(
+            "http://127.0.0.1:9222", lambda: None, soft_limit=1, hard_limit=2000 * self.MB
+        )
+        watchdog.cdp = cdp
+
+        sample = asyncio.run(watchdog.sample())
+        assert [tab["target_id"] for tab in sample["tabs"]] == ["tab"]
+        assert [session.target_id for session in cdp.sessions] == ["tab"]
+
+
+class FakeTabConnection:
+    """Browser-level connection whose tabs report a fixed visibility."""
+
+    closed = False
+
+    def __init__(self, visible):
+        self.visible = visible
+        self.log = []
+
+    async def send(self, method, params=None, timeout=5.0):
+        self.log.append((method, params))
+        if method == "Target.getBrowserContexts":
+            return {"browserContextIds": ["pool"]}
+        if method == "Target.createTarget":
+            return {"targetId": "reopened"}
+        return {}
+
+    async def attach(self, target_id):
+        connection = self
+
+        class Session:
+            async def send(self, method, params=None, timeout=5.0):
+                connection.log.append((target_id, method, params))
+                state = "visible" if target_id in connection.visible else "hidden"
+                return {"result": {"value": state}}
+
+        return Session()
+
+
+class TestTabBudgetManager:
+    """Over-budget tabs are parked least recently used first."""
+
+    def _manager(self, policy, visible):
+        manager = TabBudgetManager("http://127.0.0.1:9222", budget=2, policy=policy)
+        manager.cdp = FakeTabConnection(visible)
+        for index, (target_id, context) in enumerate(
+            [("old", None), ("pooled", "pool"), ("middle", None), ("active", None), ("new", None)]
+        ):
+            manager._on_target_created(
+                {"targetInfo": {"targetId": target_id, "type": "page", "url": f"https://{target_id}/",
+                                "browserContextId": context}}
+            )
+            manager._tabs[target_id]["last_used"] = index
+        return manager
+
+    def test_close_policy_records_urls(self):
+        async def scenario():
+            manager = self._manager("close", visible={"active"})
+            await manager.check()
+            closed = [entry[1]["targetId"] for entry in manager.cdp.log
+                      if entry[0] == "Target.closeTarget"]
+            # Pool tabs do not count; the visible tab counts but is kept
+            assert closed == ["old", "middle"]
+            assert [entry["url"] for entry in manager.parked.values()] == [
+                "https://old/", "https://middle/"
+            ]
+            assert await manager.reopen() == "reopened"
+            assert ("Target.createTarget", {"url": "https://middle/"}) in manager.cdp.log
+            assert list(manager.parked) == ["old"]
+
+        asyncio.run(scenario())
+
+    def test_freeze_policy_thaws_visible_tabs(self):
+        async def scenario():
+            manager = self._manager("freeze", visible={"active"})
+            await manager.check()
+            assert manager._frozen == {"old", "middle"}
+
+            # Thawing "old" puts the budget over again, so the next LRU hidden tab is frozen
+            manager.cdp.visible = {"active", "old"}
+            await manager.check()
+            assert manager._frozen == {"middle", "new"}
+            assert ("old", "Page.setWebLifecycleState", {"state": "active"}) in manager.cdp.log
+            assert list(manager.parked) == ["middle", "new"]
+
+        asyncio.run(scenario())
+
+    def test_restored_placeholders_are_exempt(self):
+        async def scenario():
+            manager = self._manager("close", visible={"active"})
+            for index in range(3):
+                manager._on_target_created({"targetInfo": {
+                    "targetId": f"placeholder-{index}", "type": "page",
+                    "url": placeholder_url({"url": f"https://restored-{index}/"}),
+                }})
+                manager._tabs[f"placeholder-{index}"]["last_used"] = -1
+            await manager.check()
+            closed = [entry[1]["targetId"] for entry in manager.cdp.log
+                      if entry[0] == "Target.closeTarget"]
+            assert closed == ["old", "middle"]
+
+        asyncio.run(scenario())
+
+    def test_defaults_freeze_instead_of_closing(self, monkeypatch):
+        monkeypatch.delenv("BROWSER_TAB_POLICY", raising=False)
+        monkeypatch.setattr(browser_guard, "TAB_BUDGET", 5)
+        assert TabBudgetManager.from_env("http://127.0.0.1:9222").policy == "freeze"
+
+
+class TestWaitForDisplay:
+    def test_socket_path(self):
+        assert display_socket_path(":99") == "/tmp/.X11-unix/X99"
+        assert display_socket_path("unix:1.0") == "/tmp/.X11-unix/X1"
+        assert display_socket_path("remote:0") is None
+
+    def test_waits_for_listening_socket(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(browser_guard, "X11_SOCKET_DIR", str(tmp_path / ".X11-unix"))
+        path = str(tmp_path / ".X11-unix" / "X42")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        def start_server():
+            time.sleep(0.3)
+            os.mkdir(str(tmp_path / ".X11-unix"))
+            server.bind(path)
+            server.listen(1)
+
+        threading.Thread(target=start_server).start()
+        try:
+            started = time.monotonic()
+            assert wait_for_display(":42", timeout=5)
+            assert time.monotonic() - started < 1
+            assert asyncio.run(wait_for_display_async(":42", timeout=1))
+        finally:
+            server.close()
+
+    def test_stale_socket_is_not_ready(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(browser_guard, "X11_SOCKET_DIR", str(tmp_path))
+        # A socket file left behind by an X server that has exited
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(str(tmp_path / "X7"))
+        stale.close()
+        assert not wait_for_display(":7", timeout=0.3)
+        assert not asyncio.run(wait_for_display_async(":7", timeout=0.3))
+
+
+class TestControlServer:
+    def test_metrics_listen_on_loopback_by_default(self, monkeypatch):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        monkeypatch.setattr(browser_guard, "METRICS_PORT", port)
+
+        async def scenario():
+            server = await browser_guard._start_metrics_server(lambda: 1, lambda: None)
+            try:
+                return server._server.sockets[0].getsockname()[0]
+            finally:
+                await server.stop()
+
+        assert browser_guard.METRICS_HOST == "127.0.0.1"
+        assert asyncio.run(scenario()) == "127.0.0.1"
+
+    def test_control_routes_listen_on_loopback_only(self, monkeypatch):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        monkeypatch.setattr(browser_guard, "CONTROL_PORT", port)
+
+        async def handler(body):
+            return 200, "text/plain", b"ok"
+
+        async def scenario():
+            server = await browser_guard._start_control_server({("POST", "/trace"): handler})
+            try:
+                assert server.host == "127.0.0.1"
+                assert server._server.sockets[0].getsockname()[0] == "127.0.0.1"
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"POST /trace HTTP/1.1\r\nContent-Length: 0\r\n\r\n")
+                response = await reader.read()
+                writer.close()
+                assert response.startswith(b"HTTP/1.1 200") and response.endswith(b"ok")
+            finally:
+                await server.stop()
+            assert await browser_guard._start_control_server({}) is None
+
+        asyncio.run(scenario())
+
+
+class TestTraceRoute:
+    def test_concurrent_requests_get_409(self, monkeypatch):
+        class SlowTracer:
+            busy = False
+
+            @classmethod
+            def from_env(cls, cdp):
+                return cls()
+
+            async def capture(self, target_id, duration, reload=False, categories=None):
+                await asyncio.sleep(0.05)
+                return {"target_id": target_id}
+
+        monkeypatch.setattr(browser_guard, "TraceCapture", SlowTracer)
+
+        async def scenario():
+            guard = BrowserCDPGuard()
+
+            async def ensure_cdp():
+                await asyncio.sleep(0.01)
+                return object()
+
+            async def tabs():
+                return [{"id": "page-1"}]
+
+            guard._ensure_cdp = ensure_cdp
+            guard.get_cdp_tabs = tabs
+            first, second = await asyncio.gather(
+                guard._trace_route(b"{}"), guard._trace_route(b"{}")
+            )
+            assert sorted([first[0], second[0]]) == [200, 409]
+            # The reservation is released afterwards
+            assert (await guard._trace_route(b"{}"))[0] == 200
+            status, _, payload = await guard._trace_route(b'{"categories": "toplevel"}')
+            assert status == 400 and b"categories" in payload
+
+        asyncio.run(scenario())
+
+
+class TestRenderPoolIsolation:
+    def test_concurrent_callers_share_one_pool(self, monkeypatch):
+        created = []
+
+        class SlowPool:
+            def __init__(self, cdp):
+                self.cdp = cdp
+                self.started = False
+                created.append(self)
+
+            @classmethod
+            def from_env(cls, cdp):
+                return cls(cdp)
+
+            async def start(self):
+                await asyncio.sleep(0.02)
+                self.started = True
+
+        monkeypatch.setattr(browser_guard, "RenderPool", SlowPool)
+
+        async def scenario():
+            guard = BrowserCDPGuard()
+            cdp = object()
+
+            async def ensure_cdp():
+                return cdp
+
+            guard._ensure_cdp = ensure_cdp
+            return await asyncio.gather(*(guard.get_render_pool() for _ in range(3)))
+
+        pools = asyncio.run(scenario())
+        assert len(created) == 1
+        assert all(pool is created[0] and pool.started for pool in pools)
+
+    def test_pool_pages_are_not_tracked_as_tabs(self, monkeypatch):
+        monkeypatch.setenv("BROWSER_RENDER_POOL_SIZE", "2")
+        guard = BrowserCDPGuard()
+        cdp = FakeCDPConnection()
+        created = []
+
+        def create_target(session, params):
+            target_id = f"render-{len(created) + 1}"
+            created.append(target_id)
+            # The browser announces the target before createTarget returns
+            guard._on_target_created({"targetInfo": {
+                "targetId": target_id, "type": "page", "browserContextId": params["browserContextId"],
+            }})
+            return {"targetId": target_id}
+
+        cdp.handlers.update({
+            "Target.createBrowserContext": lambda session, params: {"browserContextId": "render-ctx"},
+            "Target.createTarget": create_target,
+        })
+
+        async def scenario():
+            async def ensure_cdp():
+                return cdp
+
+            guard._ensure_cdp = ensure_cdp
+            await guard.get_render_pool()
+
+        asyncio.run(scenario())
+        assert created == ["render-1", "render-2"]
+        assert guard._page_targets == {}
+
+    def test_tab_list_excludes_other_browser_contexts(self):
+        def devtools(request):
+            return httpx.Response(200, json=[
+                {"id": "tab-1", "type": "page"},
+                {"id": "render-1", "type": "page"},
+                {"id": "worker-1", "type": "service_worker"},
+            ])
+
+        guard = BrowserCDPGuard()
+        guard.cdp = FakeCDPConnection({
+            "Target.getBrowserContexts": lambda session, params: {"browserContextIds": ["render-ctx"]},
+            "Target.getTargets": lambda session, params: {"targetInfos": [
+                {"targetId": "tab-1", "type": "page", "browserContextId": "default-ctx"},
+                {"targetId": "render-1", "type": "page", "browserContextId": "render-ctx"},
+            ]},
+        })
+
+        async def scenario():
+            guard._http = httpx.AsyncClient(transport=httpx.MockTransport(devtools))
+            try:
+                return await guard.get_cdp_tabs()
+            finally:
+                await guard._http.aclose()
+
+        assert [tab["id"] for tab in asyncio.run(scenario())] == ["tab-1"]
+
+
+class TestCDPConnection:
+    """The guard keeps a single browser-level connection and its background tasks."""
+
+    def test_concurrent_callers_share_one_connection(self, monkeypatch):
+        connections = []
+
+        async def connect(url):
+            await asyncio.sleep(0.02)
+            connections.append(FakeCDPConnection())
+            return connections[-1]
+
+        monkeypatch.setattr(browser_guard.CDPConnection, "connect", staticmethod(connect))
+
+        def devtools(request):
+            return httpx.Response(200, json={"webSocketDebuggerUrl": "ws://127.0.0.1:9222/browser"})
+
+        async def scenario():
+            guard = BrowserCDPGuard()
+            guard._http = httpx.AsyncClient(transport=httpx.MockTransport(devtools))
+            try:
+                return await asyncio.gather(*(guard._ensure_cdp() for _ in range(3)))
+            finally:
+                await guard._http.aclose()
+
+        results = asyncio.run(scenario())
+        assert len(connections) == 1
+        assert all(cdp is connections[0] for cdp in results)
+        assert connections[0].calls == [(None, "Target.setDiscoverTargets")]
+
+    def test_event_tasks_are_kept_until_done(self):
+        async def scenario():
+            guard = BrowserCDPGuard()
+            opened = asyncio.Event()
+
+            async def open_new_tab():
+                await opened.wait()
+
+            guard.open_new_tab = open_new_tab
+            guard._page_targets["tab"] = {"targetId": "tab", "type": "page"}
+            guard._on_target_destroyed({"targetId": "tab"})
+            assert len(guard._tasks) == 1
+            opened.set()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert guard._tasks == set()
+
+            guard._page_targets["tab"] = {"targetId": "tab", "type": "page"}
+            opened.clear()
+            guard._on_target_destroyed({"targetId": "tab"})
+            (task,) = guard._tasks
+            await guard.stop_async()
+            assert task.cancelled()
+            assert guard._tasks == set()
+
+        asyncio.run(scenario())
+
+
+class TestFrameRoute:
+    """GET /frame answers 304 until the screen changes."""
+
+    class Capture:
+        running = True
+
+        def __init__(self):
+            self.version = 0
+            self.frame = None
+            self.stats = {}
+            self.target_id = "tab"
+
+        def latest_frame(self):
+            return self.frame
+
+        def changed_since(self, version):
+            return self.version > version
+
+        async def wait_for_change(self, version, timeout=None):
+            await asyncio.sleep(0.01)
+            self.version += 1
+            self.frame = {"data": b"jpeg-%d" % self.version, "version": self.version}
+            return True
+
+    def test_frame_versions(self):
+        async def scenario():
+            guard = BrowserCDPGuard()
+            assert (await guard._frame_route(b"", {}))[0] == 404
+            guard.screencast = capture = self.Capture()
+            assert (await guard._frame_route(b"", {}))[0] == 404
+            assert (await guard._frame_route(b"", {"since": "0"}))[0] == 304
+
+            capture.version = 1
+            capture.frame = {"data": b"jpeg-1", "version": 1}
+            first = await guard._frame_route(b"", {})
+            unchanged = await guard._frame_route(b"", {"since": "1"})
+            waited = await guard._frame_route(b"", {"since": "1", "wait": "5"})
+            invalid = await guard._frame_route(b"", {"since": "latest"})
+            return first, unchanged, waited, invalid
+
+        first, unchanged, waited, invalid = asyncio.run(scenario())
+        assert first == (200, "image/jpeg", b"jpeg-1", {"X-Frame-Version": "1"})
+        assert unchanged == (304, "image/jpeg", b"", {"X-Frame-Version": "1"})
+        assert waited == (200, "image/jpeg", b"jpeg-2", {"X-Frame-Version": "2"})
+        assert invalid[0] == 400
+
+    def test_screencast_route_starts_and_stops(self):
+        async def scenario():
+            guard = BrowserCDPGuard()
+            calls = []
+
+            async def start(target_id=None):
+                calls.append(("start", target_id))
+                guard.screencast = self.Capture()
+
+            async def stop():
+                calls.append(("stop", None))
+                guard.screencast.running = False
+
+            guard.start_screencast = start
+            guard.stop_screencast = stop
+            started = await guard._screencast_route(b'{"target_id": "tab"}')
+            stopped = await guard._screencast_route(b'{"enabled": false}')
+            return calls, started, stopped
+
+        calls, started, stopped = asyncio.run(scenario())
+        assert calls == [("start", "tab"), ("stop", None)]
+        assert started[0] == 200 and b'"running": true' in started[2]
+        assert stopped[0] == 200 and b'"running": false' in stopped[2]
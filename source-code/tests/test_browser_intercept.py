@@ -0,0 +1,118 @@
+"""
+Test cases for browser_intercept.
+These tests cover the disk response cache and the block rules.
+"""
+
+import json
+import os
+import time
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("playwright")
+
+from browser_intercept import DiskResponseCache, RequestInterceptor
+
+
+FRESH = {"cache-control": "max-age=3600"}
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="script"):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class TestDiskResponseCache:
+    def test_roundtrip_strips_encoding_headers(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path))
+        assert cache.put(
+            "https://cdn.example.com/app.js",
+            200,
+            {"Content-Type": "text/javascript", "Content-Encoding": "gzip", **FRESH},
+            b"console.log(1)",
+        )
+        entry = cache.get("https://cdn.example.com/app.js")
+        assert entry["body"] == b"console.log(1)"
+        assert entry["headers"] == {"content-type": "text/javascript", **FRESH}
+        assert cache.get("https://cdn.example.com/other.js") is None
+
+    def test_respects_cache_control(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path))
+        assert not cache.put("https://a/1", 200, {"cache-control": "no-store"}, b"x")
+        assert not cache.put("https://a/2", 200, {"cache-control": "max-age=0"}, b"x")
+        assert cache.put("https://a/3", 200, {"cache-control": "max-age=1"}, b"x")
+        entry_path = os.path.join(str(tmp_path), cache.key_for("https://a/3") + ".json")
+        # Expire the entry by rewinding its expiry
+        with open(entry_path) as f:
+            meta = f.read().replace('"expires": ', '"expires": -')
+        with open(entry_path, "w") as f:
+            f.write(meta)
+        assert cache.get("https://a/3") is None
+        assert cache.total_bytes == 0
+
+    def test_uncacheable_responses(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path))
+        assert not cache.put("https://a/1", 200, {"cache-control": "no-cache, max-age=600"}, b"x")
+        assert not cache.put("https://a/2", 200, {"cache-control": "private, max-age=600"}, b"x")
+        assert not cache.put("https://a/3", 200, {"vary": "Origin", **FRESH}, b"x")
+        # No freshness information at all
+        assert not cache.put("https://a/4", 200, {"content-type": "text/css"}, b"x")
+        # s-maxage only applies to shared caches
+        assert not cache.put("https://a/5", 200, {"cache-control": "s-maxage=600"}, b"x")
+        assert cache.total_bytes == 0
+
+    def test_expires_header(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path))
+        now = time.time()
+        assert cache.put(
+            "https://a/1", 200, {"date": formatdate(now, usegmt=True), "expires": formatdate(now + 600, usegmt=True)}, b"x"
+        )
+        assert not cache.put("https://a/2", 200, {"expires": formatdate(now - 60, usegmt=True)}, b"x")
+        assert not cache.put("https://a/3", 200, {"expires": "0"}, b"x")
+        # max-age takes precedence over Expires
+        assert cache.put("https://a/4", 200, {"expires": "0", **FRESH}, b"x")
+        assert sorted(cache.get(url) is not None for url in ("https://a/1", "https://a/4")) == [True, True]
+
+    def test_heuristic_ttl_needs_last_modified(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path), default_ttl=3600)
+        now = time.time()
+        assert cache.put("https://a/1", 200, {"last-modified": formatdate(now - 1000, usegmt=True)}, b"x")
+        with open(os.path.join(str(tmp_path), cache.key_for("https://a/1") + ".json")) as f:
+            expires = json.load(f)["expires"]
+        # 10% of the time since the last modification
+        assert abs(expires - (now + 100)) < 5
+        # Capped at default_ttl
+        assert cache.put("https://a/2", 200, {"last-modified": formatdate(now - 10 ** 6, usegmt=True)}, b"x")
+        with open(os.path.join(str(tmp_path), cache.key_for("https://a/2") + ".json")) as f:
+            assert abs(json.load(f)["expires"] - (now + 3600)) < 5
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskResponseCache(str(tmp_path), max_bytes=25)
+        cache.put("https://a/1", 200, FRESH, b"1" * 10)
+        cache.put("https://a/2", 200, FRESH, b"2" * 10)
+        assert cache.get("https://a/1")
+        cache.put("https://a/3", 200, FRESH, b"3" * 10)
+        assert cache.get("https://a/2") is None
+        assert cache.get("https://a/1") and cache.get("https://a/3")
+        assert cache.total_bytes == 20
+
+    def test_index_survives_restart(self, tmp_path):
+        DiskResponseCache(str(tmp_path)).put("https://a/1", 200, FRESH, b"body")
+        time.sleep(0.01)
+        cache = DiskResponseCache(str(tmp_path))
+        assert cache.total_bytes == 4
+        assert cache.get("https://a/1")["body"] == b"body"
+
+
+class TestRequestInterceptor:
+    def test_block_rules(self):
+        interceptor = RequestInterceptor(
+            block_types=["media"], block_domains=["google-analytics.com"]
+        )
+        assert interceptor._is_blocked(FakeRequest("https://example.com/v.mp4", "media"))
+        assert interceptor._is_blocked(FakeRequest("https://www.google-analytics.com/a.js"))
+        assert not interceptor._is_blocked(FakeRequest("https://notgoogle-analytics.com/a.js"))
+        assert not interceptor._is_blocked(FakeRequest("https://example.com/app.js"))
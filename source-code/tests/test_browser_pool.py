@@ -0,0 +1,110 @@
+"""
+Test cases for browser_pool.
+These tests drive the lease/release bookkeeping against an in-memory browser.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("playwright")
+
+from browser_pool import BrowserContextPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+        self.scripts = []
+
+    async def add_init_script(self, script=None):
+        self.scripts.append(script)
+
+    async def new_page(self):
+        return object()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **options):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestBrowserContextPool:
+    def test_prewarm_and_lease(self):
+        async def scenario():
+            browser = FakeBrowser()
+            pool = BrowserContextPool(browser, min_size=2, max_size=4, init_script="x")
+            await pool.start()
+            assert pool.stats()["idle"] == 2
+
+            lease = await pool.acquire()
+            assert lease.context in browser.contexts
+            assert lease.context.scripts == ["x"]
+            await settle()
+            # The leased context is replaced in the background
+            assert pool.stats() == {"idle": 2, "leased": 1, "min_size": 2, "max_size": 4}
+            await pool.close()
+
+        asyncio.run(scenario())
+
+    def test_release_resets_context(self):
+        async def scenario():
+            pool = BrowserContextPool(FakeBrowser(), min_size=1, max_size=2)
+            await pool.start()
+            async with pool.lease() as lease:
+                first = lease.context
+            assert first.closed
+            async with pool.lease() as lease:
+                assert lease.context is not first
+            await pool.close()
+
+        asyncio.run(scenario())
+
+    def test_max_concurrency(self):
+        async def scenario():
+            pool = BrowserContextPool(FakeBrowser(), min_size=0, max_size=1)
+            await pool.start()
+            lease = await pool.acquire()
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.acquire(timeout=0.05)
+            await pool.release(lease)
+            second = await pool.acquire(timeout=0.05)
+            await pool.release(second)
+            await pool.close()
+
+        asyncio.run(scenario())
+
+    def test_idle_shrink(self):
+        async def scenario():
+            browser = FakeBrowser()
+            pool = BrowserContextPool(browser, min_size=1, max_size=3, idle_timeout=0)
+            await pool.start()
+            # A burst of two concurrent leases raises the warm target to two
+            leases = [await pool.acquire(), await pool.acquire()]
+            for lease in leases:
+                await pool.release(lease)
+            await settle()
+            assert pool.stats()["idle"] == 2
+            assert all(lease.context.closed for lease in leases)
+
+            await asyncio.sleep(1.1)
+            await settle()
+            assert pool.stats()["idle"] == 1
+            assert sum(not context.closed for context in browser.contexts) == 1
+            await pool.close()
+
+        asyncio.run(scenario())
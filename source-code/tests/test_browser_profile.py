@@ -0,0 +1,93 @@
+"""
+Test cases for browser_profile.
+These tests run the profile maintenance on a synthetic user data dir.
+"""
+
+import os
+import socket
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("psutil")
+
+from browser_profile import ProfileMaintainer, parse_caps
+
+
+def write(path, size, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+        os.utime(os.path.dirname(path), (mtime, mtime))
+
+
+class TestProfileMaintainer:
+    def test_caps_crash_dumps_and_stale_locks(self, tmp_path):
+        profile = tmp_path / "profile"
+        write(str(profile / "Default/Cache/Cache_Data/data_1"), 3 << 20)
+        write(str(profile / "Default/IndexedDB/https_a.example_0.indexeddb.leveldb/000001.log"), 2 << 20)
+        write(str(profile / "Default/IndexedDB/https_a.example_0.indexeddb.blob/1/00/1"), 2 << 20)
+        write(str(profile / "Default/File System/000/t/00/00000000"), 1 << 20)
+        write(str(profile / "Default/QuotaManager"), 1024)
+        write(str(profile / "Crashpad/completed/dump.dmp"), 1024)
+        write(str(profile / "Default/Preferences"), 10)
+        # The lock belongs to a process that no longer exists
+        os.symlink(f"{socket.gethostname()}-999999999", str(profile / "SingletonLock"))
+
+        maintainer = ProfileMaintainer(
+            str(profile), caps_mb={"Default/Cache": 2, "Default/IndexedDB": 3}
+        )
+        report = maintainer.run()
+
+        assert not (profile / "Default/Cache").exists()
+        # Site storage over its cap is removed as a whole, together with the quota database
+        assert not (profile / "Default/IndexedDB").exists()
+        assert not (profile / "Default/QuotaManager").exists()
+        assert (profile / "Default/File System/000/t/00/00000000").exists()
+        assert not (profile / "Crashpad").exists()
+        assert not os.path.lexists(str(profile / "SingletonLock"))
+        assert (profile / "Default/Preferences").exists()
+        assert report["freed_bytes"] == (7 << 20) + 2048
+        assert maintainer.disk_cache_size == 2 << 20
+
+    def test_service_worker_storage_is_removed_together(self, tmp_path):
+        profile = tmp_path / "profile"
+        write(str(profile / "Default/Service Worker/Database/CURRENT"), 16)
+        write(str(profile / "Default/Service Worker/ScriptCache/index"), 1 << 20)
+        write(str(profile / "Default/Service Worker/CacheStorage/abc/def/index"), 2 << 20)
+        maintainer = ProfileMaintainer(str(profile), caps_mb={"Default/Service Worker": 2})
+        assert maintainer.run()["removed"] == ["Default/Service Worker"]
+        assert not (profile / "Default/Service Worker").exists()
+        assert (profile / "Default").exists()
+
+    def test_skips_profile_in_use(self, tmp_path):
+        profile = tmp_path / "profile"
+        write(str(profile / "Default/Cache/data"), 3 << 20)
+        os.symlink(f"{socket.gethostname()}-{os.getpid()}", str(profile / "SingletonLock"))
+        report = ProfileMaintainer(str(profile), caps_mb={"Default/Cache": 1}).run()
+        assert report.get("skipped")
+        assert (profile / "Default/Cache/data").exists()
+
+    def test_restores_golden_profile(self, tmp_path):
+        golden = tmp_path / "golden"
+        write(str(golden / "Default/Preferences"), 10)
+        profile = tmp_path / "profile"
+        write(str(profile / "Default/History"), 10)
+
+        assert not ProfileMaintainer(str(profile), golden_dir=str(golden)).run()["restored"]
+        report = ProfileMaintainer(str(profile), golden_dir=str(golden), reset=True).run()
+        assert report["restored"]
+        assert (profile / "Default/Preferences").exists()
+        assert not (profile / "Default/History").exists()
+        # Writes to the copy never reach the golden profile
+        write(str(profile / "Default/Preferences"), 20)
+        assert (golden / "Default/Preferences").stat().st_size == 10
+        assert sorted(os.listdir(str(tmp_path))) == ["golden", "profile"]
+
+    def test_parse_caps(self):
+        assert parse_caps("Default/Cache=64, Default/IndexedDB=512,") == {
+            "Default/Cache": 64,
+            "Default/IndexedDB": 512,
+        }
@@ -0,0 +1,199 @@
+"""
+Test cases for browser_render.
+These tests drive the render pool against a fake CDP connection.
+"""
+
+import asyncio
+import base64
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("websockets")
+
+import browser_render
+from browser_render import RenderPool, benchmark
+from cdp_client import CDPError
+from conftest import FakeCDPConnection
+
+
+def render_connection():
+    """A fake browser that creates targets in one context and renders pages per session."""
+    connection = FakeCDPConnection()
+    connection.targets = []
+    connection.broken = set()
+    connection.active = 0
+    connection.peak = 0
+    # Documents present in the window of each captured page
+    connection.windows = []
+    # When set, screenshots wait for it
+    connection.gate = None
+    # Number of upcoming Target.createTarget calls that fail
+    connection.create_failures = 0
+
+    def create_target(session, params):
+        assert params["browserContextId"] == "ctx"
+        if connection.create_failures:
+            connection.create_failures -= 1
+            raise CDPError("Target.createTarget", {"code": -32000, "message": "Failed to open a new tab"})
+        connection.targets.append(f"target-{len(connection.targets) + 1}")
+        return {"targetId": connection.targets[-1]}
+
+    def navigate(session, params):
+        # A navigation starts a new window
+        session.window = []
+        session.emit_soon("Page.loadEventFired")
+        return {"frameId": session.target_id}
+
+    def set_document_content(session, params):
+        session.window = getattr(session, "window", []) + [params["html"]]
+
+    async def capture_screenshot(session, params):
+        connection.windows.append(list(getattr(session, "window", [])))
+        if session.target_id in connection.broken:
+            raise CDPError("Page.captureScreenshot", {"code": -32000, "message": "Target crashed"})
+        connection.active += 1
+        connection.peak = max(connection.peak, connection.active)
+        await asyncio.sleep(0.01)
+        if connection.gate:
+            await connection.gate.wait()
+        connection.active -= 1
+        return {"data": base64.b64encode(f"{params['format']}:{session.target_id}".encode()).decode()}
+
+    connection.handlers.update({
+        "Target.createBrowserContext": lambda session, params: {"browserContextId": "ctx"},
+        "Target.createTarget": create_target,
+        "Page.navigate": navigate,
+        "Page.setDocumentContent": set_document_content,
+        "Page.captureScreenshot": capture_screenshot,
+        "Page.printToPDF": lambda session, params: {"data": base64.b64encode(b"%PDF").decode()},
+    })
+    return connection
+
+
+class TestRenderPool:
+    def test_parallel_jobs_reuse_pool_pages(self):
+        async def scenario():
+            connection = render_connection()
+            pool = RenderPool(connection, size=3)
+            await pool.start()
+            results = await asyncio.gather(*(pool.render(html="<p>hi</p>") for _ in range(9)))
+            assert all(data.startswith(b"png:target-") for data in results)
+            assert connection.targets == ["target-1", "target-2", "target-3"]
+            assert connection.peak == 3
+            assert sum(pool.report()["jobs"].values()) == 9
+
+            assert await pool.render(url="https://example.com/", output="pdf") == b"%PDF"
+            with pytest.raises(ValueError):
+                await pool.render(html="<p>", url="https://example.com/")
+            with pytest.raises(ValueError):
+                await pool.render(html="<p>", output="gif")
+
+            await pool.close()
+            assert (None, "Target.disposeBrowserContext") in connection.calls
+
+        asyncio.run(scenario())
+
+    def test_html_jobs_do_not_share_globals(self):
+        async def scenario():
+            connection = render_connection()
+            pool = RenderPool(connection, size=1)
+            await pool.start()
+            await pool.render(html="<script>window.secret = 1</script>")
+            await pool.render(html="<p>second</p>")
+            await pool.render(url="https://example.com/")
+            await pool.render(html="<p>third</p>")
+            # Only the job's own document is visible when it is captured
+            assert connection.windows == [
+                ["<script>window.secret = 1</script>"], ["<p>second</p>"], [], ["<p>third</p>"]
+            ]
+
+        asyncio.run(scenario())
+
+    def test_failed_page_is_replaced(self):
+        async def scenario():
+            connection = render_connection()
+            pool = RenderPool(connection, size=1)
+            await pool.start()
+            connection.broken.add("target-1")
+            with pytest.raises(CDPError):
+                await pool.render(html="<p>hi</p>")
+            assert await pool.render(html="<p>hi</p>", output="jpeg") == b"jpeg:target-2"
+            assert (None, "Target.closeTarget") in connection.calls
+
+        asyncio.run(scenario())
+
+    def test_close_wakes_waiters_and_drops_returned_pages(self):
+        async def scenario():
+            connection = render_connection()
+            connection.gate = asyncio.Event()
+            pool = RenderPool(connection, size=1)
+            await pool.start()
+            running = asyncio.create_task(pool.render(html="<p>one</p>"))
+            waiting = asyncio.create_task(pool.render(html="<p>two</p>"))
+            await asyncio.sleep(0.05)
+
+            await pool.close()
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(waiting, 1)
+            connection.gate.set()
+            assert await running == b"png:target-1"
+
+            # The page returned after close() does not leak into the restarted pool
+            await pool.start()
+            assert list(pool.report()["jobs"]) == ["target-2"]
+            assert await pool.render(html="<p>three</p>") == b"png:target-2"
+
+        asyncio.run(scenario())
+
+    def test_waiting_for_a_page_times_out(self):
+        async def scenario():
+            connection = render_connection()
+            connection.gate = asyncio.Event()
+            pool = RenderPool(connection, size=1)
+            await pool.start()
+            running = asyncio.create_task(pool.render(html="<p>one</p>"))
+            await asyncio.sleep(0)
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.render(html="<p>two</p>", timeout=0.05)
+            connection.gate.set()
+            await running
+            assert pool.report()["idle"] == 1
+
+        asyncio.run(scenario())
+
+    def test_replacement_retries_and_empty_pool_fails_fast(self, monkeypatch):
+        monkeypatch.setattr(browser_render, "REPLACE_RETRY_DELAY", 0.01)
+
+        async def scenario():
+            connection = render_connection()
+            pool = RenderPool(connection, size=1)
+            await pool.start()
+            connection.broken.add("target-1")
+            connection.create_failures = 2
+            with pytest.raises(CDPError):
+                await pool.render(html="<p>hi</p>")
+            while not pool._replace_failures:
+                await asyncio.sleep(0)
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(pool.render(html="<p>hi</p>"), 0.005)
+
+            # The replacement keeps retrying until the browser can open a page again
+            while not pool._targets:
+                await asyncio.sleep(0.01)
+            assert await pool.render(html="<p>hi</p>") == b"png:target-2"
+            assert pool.report()["idle"] == 1
+
+        asyncio.run(scenario())
+
+    def test_benchmark_reports_throughput(self):
+        async def scenario():
+            pool = RenderPool(render_connection(), size=2)
+            await pool.start()
+            return await benchmark(pool, "<p>hi</p>", pages=10)
+
+        result = asyncio.run(scenario())
+        assert result["pages"] == 10 and result["errors"] == 0
+        assert result["pool_size"] == 2
+        assert result["pages_per_second"] > 0
+        assert result["p50_ms"] <= result["p95_ms"]
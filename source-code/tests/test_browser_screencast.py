@@ -0,0 +1,114 @@
+"""
+Test cases for browser_screencast.
+These tests feed synthetic screencast frames and check change detection.
+"""
+
+import asyncio
+import base64
+import io
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("websockets")
+Image = pytest.importorskip("PIL.Image")
+
+from browser_screencast import ScreencastCapture, frame_hash, hamming_distance
+from conftest import FakeCDPConnection
+
+
+def jpeg(draw) -> bytes:
+    image = Image.new("RGB", (320, 240), "white")
+    draw(image)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def blank(image):
+    pass
+
+
+def right_block(image):
+    image.paste((0, 0, 0), (160, 0, 320, 240))
+
+
+class TestFrameHash:
+    def test_similar_frames_match(self):
+        first = frame_hash(jpeg(blank))
+        # Re-encoding the same screen at another quality keeps the hash
+        image = Image.open(io.BytesIO(jpeg(blank)))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=40)
+        assert hamming_distance(first, frame_hash(buffer.getvalue())) <= 2
+
+    def test_different_frames_differ(self):
+        assert hamming_distance(frame_hash(jpeg(blank)), frame_hash(jpeg(right_block))) > 2
+
+
+class TestScreencastCapture:
+    def test_version_only_changes_with_screen(self, fake_cdp):
+        async def scenario():
+            connection = fake_cdp
+            capture = ScreencastCapture(connection, quality=60, max_width=320)
+            await capture.start("page-1")
+            assert ("Page.startScreencast", {
+                "format": "jpeg", "quality": 60, "everyNthFrame": 1, "maxWidth": 320,
+            }) in connection.session.sent
+
+            async def push(data, frame_id):
+                connection.session.emit(
+                    "Page.screencastFrame", {"data": base64.b64encode(data).decode(), "sessionId": frame_id, "metadata": {}}
+                )
+                await capture._worker
+
+            await push(jpeg(blank), 1)
+            assert capture.version == 1
+            await push(jpeg(blank), 2)
+            assert capture.version == 1
+            assert not capture.changed_since(1)
+
+            waiter = asyncio.create_task(capture.wait_for_change(1, timeout=5))
+            await push(jpeg(right_block), 3)
+            assert await waiter
+            assert capture.changed_since(1)
+            assert capture.latest_frame()["version"] == 2
+
+            await asyncio.sleep(0)
+            acks = [p["sessionId"] for m, p in connection.session.sent if m == "Page.screencastFrameAck"]
+            assert acks == [1, 2, 3]
+            await capture.stop()
+
+        asyncio.run(scenario())
+
+    def test_concurrent_restarts_leave_one_session(self):
+        async def scenario():
+            # Attaching takes a moment, so concurrent starts interleave
+            connection = FakeCDPConnection(attach_delay=0.01)
+            capture = ScreencastCapture(connection)
+            await asyncio.gather(
+                capture.start("page-1"), capture.start("page-2"), capture.start("page-3")
+            )
+            live = [session for session in connection.sessions if not session.detached]
+            assert live == [capture.session]
+            assert capture.target_id == "page-3"
+
+            # A late frame from a replaced session is neither processed nor acked
+            stale = connection.sessions[0]
+            stale.emit(
+                "Page.screencastFrame", {"data": base64.b64encode(jpeg(blank)).decode(), "sessionId": 9, "metadata": {}}
+            )
+            await asyncio.sleep(0)
+            assert capture.stats["frames"] == 0
+            assert not any(method == "Page.screencastFrameAck" for method, _ in stale.sent)
+
+            capture.session.emit(
+                "Page.screencastFrame", {"data": base64.b64encode(jpeg(blank)).decode(), "sessionId": 1, "metadata": {}}
+            )
+            await capture._worker
+            await asyncio.sleep(0)
+            assert ("Page.screencastFrameAck", {"sessionId": 1}) in capture.session.sent
+            await capture.stop()
+            assert all(session.detached for session in connection.sessions)
+
+        asyncio.run(scenario())
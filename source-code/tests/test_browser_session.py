@@ -0,0 +1,145 @@
+"""
+Test cases for browser_session.
+These tests record tabs from fake pages and check the lazy restore.
+"""
+
+import asyncio
+import json
+from urllib.parse import unquote
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("playwright")
+
+from browser_session import SessionRecorder, is_placeholder_url, placeholder_url
+
+
+class FakePage:
+    def __init__(self, url="about:blank", title="", scroll=(0, 0), visible=False):
+        self.url = url
+        self.state = {"x": scroll[0], "y": scroll[1], "title": title, "visible": visible}
+        self.listeners = {}
+        self.calls = []
+
+    def is_closed(self):
+        return False
+
+    async def evaluate(self, script, arg=None):
+        if arg is not None:
+            self.calls.append(("scroll", arg))
+            return None
+        return dict(self.state)
+
+    async def goto(self, url):
+        self.calls.append(("goto", url))
+        self.url = url
+
+    async def bring_to_front(self):
+        self.calls.append(("front",))
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def remove_listener(self, event, callback):
+        self.listeners[event].remove(callback)
+
+    def fire(self, event):
+        for callback in list(self.listeners.get(event, [])):
+            callback(self)
+
+
+class FakeContext:
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+
+class TestSessionRecorder:
+    def test_save_keeps_last_record_when_browser_is_gone(self, tmp_path):
+        async def scenario():
+            recorder = SessionRecorder(str(tmp_path / "session.json"))
+            context = FakeContext([
+                FakePage("chrome://newtab/"),
+                FakePage("https://a/", "A", (0, 300)),
+                FakePage("https://b/", "B", visible=True),
+            ])
+            await recorder.save(context)
+            await recorder.save(None)
+            await recorder.save(FakeContext([FakePage("chrome://newtab/")]))
+            recorder.suspended = True
+            await recorder.save(FakeContext([FakePage("https://c/")]))
+            return recorder
+
+        recorder = asyncio.run(scenario())
+        expected = [
+            {"url": "https://a/", "title": "A", "scroll": [0, 300], "active": False},
+            {"url": "https://b/", "title": "B", "scroll": [0, 0], "active": True},
+        ]
+        assert recorder.tabs == expected
+        with open(tmp_path / "session.json") as f:
+            assert json.load(f)["tabs"] == expected
+        assert SessionRecorder(str(tmp_path / "session.json")).load() == expected
+
+    def test_restore_loads_background_tabs_lazily(self, tmp_path):
+        tabs = [
+            {"url": "https://a/", "title": "A", "scroll": [0, 300], "active": False},
+            {"url": "https://b/", "title": "B", "scroll": [0, 50], "active": True},
+        ]
+
+        async def scenario():
+            recorder = SessionRecorder(str(tmp_path / "session.json"))
+            recorder.suspended = True
+            initial = FakePage("chrome://newtab/")
+            context = FakeContext([initial])
+            assert await recorder.restore(context, tabs) == 2
+            assert not recorder.suspended
+
+            assert initial.calls == [("goto", "https://b/"), ("scroll", [0, 50]), ("front",)]
+            background = context.pages[1]
+            assert background.calls == [("goto", placeholder_url(tabs[0]))]
+
+            # The placeholder still counts as the original tab
+            assert (await recorder.capture(context))[1]["url"] == "https://a/"
+
+            background.fire("load")
+            assert background.calls[-1][0] == "goto"
+            background.url = "https://a/"
+            background.fire("load")
+            await asyncio.sleep(0)
+            assert background.calls[-1] == ("scroll", [0, 300])
+            assert background not in recorder._placeholders
+
+        asyncio.run(scenario())
+
+    def test_new_process_restores_from_disk(self, tmp_path):
+        path = str(tmp_path / "session.json")
+
+        async def scenario():
+            await SessionRecorder(path).save(
+                FakeContext([FakePage("https://a/", "A"), FakePage("https://b/", "B", visible=True)])
+            )
+
+            # A restarted guard process starts with an empty in-memory record
+            recorder = SessionRecorder(path)
+            recorder.suspended = True
+            initial = FakePage("chrome://newtab/")
+            context = FakeContext([initial])
+            await recorder.save(context)
+            assert await recorder.restore(context) == 2
+            assert initial.calls[0] == ("goto", "https://b/")
+
+        asyncio.run(scenario())
+        assert [tab["url"] for tab in SessionRecorder(path).load()] == ["https://a/", "https://b/"]
+
+    def test_placeholder_escapes_url(self):
+        url = placeholder_url({"url": 'https://a/?q="</script>', "title": "<b>"})
+        document = unquote(url.split(",", 1)[1])
+        assert "&lt;b&gt;" in document
+        assert document.count("</script>") == 1
+        assert is_placeholder_url(url)
+        assert not is_placeholder_url("data:text/html;charset=utf-8,%3Cp%3Ehi")
@@ -0,0 +1,151 @@
+"""
+Test cases for browser_snapshot.
+These tests build synthetic DOMSnapshot / AX tree payloads and check pruning and diffs.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("websockets")
+
+from browser_snapshot import PageSnapshotter, diff_snapshots, parse_snapshot
+
+
+def build_dom(nodes, url="https://example.com/"):
+    """nodes: (parent, tag, backend_id, attrs, bounds, styles, clickable)"""
+    strings = []
+
+    def intern(value):
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    layout = {"nodeIndex": [], "bounds": [], "styles": []}
+    clickable = []
+    for index, (parent, tag, backend_id, attrs, bounds, styles, is_clickable) in enumerate(nodes):
+        if bounds is not None:
+            layout["nodeIndex"].append(index)
+            layout["bounds"].append(bounds)
+            layout["styles"].append([intern(value) for value in styles])
+        if is_clickable:
+            clickable.append(index)
+    document = {
+        "documentURL": intern(url),
+        "nodes": {
+            "parentIndex": [node[0] for node in nodes],
+            "nodeName": [intern(node[1]) for node in nodes],
+            "backendNodeId": [node[2] for node in nodes],
+            "attributes": [
+                [intern(item) for pair in node[3].items() for item in pair] for node in nodes
+            ],
+            "isClickable": {"index": clickable},
+        },
+        "layout": layout,
+    }
+    return {"documents": [document], "strings": strings}
+
+
+VISIBLE = ["visible", "1", "auto"]
+POINTER = ["visible", "1", "pointer"]
+NODES = [
+    (-1, "HTML", 1, {}, [0, 0, 800, 600], VISIBLE, False),
+    (0, "BUTTON", 2, {}, [10, 10, 80, 30.4], POINTER, True),
+    # Clickable child of the button is represented by the button
+    (1, "SPAN", 3, {}, [12, 12, 40, 20], POINTER, True),
+    (0, "A", 4, {"href": "/next"}, [10, 700, 50, 20], POINTER, False),
+    (0, "INPUT", 5, {"type": "hidden"}, [0, 0, 0, 0], VISIBLE, False),
+    (0, "INPUT", 6, {"placeholder": "Search"}, [100, 10, 200, 30], ["hidden", "1", "auto"], False),
+    (0, "DIV", 7, {"tabindex": "0", "aria-label": "Card"}, [10, 50, 300, 100], VISIBLE, False),
+    (0, "DIV", 8, {}, [10, 200, 300, 100], POINTER, True),
+    (0, "DIV", 9, {}, [10, 300, 300, 100], VISIBLE, False),
+]
+AX = [
+    {"backendDOMNodeId": 2, "role": {"value": "button"}, "name": {"value": " Save \n draft "}},
+    {"backendDOMNodeId": 4, "role": {"value": "link"}, "name": {"value": "Next"}},
+]
+VIEWPORT = {"x": 0, "y": 0, "width": 800, "height": 600}
+
+
+class TestParseSnapshot:
+    def test_keeps_visible_interactive_elements(self):
+        elements = parse_snapshot(build_dom(NODES), AX, VIEWPORT)
+        assert [element["id"] for element in elements] == [2, 4, 7, 8]
+        button, link, card, clickable = elements
+        assert button == {
+            "id": 2, "tag": "button", "role": "button", "name": "Save draft",
+            "bbox": [10, 10, 80, 30], "in_viewport": True,
+        }
+        assert link["href"] == "/next" and not link["in_viewport"]
+        assert card["name"] == "Card"
+        assert clickable["tag"] == "div"
+
+    def test_masks_password_and_card_values(self):
+        nodes = [
+            (-1, "HTML", 1, {}, [0, 0, 800, 600], VISIBLE, False),
+            (0, "INPUT", 2, {"type": "password", "value": "hunter2"}, [10, 10, 200, 30], VISIBLE, False),
+            (0, "INPUT", 3, {"autocomplete": "billing cc-number"}, [10, 50, 200, 30], VISIBLE, False),
+            (0, "INPUT", 4, {"type": "password"}, [10, 90, 200, 30], VISIBLE, False),
+            (0, "INPUT", 5, {"name": "q"}, [10, 130, 200, 30], VISIBLE, False),
+        ]
+        dom = build_dom(nodes)
+        strings = dom["strings"]
+        values = ["hunter2", "4111111111111111", "", "shoes"]
+        for value in values:
+            if value not in strings:
+                strings.append(value)
+        dom["documents"][0]["nodes"]["inputValue"] = {
+            "index": [1, 2, 3, 4],
+            "value": [strings.index(value) for value in values],
+        }
+        password, card, empty, query = parse_snapshot(dom, [])
+        assert password["value"] == "***" and password["name"] == ""
+        assert card["value"] == "***"
+        assert empty["value"] == ""
+        assert query["value"] == "shoes"
+        assert "hunter2" not in repr(parse_snapshot(dom, []))
+
+
+class TestDiffSnapshots:
+    def test_diff(self):
+        before = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+        after = [{"id": 2, "name": "c"}, {"id": 3, "name": "d"}]
+        assert diff_snapshots(before, after) == {
+            "added": [{"id": 3, "name": "d"}],
+            "removed": [1],
+            "changed": [{"id": 2, "name": "c"}],
+        }
+
+
+class TestPageSnapshotter:
+    def test_incremental(self, fake_cdp):
+        page = {"dom": build_dom(NODES)}
+        fake_cdp.handlers.update({
+            "DOMSnapshot.captureSnapshot": lambda session, params: page["dom"],
+            "Accessibility.getFullAXTree": lambda session, params: {"nodes": AX},
+            "Page.getLayoutMetrics": lambda session, params: {
+                "cssVisualViewport": {"pageX": 0, "pageY": 0, "clientWidth": 800, "clientHeight": 600}
+            },
+        })
+
+        async def scenario():
+            connection = fake_cdp
+            snapshotter = PageSnapshotter(connection)
+            full = await snapshotter.capture("page-1")
+            assert len(full["elements"]) == 4
+            assert full["url"] == "https://example.com/"
+
+            nodes = list(NODES)
+            nodes[7] = (0, "DIV", 8, {}, [10, 200, 300, 100], VISIBLE, False)
+            page["dom"] = build_dom(nodes)
+            diff = await snapshotter.capture("page-1", since=full["version"])
+            assert diff["base_version"] == full["version"]
+            assert diff["removed"] == [8] and diff["added"] == [] and diff["changed"] == []
+
+            # A stale base version falls back to a full snapshot
+            again = await snapshotter.capture("page-1", since=full["version"])
+            assert "elements" in again
+            assert len(connection.sessions) == 1
+
+        asyncio.run(scenario())
@@ -0,0 +1,89 @@
+"""
+Test cases for browser_trace.
+These tests check incremental trace parsing, the summary and the streamed capture.
+"""
+
+import asyncio
+import base64
+import json
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("websockets")
+
+from browser_trace import TraceCapture, TraceEventStream, TraceSummary
+
+EVENTS = [
+    {"ph": "M", "name": "thread_name", "pid": 1, "tid": 7, "args": {"name": "CrRendererMain"}},
+    {"ph": "X", "name": "RunTask", "pid": 1, "tid": 7, "ts": 1_000_000, "dur": 120_000},
+    {"ph": "X", "name": "RunTask", "pid": 1, "tid": 7, "ts": 1_200_000, "dur": 10_000},
+    {"ph": "X", "name": "RunTask", "pid": 1, "tid": 8, "ts": 1_300_000, "dur": 60_000},
+    {"ph": "X", "name": "Layout", "pid": 1, "tid": 7, "ts": 1_010_000, "dur": 4_000},
+    {"ph": "X", "name": "UpdateLayoutTree", "pid": 1, "tid": 7, "ts": 1_015_000, "dur": 1_000},
+    {"ph": "X", "name": "Paint", "pid": 1, "tid": 7, "ts": 1_020_000, "dur": 2_500},
+    {"ph": "I", "name": "ResourceSendRequest", "ts": 1_001_000,
+     "args": {"data": {"requestId": "r1", "url": "https://a/app.js", "requestMethod": "GET"}}},
+    {"ph": "I", "name": "ResourceReceiveResponse", "ts": 1_051_000,
+     "args": {"data": {"requestId": "r1", "statusCode": 200, "mimeType": "text/javascript"}}},
+    {"ph": "I", "name": "ResourceFinish", "ts": 1_101_000,
+     "args": {"data": {"requestId": "r1", "encodedDataLength": 2048}}},
+]
+TRACE = json.dumps({"traceEvents": EVENTS, "metadata": {"note": "[not an event]"}})
+
+
+class TestTraceEventStream:
+    def test_split_chunks(self):
+        stream = TraceEventStream()
+        events = []
+        for start in range(0, len(TRACE), 7):
+            events.extend(stream.feed(TRACE[start:start + 7]))
+        assert events == EVENTS
+
+
+class TestTraceSummary:
+    def test_summary(self):
+        summary = TraceSummary(top_tasks=1)
+        for event in EVENTS:
+            summary.add(event)
+        result = summary.result()
+        assert result["long_tasks"]["count"] == 2
+        assert result["long_tasks"]["total_ms"] == 180.0
+        assert result["long_tasks"]["top"] == [
+            {"start_ms": 0.0, "duration_ms": 120.0, "thread": "CrRendererMain"}
+        ]
+        assert result["layout_ms"] == 5.0
+        assert result["paint_ms"] == 2.5
+        assert result["network"][0]["url"] == "https://a/app.js"
+        assert result["network"][0]["start_ms"] == 1.0
+        assert result["network"][0]["response_ms"] == 51.0
+        assert result["network"][0]["duration_ms"] == 100.0
+        assert result["network"][0]["bytes"] == 2048
+
+
+class TestTraceCapture:
+    def test_streams_to_file(self, tmp_path, fake_cdp):
+        raw = TRACE.encode()
+        chunks = [raw[:100], raw[100:]]
+
+        def read(session, params):
+            data = chunks.pop(0)
+            return {"data": base64.b64encode(data).decode(), "base64Encoded": True, "eof": not chunks}
+
+        fake_cdp.handlers.update({
+            "Tracing.end": lambda session, params: session.emit_soon(
+                "Tracing.tracingComplete", {"stream": "stream-1"}
+            ),
+            "IO.read": read,
+        })
+        tracer = TraceCapture(fake_cdp, str(tmp_path), keep=1)
+
+        result = asyncio.run(tracer.capture("ABCDEF0123", duration=0.1, reload=True))
+        session = fake_cdp.session
+
+        with open(result["path"], "rb") as f:
+            assert f.read() == raw
+        assert result["bytes"] == len(raw)
+        assert result["long_tasks"]["count"] == 2
+        assert session.methods[:3] == ["Tracing.start", "Page.reload", "Tracing.end"]
+        assert session.methods[-1] == "IO.close"
+        assert session.detached
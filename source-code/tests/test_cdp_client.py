@@ -0,0 +1,191 @@
+"""
+Test cases for cdp_client.
+These tests drive CDPConnection through an in-memory websocket: responses are routed by id,
+events by session, and pending commands fail when their session or the connection goes away.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("websockets")
+
+from cdp_client import CDPConnection, CDPError
+
+
+class FakeWebSocket:
+    """Records sent messages; tests feed incoming messages with reply() and push()."""
+
+    def __init__(self):
+        self.sent = []
+        self.incoming = asyncio.Queue()
+        self.sent_event = asyncio.Event()
+
+    async def send(self, raw):
+        self.sent.append(json.loads(raw))
+        self.sent_event.set()
+
+    async def close(self):
+        self.incoming.put_nowait(None)
+
+    def push(self, message):
+        self.incoming.put_nowait(json.dumps(message))
+
+    def reply(self, command, result=None, error=None):
+        message = {"id": command["id"]}
+        if error is not None:
+            message["error"] = error
+        else:
+            message["result"] = result or {}
+        if "sessionId" in command:
+            message["sessionId"] = command["sessionId"]
+        self.push(message)
+
+    async def wait_sent(self, count):
+        while len(self.sent) < count:
+            self.sent_event.clear()
+            await self.sent_event.wait()
+        return self.sent[:count]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raw = await self.incoming.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+
+async def attached(cdp, ws, target_id, session_id):
+    """Attach to target_id, answering attachToTarget with session_id."""
+    attach = asyncio.create_task(cdp.attach(target_id))
+    command = (await ws.wait_sent(len(ws.sent) + 1))[-1]
+    assert command["method"] == "Target.attachToTarget"
+    ws.reply(command, {"sessionId": session_id})
+    return await attach
+
+
+class TestResponses:
+    def test_out_of_order_replies_reach_their_callers(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            first = asyncio.create_task(cdp.send("Runtime.evaluate", {"expression": "1"}))
+            second = asyncio.create_task(cdp.send("Runtime.evaluate", {"expression": "2"}))
+            one, two = await ws.wait_sent(2)
+            assert one["id"] != two["id"]
+            ws.reply(two, {"value": 2})
+            ws.reply(one, {"value": 1})
+            results = await asyncio.gather(first, second)
+            await cdp.close()
+            return results
+
+        assert asyncio.run(scenario()) == [{"value": 1}, {"value": 2}]
+
+    def test_error_reply_raises(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            command = asyncio.create_task(cdp.send("Page.navigate"))
+            (sent,) = await ws.wait_sent(1)
+            ws.reply(sent, error={"code": -32000, "message": "Cannot navigate"})
+            with pytest.raises(CDPError) as error:
+                await command
+            await cdp.close()
+            return error.value
+
+        error = asyncio.run(scenario())
+        assert error.code == -32000
+        assert error.method == "Page.navigate"
+
+    def test_timeout_leaves_nothing_pending(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            with pytest.raises(asyncio.TimeoutError):
+                await cdp.send("Page.enable", timeout=0.01)
+            assert cdp._pending == {}
+            # A late reply is ignored and the connection keeps working
+            ws.reply(ws.sent[0])
+            command = asyncio.create_task(cdp.send("Page.enable"))
+            (_, sent) = await ws.wait_sent(2)
+            ws.reply(sent, {"ok": True})
+            result = await command
+            await cdp.close()
+            return result
+
+        assert asyncio.run(scenario()) == {"ok": True}
+
+
+class TestEvents:
+    def test_events_are_dispatched_per_session(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            first = await attached(cdp, ws, "tab-1", "s1")
+            second = await attached(cdp, ws, "tab-2", "s2")
+            received = []
+            first.on("Page.loadEventFired", lambda params: received.append(("s1", params)))
+            second.on("Page.loadEventFired", lambda params: received.append(("s2", params)))
+            cdp.on("Page.loadEventFired", lambda params: received.append(("browser", params)))
+            second.on("*", lambda event: received.append(("s2*", event["method"])))
+
+            ws.push({"method": "Page.loadEventFired", "params": {"timestamp": 1}, "sessionId": "s2"})
+            ws.push({"method": "Page.loadEventFired", "params": {"timestamp": 2}, "sessionId": "s1"})
+            await asyncio.sleep(0.01)
+            await cdp.close()
+            return received
+
+        assert asyncio.run(scenario()) == [
+            ("s2", {"timestamp": 1}),
+            ("s2*", "Page.loadEventFired"),
+            ("s1", {"timestamp": 2}),
+        ]
+
+    def test_detached_from_target_drops_the_session(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            session = await attached(cdp, ws, "tab-1", "s1")
+            other = await attached(cdp, ws, "tab-2", "s2")
+            received = []
+            session.on("Page.loadEventFired", received.append)
+            pending = asyncio.create_task(session.send("Page.reload"))
+            survivor = asyncio.create_task(other.send("Page.reload"))
+            await ws.wait_sent(4)
+
+            ws.push({"method": "Target.detachedFromTarget", "params": {"sessionId": "s1"}})
+            with pytest.raises(ConnectionError, match="detached"):
+                await pending
+            assert "s1" not in cdp._sessions
+            ws.push({"method": "Page.loadEventFired", "params": {}, "sessionId": "s1"})
+            ws.reply(ws.sent[3], {"ok": True})
+            result = await survivor
+            await cdp.close()
+            return received, result
+
+        received, result = asyncio.run(scenario())
+        assert received == []
+        assert result == {"ok": True}
+
+
+class TestDisconnect:
+    def test_pending_commands_fail_when_the_connection_closes(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            cdp = CDPConnection(ws)
+            commands = [asyncio.create_task(cdp.send("Page.enable")) for _ in range(2)]
+            await ws.wait_sent(2)
+            ws.incoming.put_nowait(None)
+            results = await asyncio.gather(*commands, return_exceptions=True)
+            await cdp.wait_closed()
+            with pytest.raises(ConnectionError):
+                await cdp.send("Page.enable")
+            return results, cdp.closed
+
+        results, closed = asyncio.run(scenario())
+        assert closed
+        assert all(isinstance(result, ConnectionError) for result in results)
@@ -0,0 +1,117 @@
+"""
+Test cases for guard_metrics.
+These tests check the Prometheus text output and the embedded HTTP server.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from guard_metrics import GuardMetrics, MetricsServer, json_response
+
+
+class TestGuardMetrics:
+    def test_counter_and_gauge(self):
+        registry = GuardMetrics()
+        restarts = registry.counter("restarts_total", "Restarts", ["reason"])
+        restarts.inc(reason="crash")
+        restarts.inc(2, reason="memory")
+        registry.gauge("open_tabs", "Tabs").set_function(lambda: 3)
+        registry.gauge("rss_bytes", "RSS").set_function(lambda: None)
+
+        text = registry.render()
+        assert 'restarts_total{reason="crash"} 1' in text
+        assert 'restarts_total{reason="memory"} 2' in text
+        assert "open_tabs 3" in text
+        assert "# TYPE rss_bytes gauge" in text
+        assert "\nrss_bytes " not in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = GuardMetrics()
+        latency = registry.histogram("cdp_seconds", "Latency", ["method"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            latency.observe(value, method="Page.navigate")
+
+        text = registry.render()
+        assert 'cdp_seconds_bucket{method="Page.navigate",le="0.1"} 1' in text
+        assert 'cdp_seconds_bucket{method="Page.navigate",le="1"} 3' in text
+        assert 'cdp_seconds_bucket{method="Page.navigate",le="+Inf"} 4' in text
+        assert 'cdp_seconds_count{method="Page.navigate"} 4' in text
+        assert latency.count(method="Page.navigate") == 4
+
+    def test_labels_are_checked(self):
+        counter = GuardMetrics().counter("c", "C", ["reason"])
+        with pytest.raises(ValueError):
+            counter.inc(tier="x")
+
+    def test_same_name_returns_same_metric(self):
+        registry = GuardMetrics()
+        assert registry.counter("c", "C") is registry.counter("c", "C")
+        with pytest.raises(ValueError):
+            registry.gauge("c", "C")
+
+
+async def http(port, method, path, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload
+
+
+class TestMetricsServer:
+    def test_routes(self):
+        async def scenario():
+            registry = GuardMetrics()
+            registry.counter("restarts_total", "Restarts").inc()
+            server = MetricsServer("127.0.0.1", 0, registry)
+
+            async def echo(body):
+                return json_response({"received": body.decode()})
+
+            server.add_route("POST", "/echo", echo)
+            await server.start()
+            try:
+                metrics = await http(server.port, "GET", "/metrics")
+                echoed = await http(server.port, "POST", "/echo", b"hello")
+                missing = await http(server.port, "GET", "/nope")
+            finally:
+                await server.stop()
+            return metrics, echoed, missing
+
+        metrics, echoed, missing = asyncio.run(scenario())
+        assert metrics[0] == 200 and b"restarts_total 1" in metrics[1]
+        assert echoed == (200, b'{"received": "hello"}')
+        assert missing[0] == 404
+
+    def test_query_routes_and_extra_headers(self):
+        async def scenario():
+            server = MetricsServer("127.0.0.1", 0, GuardMetrics())
+
+            async def frame(body, query):
+                if query.get("since") == "3":
+                    return 304, "image/jpeg", b"", {"X-Frame-Version": "3"}
+                return 200, "image/jpeg", b"jpeg", {"X-Frame-Version": "4"}
+
+            server.add_route("GET", "/frame", frame, query=True)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                writer.write(b"GET /frame?since=3 HTTP/1.1\r\nHost: x\r\n\r\n")
+                unchanged = await reader.read()
+                writer.close()
+                changed = await http(server.port, "GET", "/frame?since=2")
+            finally:
+                await server.stop()
+            return unchanged, changed
+
+        unchanged, changed = asyncio.run(scenario())
+        assert unchanged.startswith(b"HTTP/1.1 304 Not Modified\r\n")
+        assert b"X-Frame-Version: 3\r\n" in unchanged
+        assert changed == (200, b"jpeg")
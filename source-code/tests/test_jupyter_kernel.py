@@ -0,0 +1,274 @@
+"""
+Test cases for jupyter_kernel.
+These tests cover size parsing, the kernel sandbox against a fake cgroup directory and the
+cached status snapshot.
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("jupyter_client")
+pytest.importorskip("ipykernel")
+pytest.importorskip("psutil")
+pytest.importorskip("pydantic")
+
+
+@pytest.fixture(scope="module")
+def jupyter_kernel():
+    """
+    Importing the module starts a real kernel, so import it only when these tests run
+    (not during collection, where it would compete with timing-sensitive tests) and
+    shut the kernel down afterwards.
+    """
+    import jupyter_kernel
+
+    yield jupyter_kernel
+    jupyter_kernel.kernel.shutdown()
+
+
+class FakeKernelManager:
+    """Counts liveness checks so tests can tell when the kernel was touched."""
+
+    def __init__(self):
+        self.checks = 0
+
+    def is_alive(self):
+        self.checks += 1
+        return True
+
+
+@pytest.fixture
+def offline_kernel(jupyter_kernel, monkeypatch):
+    """A JupyterKernel that never starts a kernel process."""
+    monkeypatch.setattr(jupyter_kernel.JupyterKernel, "_start_kernel", lambda self: None)
+    kernel = jupyter_kernel.JupyterKernel(warmup_modules=[])
+    kernel.km = FakeKernelManager()
+    kernel.connection_file = "/tmp/kernel-test.json"
+    kernel._kernel_pid = 4242
+    yield kernel
+    kernel.stop_status_monitor()
+
+
+def test_parse_size(jupyter_kernel):
+    parse_size = jupyter_kernel.parse_size
+    assert parse_size(None) is None
+    assert parse_size("") is None
+    assert parse_size("1048576") == 1 << 20
+    assert parse_size("512M") == 512 << 20
+    assert parse_size("2g") == 2 << 30
+    assert parse_size("1.5GB") == 3 << 29
+    assert parse_size("64k") == 64 << 10
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+class TestKernelSandbox:
+    def test_disabled_without_limits(self, jupyter_kernel):
+        sandbox = jupyter_kernel.KernelSandbox()
+        assert not sandbox.enabled
+        assert sandbox.prepare() == {}
+
+    def test_cgroup_mode(self, jupyter_kernel, tmp_path):
+        root = tmp_path / "cgroup"
+        root.mkdir()
+        sandbox = jupyter_kernel.KernelSandbox(
+            memory_limit=512 << 20,
+            cpu_limit=1.5,
+            pids_limit=64,
+            cgroup_parent=str(root / "kernels"),
+        )
+        assert sandbox.prepare()["preexec_fn"] == sandbox._preexec
+        assert sandbox.mode == "cgroup"
+
+        cgroup = sandbox.cgroup_path
+        assert (root / "kernels" / "cgroup.subtree_control").read_text() == "+memory +cpu +pids"
+        with open(os.path.join(cgroup, "memory.max")) as f:
+            assert f.read() == str(512 << 20)
+        with open(os.path.join(cgroup, "memory.oom.group")) as f:
+            assert f.read() == "1"
+        with open(os.path.join(cgroup, "cpu.max")) as f:
+            assert f.read() == "150000 100000"
+        with open(os.path.join(cgroup, "pids.max")) as f:
+            assert f.read() == "64"
+
+        sandbox._preexec()
+        with open(os.path.join(cgroup, "cgroup.procs")) as f:
+            assert f.read() == str(os.getpid())
+
+        events = os.path.join(cgroup, "memory.events")
+        with open(events, "w") as f:
+            f.write("low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n")
+        assert sandbox.check_oom()
+        assert not sandbox.check_oom()
+        with open(events, "w") as f:
+            f.write("oom_kill 2\n")
+        assert sandbox.check_oom()
+        assert sandbox.describe()["oom_kills"] == 2
+        assert "0.50 GiB" in sandbox.describe_oom()
+
+        # A real cgroup directory only contains kernel files; clear the fake ones first
+        for name in os.listdir(cgroup):
+            os.remove(os.path.join(cgroup, name))
+        sandbox.release()
+        assert not os.path.exists(cgroup)
+        assert sandbox.mode is None
+
+    def test_rlimit_fallback(self, jupyter_kernel, tmp_path, capsys):
+        blocker = tmp_path / "not-a-directory"
+        blocker.write_text("")
+        sandbox = jupyter_kernel.KernelSandbox(
+            memory_limit=1 << 30, pids_limit=4096, cgroup_parent=str(blocker / "kernels")
+        )
+        options = sandbox.prepare()
+        assert sandbox.mode == "rlimit" and sandbox.cgroup_path is None
+        assert "KERNEL_PIDS_LIMIT is not enforced without cgroups" in capsys.readouterr().out
+        assert sandbox.describe()["unsupported"] == ["pids_limit"]
+
+        nproc = resource.getrlimit(resource.RLIMIT_NPROC)
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import resource; print(*resource.getrlimit(resource.RLIMIT_AS), *resource.getrlimit(resource.RLIMIT_NPROC))",
+            ],
+            capture_output=True,
+            text=True,
+            **options,
+        )
+        # The process cap is left alone: RLIMIT_NPROC would count every process of the user
+        assert result.stdout.split() == [str(1 << 30)] * 2 + [str(n) for n in nproc]
+
+    def test_shutdown_releases_the_cgroup_when_the_kernel_fails_to_stop(
+        self, offline_kernel, tmp_path
+    ):
+        class StuckKernelManager:
+            def shutdown_kernel(self):
+                raise RuntimeError("kernel did not stop")
+
+        cgroup = tmp_path / "kernel-1"
+        cgroup.mkdir()
+        offline_kernel.sandbox.cgroup_path = str(cgroup)
+        offline_kernel.sandbox.mode = "cgroup"
+        offline_kernel.km = StuckKernelManager()
+        offline_kernel.shutdown()
+        assert not cgroup.exists()
+        assert offline_kernel.sandbox.mode is None and offline_kernel.km is None
+
+
+class TestStatusSnapshot:
+    def test_fresh_snapshot_is_served_from_cache(self, offline_kernel):
+        offline_kernel.refresh_status()
+        checks = offline_kernel.km.checks
+        for _ in range(5):
+            status = offline_kernel.get_status_snapshot(max_staleness=60)
+        assert offline_kernel.km.checks == checks
+        assert status["success"] and status["kernel_alive"] and not status["stale"]
+        assert status["kernel_pid"] == 4242
+
+    def test_stale_snapshot_is_refreshed(self, offline_kernel):
+        offline_kernel.refresh_status()
+        offline_kernel._status.updated_at -= 10
+        checks = offline_kernel.km.checks
+        status = offline_kernel.get_status_snapshot(max_staleness=5)
+        assert offline_kernel.km.checks == checks + 1
+        assert status["success"] and status["stale"]
+        assert status["age"] < 5
+        assert not offline_kernel.get_status_snapshot(max_staleness=5)["stale"]
+
+    def test_monitor_thread_keeps_the_snapshot_fresh(self, offline_kernel):
+        offline_kernel.start_status_monitor(interval=0.01)
+        first = offline_kernel._status.updated_at
+        deadline = time.time() + 5
+        while offline_kernel._status.updated_at == first and time.time() < deadline:
+            time.sleep(0.01)
+        offline_kernel.stop_status_monitor()
+        assert offline_kernel._status.updated_at > first
+        assert offline_kernel._status_monitor is None
+
+
+class TestProfile:
+    def test_collect_profile_aggregates_self_time(self, offline_kernel, tmp_path):
+        offline_kernel.connection_file = str(tmp_path / "kernel-1.json")
+        offline_kernel._profile_interval = 0.01
+        output = tmp_path / "kernel-1-profile.json"
+        output.write_text(
+            '{"samples": 4, "stacks": {"main;load;parse": 3, "main;render": 1}}'
+        )
+        profile = offline_kernel._collect_profile(timeout=1)
+        assert not output.exists()
+        assert profile["success"] and profile["samples"] == 4
+        assert profile["collapsed"] == "main;load;parse 3\nmain;render 1"
+        assert profile["top_self"] == [
+            {"function": "parse", "self_samples": 3, "self_seconds": 0.03, "self_percent": 75.0},
+            {"function": "render", "self_samples": 1, "self_seconds": 0.01, "self_percent": 25.0},
+        ]
+
+    def test_finish_profile_reports_failures(self, offline_kernel, tmp_path):
+        offline_kernel.connection_file = str(tmp_path / "kernel-1.json")
+
+        def signal_profiler(action, interval=0.005):
+            raise ProcessLookupError("kernel is gone")
+
+        offline_kernel._signal_profiler = signal_profiler
+        profile = offline_kernel._finish_profile()
+        assert not profile["success"]
+        assert "kernel is gone" in profile["message"]
+
+    def test_profiler_is_stopped_when_execution_raises(self, offline_kernel):
+        actions = []
+
+        class BrokenClient:
+            def execute(self, code):
+                raise RuntimeError("shell channel closed")
+
+        offline_kernel.kc = BrokenClient()
+        offline_kernel._ensure_kernel_alive = lambda: None
+        offline_kernel._signal_profiler = lambda action, interval=0.005: actions.append(action)
+        offline_kernel._collect_profile = lambda timeout=5.0: {"success": True, "samples": 0}
+
+        result = offline_kernel.execute("1 + 1", profile=True)
+        assert not result.success and "shell channel closed" in result.error
+        assert actions == ["start", "stop"]
+        assert result.profile == {"success": True, "samples": 0}
+
+
+class TestWarmup:
+    SLOW_IMPORT = 3.0
+
+    def test_warmup_does_not_delay_execution(self, jupyter_kernel, tmp_path, monkeypatch):
+        (tmp_path / "slow_warmup_module.py").write_text(
+            f"import time\ntime.sleep({self.SLOW_IMPORT})\n"
+        )
+        monkeypatch.setenv(
+            "PYTHONPATH", os.pathsep.join(filter(None, [str(tmp_path), os.getenv("PYTHONPATH")]))
+        )
+        kernel = jupyter_kernel.JupyterKernel(
+            warmup_modules=["slow_warmup_module", "no_such_warmup_module"]
+        )
+        try:
+            started = time.perf_counter()
+            result = kernel.execute("print(21 * 2)")
+            elapsed = time.perf_counter() - started
+            assert result.success and result.output == "42"
+            assert elapsed < self.SLOW_IMPORT / 2
+            assert kernel._read_warmup_report()["state"] != "done"
+
+            deadline = time.time() + self.SLOW_IMPORT + 10
+            report = kernel._read_warmup_report()
+            while report["state"] != "done" and time.time() < deadline:
+                time.sleep(0.1)
+                report = kernel._read_warmup_report()
+            assert report["state"] == "done"
+            slow = report["modules"]["slow_warmup_module"]
+            assert slow["success"] and slow["seconds"] >= self.SLOW_IMPORT * 0.9
+            missing = report["modules"]["no_such_warmup_module"]
+            assert not missing["success"]
+            assert missing["error"].startswith("ModuleNotFoundError")
+            assert kernel.refresh_status().warmup == report
+        finally:
+            kernel.shutdown()
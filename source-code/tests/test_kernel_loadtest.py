@@ -0,0 +1,106 @@
+"""
+Test cases for kernel_loadtest.
+These tests check the nearest-rank percentiles and the report, and run a short load test
+against kernel_server backed by the fake kernel in this process.
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("zmq")
+pytest.importorskip("jupyter_client")
+
+from kernel_loadtest import CANARY_ROUTE, LoadTest, percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(n) for n in range(1, 11)]
+    assert percentile([], 50) == 0.0
+    assert percentile([5.0], 99) == 5.0
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 25) == 3.0
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 90) == 9.0
+    assert percentile(values, 91) == 10.0
+    assert percentile(values, 100) == 10.0
+    # 7 * 100 / 100 must not round up to rank 8
+    assert percentile([float(n) for n in range(1, 101)], 7) == 7.0
+
+
+def test_report_counts_and_percentiles():
+    test = LoadTest("http://127.0.0.1:1", {"health": 1})
+    for n in range(1, 11):
+        test._record("health", n / 1000, ok=n != 10)
+    for _ in range(4):
+        test._record(CANARY_ROUTE, 0.001, ok=True)
+
+    report = test.report(elapsed=2.0)
+    health = report["routes"]["health"]
+    assert (report["requests"], report["errors"], report["error_rate"]) == (10, 1, 0.1)
+    assert report["rps"] == 5.0
+    assert health["requests"] == 10 and health["errors"] == 1
+    assert (health["p50_ms"], health["p90_ms"], health["p99_ms"], health["max_ms"]) == (
+        5.0, 9.0, 10.0, 10.0,
+    )
+    # The canary is reported but not counted towards the totals
+    assert report["routes"][CANARY_ROUTE]["requests"] == 4
+
+
+@pytest.fixture
+def fake_kernel_server(tmp_path, monkeypatch):
+    """kernel_server on a free port, running in this process with the fake kernel."""
+    pytest.importorskip("fastapi")
+    uvicorn = pytest.importorskip("uvicorn")
+    from fake_kernel import KERNEL_NAME, install_kernelspec
+
+    monkeypatch.setenv(
+        "JUPYTER_PATH",
+        install_kernelspec(
+            str(tmp_path), {"FAKE_KERNEL_LATENCY": "0.005", "FAKE_KERNEL_OUTPUT_BYTES": "16"}
+        ),
+    )
+    monkeypatch.setenv("JUPYTER_KERNEL_NAME", KERNEL_NAME)
+    monkeypatch.setenv("KERNEL_WARMUP_MODULES", "")
+    import jupyter_kernel
+    import kernel_server
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(kernel_server.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 60
+    while not server.started and thread.is_alive() and time.time() < deadline:
+        time.sleep(0.05)
+    assert server.started, "kernel_server did not start"
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=30)
+    jupyter_kernel.kernel.shutdown()
+
+
+def test_load_test_against_fake_kernel(fake_kernel_server):
+    report = LoadTest(
+        fake_kernel_server,
+        {"health": 1, "status": 1, "connection": 1},
+        concurrency=2,
+        duration=1.0,
+        canary_interval=0.05,
+    ).run()
+
+    routes = report["routes"]
+    assert report["errors"] == 0 and report["requests"] > 0
+    assert report["requests"] == sum(
+        stats["requests"] for route, stats in routes.items() if route != CANARY_ROUTE
+    )
+    assert {"health", "status", "connection", CANARY_ROUTE} <= set(routes)
+    for stats in routes.values():
+        assert stats["errors"] == 0
+        assert 0 < stats["p50_ms"] <= stats["p90_ms"] <= stats["p99_ms"] <= stats["max_ms"]
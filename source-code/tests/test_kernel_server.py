@@ -0,0 +1,67 @@
+"""
+Test cases for kernel_server.
+These tests check that the status routes answer from the kernel's cached status snapshot.
+"""
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("jupyter_client")
+pytest.importorskip("ipykernel")
+pytest.importorskip("psutil")
+
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def kernel_server():
+    """kernel_server imports jupyter_kernel, which starts a kernel; shut it down afterwards."""
+    import jupyter_kernel
+    import kernel_server
+
+    yield kernel_server
+    jupyter_kernel.kernel.shutdown()
+
+
+class FakeKernelManager:
+    """Counts liveness checks so tests can tell when the kernel was touched."""
+
+    def __init__(self):
+        self.checks = 0
+
+    def is_alive(self):
+        self.checks += 1
+        return True
+
+
+@pytest.fixture
+def client(kernel_server, monkeypatch):
+    """A test client over a JupyterKernel that never starts a kernel process."""
+    monkeypatch.setattr(kernel_server.JupyterKernel, "_start_kernel", lambda self: None)
+    kernel = kernel_server.JupyterKernel(warmup_modules=[])
+    kernel.km = FakeKernelManager()
+    kernel.connection_file = "/tmp/kernel-test.json"
+    kernel.refresh_status()
+    monkeypatch.setattr(kernel_server, "kernel_instance", kernel)
+    # Without a with-block the lifespan (which starts a real kernel) does not run
+    return TestClient(kernel_server.app), kernel
+
+
+@pytest.mark.parametrize(
+    "path", ["/health", "/kernel/status", "/kernel/connection", "/kernel/connection-file"]
+)
+def test_status_routes_use_the_snapshot(client, path):
+    http, kernel = client
+    response = http.get(path)
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    assert kernel.km.checks == 1
+
+
+def test_stale_snapshot_is_refreshed(client, kernel_server):
+    http, kernel = client
+    kernel._status.updated_at -= kernel_server.STATUS_MAX_STALENESS + 1
+    body = http.get("/kernel/status").json()
+    assert kernel.km.checks == 2
+    assert body["stale"] is True and body["age"] < kernel_server.STATUS_MAX_STALENESS
@@ -0,0 +1,228 @@
+"""
+Test cases for utils.
+These tests exercise the async command runner and the process supervisor with real subprocesses,
+and the inotify-based path waits.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import utils
+from utils import (
+    OutputBuffer,
+    ProcessSupervisor,
+    RingBuffer,
+    RotatingLog,
+    _parse_screensize,
+    run_command_async,
+    wait_for_path,
+    wait_for_path_async,
+)
+
+
+class TestOutputBuffer:
+    def test_keeps_head_and_tail(self):
+        buffer = OutputBuffer(8)
+        for chunk in (b"abc", b"defgh", b"ijkl"):
+            buffer.write(chunk)
+        assert buffer.dropped == 4
+        assert buffer.text() == "abcd\n... [4 bytes truncated] ...\nijkl"
+
+    def test_small_output_is_untouched(self):
+        buffer = OutputBuffer(100)
+        buffer.write(b"hello\n")
+        assert buffer.text() == "hello\n" and buffer.dropped == 0
+
+
+class TestRunCommandAsync:
+    def test_streams_lines(self):
+        lines = []
+        result = asyncio.run(
+            run_command_async(
+                ["sh", "-c", "echo one; echo two >&2; printf three"],
+                on_line=lambda stream, line: lines.append((stream, line)),
+            )
+        )
+        assert result.returncode == 0 and not result.timed_out
+        assert result.stdout == "one\nthree" and result.stderr == "two\n"
+        assert sorted(lines) == [("stderr", "two"), ("stdout", "one"), ("stdout", "three")]
+
+    def test_caps_output(self):
+        result = asyncio.run(
+            run_command_async(["sh", "-c", "seq 1 100000"], max_output_bytes=64)
+        )
+        assert result.stdout.startswith("1\n2\n3\n")
+        assert result.stdout.endswith("99999\n100000\n")
+        assert result.stdout_truncated > 500000
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        psutil = pytest.importorskip("psutil")
+        pid_file = tmp_path / "child.pid"
+        started = time.monotonic()
+        result = asyncio.run(
+            run_command_async(
+                ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"], timeout=0.5
+            )
+        )
+        assert result.timed_out
+        assert time.monotonic() - started < 5
+        child = int(pid_file.read_text())
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            # A killed child that nobody has reaped yet still exists as a zombie
+            try:
+                if psutil.Process(child).status() == psutil.STATUS_ZOMBIE:
+                    break
+            except psutil.NoSuchProcess:
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail("background child survived the timeout")
+
+    def test_splits_lines_without_newlines(self, monkeypatch):
+        monkeypatch.setattr(utils, "MAX_LINE_BYTES", 1000)
+        lines = []
+        asyncio.run(
+            run_command_async(
+                ["sh", "-c", "head -c 5500 /dev/zero | tr '\\0' x"],
+                on_line=lambda stream, line: lines.append(line),
+            )
+        )
+        assert [len(line) for line in lines] == [1000] * 5 + [500]
+
+    def test_concurrency_limit(self, monkeypatch):
+        monkeypatch.setattr(utils, "MAX_CONCURRENT_COMMANDS", 2)
+
+        async def scenario():
+            started = time.monotonic()
+            await asyncio.gather(*(run_command_async(["sleep", "0.3"]) for _ in range(4)))
+            return time.monotonic() - started
+
+        assert asyncio.run(scenario()) >= 0.55
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestProcessSupervisor:
+    def test_drains_output_without_stalling(self, tmp_path):
+        supervisor = ProcessSupervisor(buffer_bytes=1024, reap_interval=0.05)
+        log_file = tmp_path / "logs" / "seq.log"
+        # Far more than a pipe buffer holds: without draining the child would block
+        managed = supervisor.start("seq", ["sh", "-c", "seq 1 200000; echo oops >&2"], log_file=str(log_file))
+        assert managed.process.wait(10) == 0
+        assert wait_until(lambda: managed.exited_at is not None and managed.drained)
+        assert supervisor.logs("seq", 1) == ["200000"]
+        assert sum(len(line) for line in supervisor.logs("seq")) <= 1024
+        assert supervisor.logs("seq", stream="stderr") == ["oops"]
+        logged = log_file.read_bytes().splitlines()
+        assert len(logged) == 200001 and b"[stderr] oops" in logged
+        status = supervisor.status("seq")
+        assert not status["running"] and status["returncode"] == 0
+
+    def test_splits_lines_without_newlines(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils, "MAX_LINE_BYTES", 1000)
+        supervisor = ProcessSupervisor(buffer_bytes=4096, reap_interval=0.05)
+        log_file = tmp_path / "blob.log"
+        managed = supervisor.start(
+            "blob", ["sh", "-c", "head -c 5500 /dev/zero | tr '\\0' x; echo"], log_file=str(log_file)
+        )
+        assert managed.process.wait(10) == 0
+        assert wait_until(lambda: managed.drained)
+        assert [len(line) for line in supervisor.logs("blob")] == [1000] * 3 + [500]
+        # The log keeps the line whole
+        assert log_file.read_bytes() == b"x" * 5500 + b"\n"
+
+    def test_stop_escalates_to_sigkill(self):
+        supervisor = ProcessSupervisor(reap_interval=0.05)
+        managed = supervisor.start("stubborn", ["sh", "-c", "trap '' TERM; echo ready; while :; do sleep 0.1; done"])
+        assert wait_until(lambda: supervisor.logs("stubborn") == ["ready"])
+        status = supervisor.status("stubborn")
+        assert status["running"]
+        if "rss" in status:
+            assert status["rss"] > 0 and status["processes"] >= 1
+        started = time.monotonic()
+        assert supervisor.stop("stubborn", timeout=0.3) == -9
+        assert time.monotonic() - started < 5
+        assert managed.exited_at is not None
+
+    def test_names_and_reaping(self):
+        supervisor = ProcessSupervisor(keep_exited=1, reap_interval=0.05)
+        first = supervisor.start("job", ["sleep", "5"])
+        second = supervisor.start("job", ["true"])
+        assert second.name == "job-2"
+        assert wait_until(lambda: second.exited_at is not None)
+        third = supervisor.start("other", ["true"])
+        # Only the most recent exited entry is kept
+        assert wait_until(lambda: "job-2" not in {s["name"] for s in supervisor.status()})
+        assert {s["name"] for s in supervisor.status()} == {"job", "other"}
+        assert third.process.returncode == 0
+        supervisor.stop_all(timeout=1)
+        assert first.process.returncode == -15
+        with pytest.raises(KeyError):
+            supervisor.logs("missing")
+
+    def test_ring_buffer_and_rotation(self, tmp_path):
+        buffer = RingBuffer(10)
+        for line in ("aaaa", "bbbb", "cccc"):
+            buffer.append(line)
+        assert buffer.tail() == ["bbbb", "cccc"]
+        buffer.append("x" * 25)
+        assert buffer.tail() == ["x" * 10]
+        log = RotatingLog(str(tmp_path / "out.log"), max_bytes=8, backups=2)
+        for chunk in (b"12345\n", b"67890\n", b"abcde\n", b"fghij\n"):
+            log.write(chunk)
+        log.close()
+        assert (tmp_path / "out.log.1").read_bytes() == b"abcde\nfghij\n"
+        assert (tmp_path / "out.log.2").read_bytes() == b"12345\n67890\n"
+        assert not (tmp_path / "out.log.3").exists()
+
+
+class TestWaitForPath:
+    def test_wakes_when_path_and_parents_appear(self, tmp_path):
+        target = tmp_path / "a" / "b" / "socket"
+
+        def create():
+            time.sleep(0.2)
+            target.parent.mkdir(parents=True)
+            target.touch()
+
+        threading.Thread(target=create).start()
+        started = time.monotonic()
+        assert wait_for_path(str(target), 5)
+        assert time.monotonic() - started < 1
+        assert not wait_for_path(str(tmp_path / "missing"), 0.1)
+
+    def test_async(self, tmp_path):
+        target = tmp_path / "x" / "ready"
+
+        async def scenario():
+            async def create():
+                await asyncio.sleep(0.2)
+                target.parent.mkdir()
+                os.rename(str(tmp_path / "staged"), str(target))
+
+            (tmp_path / "staged").touch()
+            creator = asyncio.ensure_future(create())
+            assert await wait_for_path_async(str(target), 5)
+            await creator
+            assert not await wait_for_path_async(str(tmp_path / "missing"), 0.1)
+
+        asyncio.run(scenario())
+
+
+def test_parse_screensize():
+    output = "Screen 0: minimum 8 x 8, current 1920 x 1080, maximum 32767 x 32767\n"
+    assert _parse_screensize(output) == (1920, 1080)
+    with pytest.raises(ValueError):
+        _parse_screensize("")
@@ -6,8 +6,29 @@
 # educational purposes. See ../LICENSE for details.
 # ============================================================
 
+import asyncio
+import ctypes
+import inspect
+import os
+import re
+import select
+import signal
 import subprocess
-from typing import Tuple, List
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, List
+
+# Upper bound on commands run concurrently through run_command_async
+MAX_CONCURRENT_COMMANDS = int(os.getenv("MAX_CONCURRENT_COMMANDS", "8"))
+# Seconds between SIGTERM and SIGKILL when a command times out
+KILL_GRACE_PERIOD = 2.0
+# Longest line handed to a line callback; longer lines are split into pieces of this size
+MAX_LINE_BYTES = 64 * 1024
+
+# Called with (stream name, line) for every line of output
+LineCallback = Callable[[str, str], Optional[Awaitable[Any]]]
 
 
 def get_screensize() -> Tuple[int, int]:
@@ -25,6 +46,19 @@ def get_screensize() -> Tuple[int, int]:
     return tuple(map(int, display_size.split("x")))  # type: ignore
 
 
+def _parse_screensize(output: str) -> Tuple[int, int]:
+    match = re.search(r"current (\d+) x (\d+)", output)
+    if not match:
+        raise ValueError(f"Cannot parse xrandr output: {output[:200]!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+async def get_screensize_async() -> Tuple[int, int]:
+    """Get the screen size of the primary display without blocking the event loop."""
+    result = await run_command_async(["xrandr"], timeout=10)
+    return _parse_screensize(result.stdout)
+
+
 def run_command(
     command: List[str], timeout: int = 30, pipe_output: bool = True
 ) -> subprocess.CompletedProcess[str]:
@@ -39,11 +73,602 @@ def run_command(
     return result
 
 
-def run_command_background(command: List[str]) -> subprocess.Popen:
-    """Run a shell command in the background and return the process object."""
-    process = subprocess.Popen(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    return process
+def run_command_background(
+    command: List[str], name: Optional[str] = None, log_file: Optional[str] = None
+) -> subprocess.Popen:
+    """
+    Run a shell command in the background and return the process object.
+
+    The process is registered with the module-level supervisor, which drains its output
+    (read it with supervisor.logs(name)) and reaps it when it exits.
+    """
+    return supervisor.start(name or os.path.basename(command[0]), command, log_file=log_file).process
+
+
+class OutputBuffer:
+    """Keeps the first and last bytes of a stream and counts what was dropped in between."""
+
+    def __init__(self, max_bytes: int):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail: Deque[bytes] = deque()
+        self.tail_size = 0
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        if len(self.head) < self.head_limit:
+            room = self.head_limit - len(self.head)
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail_size > self.tail_limit:
+            excess = self.tail_size - self.tail_limit
+            first = self.tail[0]
+            if len(first) <= excess:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+                self.dropped += len(first)
+            else:
+                self.tail[0] = first[excess:]
+                self.tail_size -= excess
+                self.dropped += excess
+
+    def text(self) -> str:
+        head = self.head.decode(errors="replace")
+        tail = b"".join(self.tail).decode(errors="replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n... [{self.dropped} bytes truncated] ...\n{tail}"
+
+
+class CommandResult:
+    """Outcome of run_command_async."""
+
+    def __init__(
+        self,
+        args: List[str],
+        returncode: Optional[int],
+        stdout: OutputBuffer,
+        stderr: OutputBuffer,
+        timed_out: bool,
+        duration: float,
+    ):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout.text()
+        self.stderr = stderr.text()
+        self.stdout_truncated = stdout.dropped
+        self.stderr_truncated = stderr.dropped
+        self.timed_out = timed_out
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return (
+            f"CommandResult(args={self.args!r}, returncode={self.returncode}, "
+            f"timed_out={self.timed_out}, duration={self.duration:.2f})"
+        )
+
+
+# asyncio.Semaphore binds to the loop it is first used on, so keep one per loop
+_command_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _command_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _command_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
+        _command_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def _pump(
+    stream: asyncio.StreamReader, name: str, buffer: OutputBuffer, on_line: Optional[LineCallback]
+):
+    """Copy a pipe into buffer and hand complete lines to on_line, splitting overlong ones."""
+    pending = b""
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if on_line is None:
+            continue
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        # Output without newlines must not accumulate without bound
+        while len(pending) > MAX_LINE_BYTES:
+            lines.append(pending[:MAX_LINE_BYTES])
+            pending = pending[MAX_LINE_BYTES:]
+        for line in lines:
+            result = on_line(name, line.decode(errors="replace"))
+            if inspect.isawaitable(result):
+                await result
+    if on_line is not None and pending:
+        result = on_line(name, pending.decode(errors="replace"))
+        if inspect.isawaitable(result):
+            await result
+
+
+def _signal_group(process: asyncio.subprocess.Process, sig: int):
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def _terminate_group(process: asyncio.subprocess.Process):
+    """SIGTERM the process group, then SIGKILL it if the leader outlives the grace period."""
+    _signal_group(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), KILL_GRACE_PERIOD)
+    except asyncio.TimeoutError:
+        pass
+    # Children may ignore SIGTERM even after the leader exits
+    _signal_group(process, signal.SIGKILL)
+    await process.wait()
+
+
+async def run_command_async(
+    command: List[str],
+    timeout: Optional[float] = 30,
+    on_line: Optional[LineCallback] = None,
+    max_output_bytes: int = 1 << 20,
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> CommandResult:
+    """
+    Run a command without blocking the event loop.
+
+    Output is streamed line by line to on_line (sync or async) and at most max_output_bytes
+    per stream are kept, split between the start and the end of the output. The command runs
+    in its own process group, which is killed as a whole on timeout or cancellation. At most
+    MAX_CONCURRENT_COMMANDS commands run at once; the rest wait for a slot.
+    """
+    async with _command_semaphore():
+        started = time.monotonic()
+        stdout = OutputBuffer(max_output_bytes)
+        stderr = OutputBuffer(max_output_bytes)
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            start_new_session=True,
+        )
+        pumps = asyncio.gather(
+            _pump(process.stdout, "stdout", stdout, on_line),
+            _pump(process.stderr, "stderr", stderr, on_line),
+        )
+        timed_out = False
+        try:
+            await asyncio.wait_for(asyncio.gather(asyncio.shield(pumps), process.wait()), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _terminate_group(process)
+        except BaseException:
+            await _terminate_group(process)
+            pumps.cancel()
+            raise
+        # Every writer in the group is gone, so the pipes reach EOF
+        try:
+            await asyncio.wait_for(pumps, KILL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            pass
+        return CommandResult(
+            command,
+            process.returncode,
+            stdout,
+            stderr,
+            timed_out,
+            time.monotonic() - started,
+        )
+
+
+# inotify events that can make a path appear in a watched directory
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+# Fallback polling interval where inotify is unavailable
+PATH_POLL_INTERVAL = 0.05
+
+
+class PathWatcher:
+    """
+    Wakes up when an entry is created in the nearest existing ancestor of a path (Linux
+    inotify). Call arm() before every existence check so a parent directory created in the
+    meantime is watched too; the file descriptor becomes readable on the next event.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def arm(self):
+        directory = os.path.dirname(self.path)
+        while not os.path.isdir(directory) and directory != os.path.dirname(directory):
+            directory = os.path.dirname(directory)
+        if self._add_watch(self._fd, os.fsencode(directory), IN_CREATE | IN_MOVED_TO) < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+
+    def drain(self):
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _path_watcher(path: str) -> Optional[PathWatcher]:
+    try:
+        return PathWatcher(path)
+    except (OSError, AttributeError):
+        # Not Linux, or inotify instances exhausted
+        return None
+
+
+def wait_for_path(path: str, timeout: float) -> bool:
+    """Block until path exists; returns False on timeout. Uses inotify instead of polling."""
+    deadline = time.monotonic() + timeout
+    watcher = _path_watcher(path)
+    try:
+        while True:
+            if watcher:
+                watcher.arm()
+            if os.path.exists(path):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if watcher:
+                select.select([watcher], [], [], remaining)
+                watcher.drain()
+            else:
+                time.sleep(min(remaining, PATH_POLL_INTERVAL))
+    finally:
+        if watcher:
+            watcher.close()
+
+
+async def wait_for_path_async(path: str, timeout: float) -> bool:
+    """wait_for_path for the event loop: the inotify descriptor is watched with add_reader."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    watcher = _path_watcher(path)
+    wakeup = asyncio.Event()
+    if watcher:
+        loop.add_reader(watcher.fileno(), wakeup.set)
+    try:
+        while True:
+            if watcher:
+                watcher.arm()
+            if os.path.exists(path):
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(
+                    wakeup.wait(), remaining if watcher else min(remaining, PATH_POLL_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            if watcher:
+                watcher.drain()
+    finally:
+        if watcher:
+            loop.remove_reader(watcher.fileno())
+            watcher.close()
+
+
+class RingBuffer:
+    """The most recent lines of output, bounded by total size."""
+
+    def __init__(self, max_bytes: int = 256 << 10):
+        self.max_bytes = max_bytes
+        self._lines: Deque[str] = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, line: str):
+        # A single line never holds more than the whole buffer
+        line = line[: self.max_bytes]
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line)
+            while self._size > self.max_bytes and len(self._lines) > 1:
+                self._size -= len(self._lines.popleft())
+
+    def tail(self, lines: Optional[int] = None) -> List[str]:
+        with self._lock:
+            items = list(self._lines)
+        return items if lines is None else items[-lines:]
+
+
+class RotatingLog:
+    """Append-only log file rotated to .1 ... .N once it grows past max_bytes."""
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path: str, max_bytes: int = 10 << 20, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "ab")
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "wb")
+
+    def write(self, data: bytes):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(data)
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+            elif time.monotonic() - self._flushed >= self.FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ManagedProcess:
+    """A supervised background process and the threads draining its output."""
+
+    def __init__(
+        self,
+        name: str,
+        process: subprocess.Popen,
+        buffer_bytes: int,
+        log: Optional[RotatingLog],
+    ):
+        self.name = name
+        self.process = process
+        self.args = list(process.args)
+        self.started_at = time.time()
+        self.exited_at: Optional[float] = None
+        self.stdout = RingBuffer(buffer_bytes)
+        self.stderr = RingBuffer(buffer_bytes)
+        self.log = log
+        self._open_streams = 2
+        self._streams_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(
+                target=self._drain, args=(process.stdout, self.stdout, b""), daemon=True,
+                name=f"drain-{name}-stdout",
+            ),
+            threading.Thread(
+                target=self._drain, args=(process.stderr, self.stderr, b"[stderr] "), daemon=True,
+                name=f"drain-{name}-stderr",
+            ),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _drain(self, pipe, buffer: RingBuffer, prefix: bytes):
+        """Read the pipe until EOF so the child never blocks on a full pipe; long lines are split."""
+        line_start = True
+        try:
+            for line in iter(lambda: pipe.readline(MAX_LINE_BYTES), b""):
+                buffer.append(line.decode(errors="replace").rstrip("\n"))
+                if self.log:
+                    # Pieces of a split line keep a single prefix in the log
+                    self.log.write(prefix + line if line_start else line)
+                line_start = line.endswith(b"\n")
+        except (OSError, ValueError):
+            pass
+        finally:
+            pipe.close()
+            with self._streams_lock:
+                self._open_streams -= 1
+                last = self._open_streams == 0
+            if last and self.log:
+                self.log.close()
+
+    @property
+    def running(self) -> bool:
+        return self.process.poll() is None
+
+    @property
+    def drained(self) -> bool:
+        """All output has been read (a grandchild holding the pipes open can delay this)."""
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout: float = 1.0):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        returncode = self.process.poll()
+        info: Dict[str, Any] = {
+            "name": self.name,
+            "pid": self.process.pid,
+            "args": self.args,
+            "running": returncode is None,
+            "returncode": returncode,
+            "started_at": self.started_at,
+            "uptime": (self.exited_at or time.time()) - self.started_at,
+        }
+        if returncode is None:
+            info.update(_process_resources(self.process.pid))
+        return info
+
+
+def _process_resources(pid: int) -> Dict[str, Any]:
+    """CPU time, RSS and thread count of a process and its children; empty without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        return {}
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return {}
+    rss = cpu = 0.0
+    threads = 0
+    for process in processes:
+        try:
+            with process.oneshot():
+                rss += process.memory_info().rss
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                threads += process.num_threads()
+        except psutil.Error:
+            continue
+    return {"rss": int(rss), "cpu_seconds": round(cpu, 2), "threads": threads, "processes": len(processes)}
+
+
+class ProcessSupervisor:
+    """
+    Registry of named background processes.
+
+    Each process runs in its own process group with stdout/stderr drained by threads into
+    ring buffers (and optionally a rotating log file). A reaper thread collects exit codes so
+    finished children never linger as zombies; the most recent exited entries stay queryable.
+    """
+
+    def __init__(self, buffer_bytes: int = 256 << 10, keep_exited: int = 20, reap_interval: float = 1.0):
+        self.buffer_bytes = buffer_bytes
+        self.keep_exited = keep_exited
+        self.reap_interval = reap_interval
+        self._processes: Dict[str, ManagedProcess] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _unique_name(self, name: str) -> str:
+        if name not in self._processes or not self._processes[name].running:
+            return name
+        index = 2
+        while f"{name}-{index}" in self._processes and self._processes[f"{name}-{index}"].running:
+            index += 1
+        return f"{name}-{index}"
+
+    def start(
+        self,
+        name: str,
+        command: List[str],
+        log_file: Optional[str] = None,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> ManagedProcess:
+        """Start command under name; a suffix is added if a live process already has it."""
+        with self._lock:
+            name = self._unique_name(name)
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+                env=env,
+                start_new_session=True,
+            )
+            log = RotatingLog(log_file) if log_file else None
+            managed = ManagedProcess(name, process, self.buffer_bytes, log)
+            previous = self._processes.pop(name, None)
+            if previous:
+                previous.join(0)
+            self._processes[name] = managed
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True, name="process-reaper")
+                self._reaper.start()
+        return managed
+
+    def get(self, name: str) -> ManagedProcess:
+        with self._lock:
+            if name not in self._processes:
+                raise KeyError(f"No supervised process named {name!r}")
+            return self._processes[name]
+
+    def status(self, name: Optional[str] = None) -> Any:
+        """Status of one process, or of every tracked process when name is None."""
+        if name is not None:
+            return self.get(name).status()
+        with self._lock:
+            processes = list(self._processes.values())
+        return [process.status() for process in processes]
+
+    def logs(self, name: str, lines: Optional[int] = None, stream: str = "stdout") -> List[str]:
+        managed = self.get(name)
+        return (managed.stdout if stream == "stdout" else managed.stderr).tail(lines)
+
+    def stop(self, name: str, timeout: float = 10.0) -> Optional[int]:
+        """SIGTERM the process group, escalate to SIGKILL after timeout; returns the exit code."""
+        managed = self.get(name)
+        process = managed.process
+        if process.poll() is None:
+            for sig, wait in ((signal.SIGTERM, timeout), (signal.SIGKILL, 5.0)):
+                try:
+                    os.killpg(process.pid, sig)
+                except ProcessLookupError:
+                    pass
+                try:
+                    process.wait(wait)
+                    break
+                except subprocess.TimeoutExpired:
+                    continue
+        self._reap(managed)
+        return process.returncode
+
+    def stop_all(self, timeout: float = 10.0):
+        with self._lock:
+            names = [name for name, managed in self._processes.items() if managed.running]
+        for name in names:
+            self.stop(name, timeout)
+
+    def _reap(self, managed: ManagedProcess):
+        if managed.exited_at is None and managed.process.poll() is not None:
+            managed.exited_at = time.time()
+            managed.join()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            with self._lock:
+                processes = list(self._processes.values())
+            for managed in processes:
+                self._reap(managed)
+            with self._lock:
+                exited = sorted(
+                    (managed for managed in self._processes.values() if managed.exited_at),
+                    key=lambda managed: managed.exited_at,
+                )
+                for managed in exited[: max(0, len(exited) - self.keep_exited)]:
+                    self._processes.pop(managed.name, None)
+
+
+# Process-wide supervisor used by run_command_background
+supervisor = ProcessSupervisor()